@@ -0,0 +1,73 @@
+"""
+Benchmark for cold start import time
+
+Imports an entry point in fresh interpreters, the way every worker fork and
+test run does, and reports the median wall time and the modules that took
+longest (from -X importtime). Pass --max-ms to use it as a regression gate;
+it exits non-zero when the median exceeds the limit. Run from the
+repository root:
+
+    python -m benchmarks.bench_import [--module src.app] [--runs 5] [--max-ms 600]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def import_once(module):
+    """Wall time of one cold import and its -X importtime report"""
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'bench'))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env, check=True
+    )
+    return time.perf_counter() - start, result.stderr
+
+
+def slowest_modules(report, top, max_depth=2):
+    """Modules imported by the entry point (up to max_depth levels down) by cumulative microseconds"""
+    modules = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # importtime indents each nesting level by two spaces after the first
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if 1 <= depth <= max_depth:
+            modules.append((int(cumulative), '  ' * (depth - 1) + name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--module', default='src.app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--max-ms', type=float, help='fail if the median import time exceeds this')
+    args = parser.parse_args()
+
+    # Interpreter startup alone, so the report shows what the import adds
+    baseline = statistics.median(import_once('sys')[0] for _ in range(args.runs))
+    timings, report = [], ''
+    for _ in range(args.runs):
+        elapsed, report = import_once(args.module)
+        timings.append(elapsed)
+    median = statistics.median(timings)
+
+    print(f"import {args.module}: median {median * 1e3:.0f} ms over {args.runs} runs "
+          f"(interpreter startup {baseline * 1e3:.0f} ms)")
+    print(f"{'cumulative ms':>14}  module")
+    for cumulative, name in slowest_modules(report, args.top):
+        print(f"{cumulative / 1e3:>14.1f}  {name}")
+
+    if args.max_ms is not None and median * 1e3 > args.max_ms:
+        print(f"FAIL: median import time {median * 1e3:.0f} ms exceeds {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
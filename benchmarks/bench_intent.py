@@ -0,0 +1,71 @@
+"""
+Accuracy and latency of the intent tiers on the labeled fixture set
+
+The local tier is always measured. Pass --llm (with OPENAI_API_KEY set) to
+also send the escalated questions to the OpenAI classifier. Run from the
+repository root:
+
+    python -m benchmarks.bench_intent [--llm]
+"""
+import argparse
+import json
+import os
+import time
+
+from src.config import LOCAL_INTENT_THRESHOLD
+from src.services.intent_classifier import intent_classifier
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'intents.jsonl')
+
+
+def load_fixtures():
+    with open(FIXTURES) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(tier, rows, seconds):
+    if not rows:
+        print(f"{tier:>6}: no questions")
+        return
+    correct = sum(row['intent'] == predicted for row, predicted in rows)
+    print(f"{tier:>6}: {len(rows):>3} questions, accuracy {correct / len(rows):.1%}, "
+          f"{seconds / len(rows) * 1e3:.3f} ms/question")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--llm', action='store_true', help='also run escalated questions through OpenAI')
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    texts = [row['text'] for row in fixtures]
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        results = [intent_classifier.classify(text) for text in texts]
+    single = (time.perf_counter() - start) / args.rounds
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        intent_classifier.classify_batch(texts)
+    batch = (time.perf_counter() - start) / args.rounds
+
+    local = [(row, result['primary_intent']) for row, result in zip(fixtures, results)
+             if result['confidence'] >= LOCAL_INTENT_THRESHOLD]
+    escalated = [row for row, result in zip(fixtures, results) if result['confidence'] < LOCAL_INTENT_THRESHOLD]
+    print(f"threshold {LOCAL_INTENT_THRESHOLD}, local tier answers {len(local)}/{len(fixtures)}")
+    report('local', local, single * len(local) / len(fixtures))
+    print(f" batch: {batch / len(fixtures) * 1e3:.3f} ms/question")
+
+    if args.llm:
+        from src.services.intent_analyzer import analyze_intent_llm
+        start = time.perf_counter()
+        llm = [(row, analyze_intent_llm(row['text']).get('primary_intent')) for row in escalated]
+        report('llm', llm, time.perf_counter() - start)
+    else:
+        print(f"   llm: {len(escalated)} questions escalated (pass --llm to measure)")
+
+
+if __name__ == '__main__':
+    main()
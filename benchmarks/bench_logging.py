@@ -0,0 +1,83 @@
+"""
+Benchmark for webhook logging overhead
+
+Replays synthesized webhook payloads through the app's payload handler
+under three logging setups and reports per-request latency:
+
+- sync-text: every payload logged whole and written on the request thread,
+  as with the old basicConfig setup
+- async-text: every payload logged, but written by a background thread
+- sync-json: JSON records with sampled, truncated payloads, still written
+  on the request thread
+- async-json: the default pipeline, with records written by a background
+  thread
+
+Log output goes to a temporary file so writes cost what they do in
+production. Answering is stubbed out, so only the webhook path is timed.
+Run from the repository root:
+
+    python -m benchmarks.bench_logging [--payloads 5000] [--sessions 50]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.bench_segments import overlapping_stream
+from src import app
+from src.utils import log_pipeline
+from src.utils.log_pipeline import configure_logging, stop_logging
+
+SETUPS = (
+    ('sync-text', dict(fmt='text', background=False), 1.0),
+    ('async-text', dict(fmt='text', background=True), 1.0),
+    ('sync-json', dict(fmt='json', background=False), None),
+    ('async-json', dict(fmt='json', background=True), None),
+)
+
+
+def payloads(count: int, sessions: int, prefix: str):
+    """Payloads for fresh sessions, so every setup sees the same amount of new text"""
+    stream, _ = overlapping_stream(count, window=8)
+    return [
+        {'session_id': f"{prefix}-{index % sessions}", 'segments': segments}
+        for index, segments in enumerate(stream)
+    ]
+
+
+def replay(batch):
+    latencies = []
+    for data in batch:
+        start = time.perf_counter()
+        app.handle_payload(data)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--payloads', type=int, default=5000)
+    parser.add_argument('--sessions', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.payloads} payloads across {args.sessions} sessions")
+    print(f"{'setup':>12} {'p50 us':>9} {'p99 us':>9} {'mean us':>9} {'log MB':>8}")
+    with mock.patch.object(app.answer_queue, 'submit', return_value=True), tempfile.TemporaryDirectory() as directory:
+        for name, options, sample_rate in SETUPS:
+            batch = payloads(args.payloads, args.sessions, f"bench-{name}")
+            path = f"{directory}/{name}.log"
+            with open(path, 'w') as output, \
+                    mock.patch.object(log_pipeline, 'LOG_PAYLOAD_SAMPLE_RATE', sample_rate or log_pipeline.LOG_PAYLOAD_SAMPLE_RATE):
+                configure_logging(level='INFO', stream=output, **options)
+                latencies = sorted(replay(batch))
+                stop_logging()
+                size = output.tell()
+            print(f"{name:>12} {statistics.median(latencies) * 1e6:>9.1f} "
+                  f"{latencies[int(len(latencies) * 0.99)] * 1e6:>9.1f} "
+                  f"{statistics.fmean(latencies) * 1e6:>9.1f} {size / 1e6:>8.2f}")
+    configure_logging()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Churn benchmark for MessageBuffer
+
+Several threads create and touch 100k sessions while expiry runs, comparing
+the single-lock buffer with inline O(n) cleanup against the sharded buffer
+with a heap-driven sweeper. Run from the repository root:
+
+    python -m benchmarks.bench_message_buffer [--sessions 100000] [--threads 8]
+"""
+import argparse
+import threading
+import time
+
+from src.models.message_buffer import MessageBuffer
+from src.models.session_store import InMemorySessionStore
+
+
+class LegacyMessageBuffer:
+    """The original single-lock buffer, kept here as the baseline"""
+
+    def __init__(self, cleanup_interval, session_expiry):
+        self.buffers = {}
+        self.lock = threading.Lock()
+        self.cleanup_interval = cleanup_interval
+        self.session_expiry = session_expiry
+        self.last_cleanup = time.time()
+
+    def get_buffer(self, session_id):
+        current_time = time.time()
+        if current_time - self.last_cleanup > self.cleanup_interval:
+            self.cleanup_old_sessions()
+        with self.lock:
+            if session_id not in self.buffers:
+                self.buffers[session_id] = {
+                    'messages': [], 'trigger_detected': False, 'trigger_time': 0,
+                    'collected_question': [], 'response_sent': False,
+                    'partial_trigger': False, 'partial_trigger_time': 0,
+                    'last_activity': current_time
+                }
+            else:
+                self.buffers[session_id]['last_activity'] = current_time
+        return self.buffers[session_id]
+
+    def cleanup_old_sessions(self):
+        current_time = time.time()
+        with self.lock:
+            expired = [
+                session_id for session_id, data in self.buffers.items()
+                if current_time - data['last_activity'] > self.session_expiry
+            ]
+            for session_id in expired:
+                del self.buffers[session_id]
+            self.last_cleanup = current_time
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def churn(buffer, sessions, threads, touches):
+    latencies = [[] for _ in range(threads)]
+
+    def worker(index):
+        samples = latencies[index]
+        for n in range(index, sessions * touches, threads):
+            session_id = f"session-{n % sessions}"
+            start = time.perf_counter()
+            buffer.get_buffer(session_id)
+            samples.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    merged = [sample for samples in latencies for sample in samples]
+    return elapsed, len(merged) / elapsed, percentile(merged, 0.99) * 1e6, max(merged) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=100_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--touches', type=int, default=3)
+    # A short expiry and interval make several sweeps happen during the run
+    parser.add_argument('--expiry', type=float, default=2.0)
+    parser.add_argument('--interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    candidates = {
+        'legacy': LegacyMessageBuffer(cleanup_interval=args.interval, session_expiry=args.expiry),
+        'sharded': MessageBuffer(cleanup_interval=args.interval, store=InMemorySessionStore(args.expiry)),
+    }
+    print(f"{'buffer':>8} {'seconds':>8} {'ops/s':>10} {'p99 us':>8} {'max us':>10}")
+    for name, buffer in candidates.items():
+        elapsed, throughput, p99, worst = churn(buffer, args.sessions, args.threads, args.touches)
+        print(f"{name:>8} {elapsed:>8.2f} {throughput:>10.0f} {p99:>8.1f} {worst:>10.1f}")
+    candidates['sharded'].stop()
+
+
+if __name__ == '__main__':
+    main()
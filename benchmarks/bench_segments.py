@@ -0,0 +1,101 @@
+"""
+Benchmark for incremental segment processing
+
+Simulates a device that resends a sliding window of recent segments on
+every webhook, with the last segment still growing as the speaker talks.
+Compares rescanning every segment in every payload against consuming only
+text past the session watermark, and counts how many wake word matches
+each approach sees. Run from the repository root:
+
+    python -m benchmarks.bench_segments [--payloads 2000] [--window 8]
+"""
+import argparse
+import random
+import time
+
+from src.config import TRIGGER_PHRASES, TRIGGER_ALIASES, PARTIAL_FIRST, PARTIAL_SECOND
+from src.models.session_state import SessionState
+from src.services.segments import consume_segments
+from src.services.wake_word import WakeWordEngine
+
+UTTERANCES = [
+    "so i was telling him about the trip last weekend",
+    "hey omi what's the tallest mountain in the world",
+    "and then we went to the store to pick up some groceries for dinner",
+    "can you believe the game last night it was unreal",
+    "hey omi remind me what the capital of australia is",
+    "i think we should leave around six if the traffic is bad",
+]
+
+
+def overlapping_stream(payloads: int, window: int, seed: int = 7):
+    """Build payloads the way devices send them: recent segments plus a growing tail"""
+    rng = random.Random(seed)
+    segments, stream = [], []
+    clock = 0.0
+    words, spoken, asked = [], 0, 0
+    for _ in range(payloads):
+        if spoken >= len(words):
+            words, spoken = rng.choice(UTTERANCES).split(), 0
+            asked += words[:2] == ['hey', 'omi']
+            segments.append({'start': clock, 'end': clock, 'text': ''})
+        spoken = min(len(words), spoken + rng.randint(1, 4))
+        clock += 0.4
+        segments[-1] = {'start': segments[-1]['start'], 'end': clock, 'text': ' '.join(words[:spoken])}
+        stream.append(segments[-window:])
+    return stream, asked
+
+
+def detect(engine, texts, pending):
+    """Count wake words, following a trigger split across two pieces of text"""
+    matches = 0
+    for text in texts:
+        if engine.match(text) or (pending and engine.match_partial(text)):
+            matches += 1
+        pending = engine.ends_with_partial(text)
+    return matches, pending
+
+
+def rescan(engine, payloads):
+    matches = 0
+    for payload in payloads:
+        texts = [segment.get('text', '').lower().strip() for segment in payload]
+        found, _ = detect(engine, [text for text in texts if text], False)
+        matches += found
+    return matches
+
+
+def incremental(engine, payloads):
+    state = SessionState(0.0)
+    matches, pending = 0, False
+    for payload in payloads:
+        found, pending = detect(engine, consume_segments(state, payload).texts, pending)
+        matches += found
+    return matches
+
+
+def timed(func, engine, payloads):
+    start = time.perf_counter()
+    matches = func(engine, payloads)
+    return (time.perf_counter() - start) / len(payloads) * 1e6, matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--payloads', type=int, default=2000)
+    parser.add_argument('--window', type=int, default=8)
+    args = parser.parse_args()
+
+    engine = WakeWordEngine(TRIGGER_PHRASES + TRIGGER_ALIASES, PARTIAL_FIRST, PARTIAL_SECOND)
+    payloads, asked = overlapping_stream(args.payloads, args.window)
+    segments = sum(len(payload) for payload in payloads)
+    print(f"{len(payloads)} payloads, {segments / len(payloads):.1f} segments per payload, "
+          f"{asked} spoken wake words")
+    print(f"{'approach':>12} {'us/payload':>12} {'trigger matches':>16}")
+    for name, func in (('rescan', rescan), ('watermark', incremental)):
+        per_payload, matches = timed(func, engine, payloads)
+        print(f"{name:>12} {per_payload:>12.2f} {matches:>16}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark for the session journal
+
+Two measurements:
+
+- webhook: replays synthesized webhook payloads through the app's payload
+  handler with the plain in-memory store and with the journaled store, and
+  reports per-request latency and how many records and fsyncs the journal
+  needed
+- replay: fills a journaled store with --sessions sessions (a share of them
+  already expired), snapshots it, updates a tenth of them again and times
+  how long a new store takes to restore the live ones
+
+Run from the repository root:
+
+    python -m benchmarks.bench_session_journal [--payloads 5000] [--sessions 100000]
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.bench_logging import payloads, replay
+from src import app
+from src.models.message_buffer import MessageBuffer
+from src.models.session_journal import JournaledSessionStore
+from src.models.session_store import InMemorySessionStore
+from src.services.conversation import USER, ASSISTANT, remember
+
+
+def directory_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def bench_webhook(count: int, sessions: int, directory: str):
+    print(f"webhook: {count} payloads across {sessions} sessions")
+    print(f"{'store':>10} {'p50 us':>9} {'p99 us':>9} {'mean us':>9} {'records':>9} {'fsyncs':>7}")
+    stores = (
+        ('memory', lambda: InMemorySessionStore()),
+        ('journal', lambda: JournaledSessionStore(os.path.join(directory, 'webhook'))),
+    )
+    with mock.patch.object(app.answer_queue, 'submit', return_value=True):
+        with mock.patch.object(app, 'message_buffer', MessageBuffer(store=InMemorySessionStore())):
+            replay(payloads(1000, sessions, 'bench-journal-warm-up'))
+        for name, create in stores:
+            store = create()
+            batch = payloads(count, sessions, f"bench-journal-{name}")
+            with mock.patch.object(app, 'message_buffer', MessageBuffer(store=store)):
+                latencies = sorted(replay(batch))
+            store.close()
+            journal = isinstance(store, JournaledSessionStore)
+            records = int(store.sequence_number) if journal else 0
+            fsyncs = store.commit_seconds.count if journal else 0
+            print(f"{name:>10} {statistics.median(latencies) * 1e6:>9.1f} "
+                  f"{latencies[int(len(latencies) * 0.99)] * 1e6:>9.1f} "
+                  f"{statistics.fmean(latencies) * 1e6:>9.1f} {records:>9} {fsyncs:>7}")
+
+
+def bench_replay(sessions: int, expired_share: float, directory: str):
+    path = os.path.join(directory, 'replay')
+    store = JournaledSessionStore(path, session_expiry=3600, commit_interval=3600)
+    now = time.time()
+    expired = int(sessions * expired_share)
+    for index in range(sessions):
+        with store.transaction(f"session-{index}") as state:
+            remember(state, USER, 'what is the tallest mountain in the world?')
+            remember(state, ASSISTANT, 'Mount Everest, at 8,849 metres above sea level.')
+            if index < expired:
+                state.last_activity = now - 7200
+    store.commit()
+    store.snapshot()
+    for index in range(0, sessions, 10):
+        with store.transaction(f"session-{index}") as state:
+            state.trigger_detected = True
+            state.collected_question.append('and how tall is k2')
+    store.close()
+
+    start = time.perf_counter()
+    restored = JournaledSessionStore(path, session_expiry=3600, commit_interval=3600)
+    elapsed = time.perf_counter() - start
+    restored.close()
+    print(f"replay: {sessions} sessions ({expired} expired), {directory_size(path) / 1e6:.1f} MB on disk")
+    print(f"  restored {restored.restored} sessions in {elapsed:.2f}s "
+          f"({elapsed / max(1, restored.restored) * 1e6:.1f} us per session)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--payloads', type=int, default=5000)
+    parser.add_argument('--webhook-sessions', type=int, default=50)
+    parser.add_argument('--sessions', type=int, default=100000, help='sessions for the replay benchmark')
+    parser.add_argument('--expired-share', type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        bench_webhook(args.payloads, args.webhook_sessions, directory)
+        bench_replay(args.sessions, args.expired_share, directory)
+
+
+if __name__ == '__main__':
+    main()
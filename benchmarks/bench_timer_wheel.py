@@ -0,0 +1,93 @@
+"""
+Benchmark for the question deadline scheduler
+
+Schedules, reschedules and cancels deadlines for many sessions, the way
+triggers and early answers do, and compares the timer wheel against a
+heap with a key index (cancel by marking entries dead). Run from the
+repository root:
+
+    python -m benchmarks.bench_timer_wheel [--sessions 100000]
+"""
+import argparse
+import heapq
+import itertools
+import random
+import time
+
+from src.utils.timer_wheel import TimerWheel
+
+
+class HeapScheduler:
+    """Baseline: a heap of deadlines, cancelled lazily through a key index"""
+
+    def __init__(self):
+        self.heap = []
+        self.live = {}
+        self.sequence = itertools.count()
+
+    def schedule(self, key, deadline, callback):
+        entry = [deadline, next(self.sequence), key, callback]
+        previous = self.live.pop(key, None)
+        if previous is not None:
+            previous[3] = None
+        self.live[key] = entry
+        heapq.heappush(self.heap, entry)
+
+    def cancel(self, key):
+        entry = self.live.pop(key, None)
+        if entry is not None:
+            entry[3] = None
+
+    def advance(self, now):
+        fired = 0
+        while self.heap and self.heap[0][0] <= now:
+            _, _, key, callback = heapq.heappop(self.heap)
+            if callback is not None:
+                del self.live[key]
+                callback()
+                fired += 1
+        return fired
+
+
+def run(scheduler, sessions, seed=3):
+    rng = random.Random(seed)
+    now = 1000.0
+    noop = lambda: None
+    start = time.perf_counter()
+    for session in range(sessions):
+        scheduler.schedule(session, now + rng.uniform(0.0, 5.0), noop)
+    schedule_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for session in rng.sample(range(sessions), sessions // 2):
+        if session % 2:
+            scheduler.cancel(session)
+        else:
+            scheduler.schedule(session, now + rng.uniform(0.0, 5.0), noop)
+    update_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fired = 0
+    for step in range(1, 121):
+        fired += scheduler.advance(now + step * 0.05)
+    advance_elapsed = time.perf_counter() - start
+    return schedule_elapsed, update_elapsed, advance_elapsed, fired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sessions', type=int, default=100000)
+    args = parser.parse_args()
+
+    wheel = TimerWheel(tick=0.05, clock=lambda: 1000.0)
+    wheel.thread = object()  # advanced by hand below
+    print(f"{'scheduler':>10} {'schedule us':>12} {'update us':>10} {'advance ms':>11} {'fired':>7}")
+    for name, scheduler in (('heap', HeapScheduler()), ('wheel', wheel)):
+        schedule_elapsed, update_elapsed, advance_elapsed, fired = run(scheduler, args.sessions)
+        print(f"{name:>10} {schedule_elapsed / args.sessions * 1e6:>12.2f} "
+              f"{update_elapsed / (args.sessions // 2) * 1e6:>10.2f} "
+              f"{advance_elapsed * 1e3:>11.1f} {fired:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark for wake word detection as the phrase list grows
+
+Compares the old per-phrase substring scan against the compiled
+WakeWordEngine. Run from the repository root:
+
+    python -m benchmarks.bench_wake_word
+"""
+import random
+import string
+import time
+
+from src.services.wake_word import WakeWordEngine
+
+SEGMENTS = [
+    "so i was telling him about the trip last weekend",
+    "hey omi what's the tallest mountain in the world",
+    "and then we went to the store to pick up some groceries for dinner",
+    "can you believe the game last night it was unreal",
+    "hey, omi remind me what the capital of australia is",
+]
+PHRASE_COUNTS = [2, 10, 50, 200, 1000]
+ROUNDS = 2000
+
+
+def synthetic_phrases(count: int) -> list:
+    rng = random.Random(count)
+    phrases = ["hey omi", "hey, omi"]
+    while len(phrases) < count:
+        first = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 5)))
+        second = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 6)))
+        phrases.append(f"{first} {second}")
+    return phrases
+
+
+def naive_scan(phrases, text):
+    if any(trigger in text for trigger in phrases):
+        for trigger in phrases:
+            if trigger in text:
+                return text.split(trigger)[-1].strip()
+    return None
+
+
+def per_segment_us(func) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text in SEGMENTS:
+            func(text)
+    return (time.perf_counter() - start) / (ROUNDS * len(SEGMENTS)) * 1e6
+
+
+def main():
+    print(f"{'phrases':>8} {'naive us/seg':>14} {'engine us/seg':>14}")
+    for count in PHRASE_COUNTS:
+        phrases = synthetic_phrases(count)
+        engine = WakeWordEngine(phrases)
+        naive = per_segment_us(lambda text: naive_scan(phrases, text))
+        compiled = per_segment_us(engine.match)
+        print(f"{count:>8} {naive:>14.2f} {compiled:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
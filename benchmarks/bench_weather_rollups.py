@@ -0,0 +1,91 @@
+"""
+Benchmark for bulk daily forecast rollups
+
+Fetches the 5-day forecast for many cities from the mock OpenWeatherMap
+server and reduces it to daily min/max/mean temperatures. Compares a
+per-city loop (one request after another, daily stats built from per-entry
+dicts) with WeatherService.get_daily_forecasts (concurrent fetches on the
+pooled session, one vectorized rollup). Also times the rollup step alone on
+already fetched forecasts. Run from the repository root:
+
+    python -m benchmarks.bench_weather_rollups [--cities 300] [--latency fixed:0.02]
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks.mock_servers import start_weather_mock
+from src.services.weather_service import WeatherService, daily_rollups
+
+
+def loop_rollup(data):
+    """Baseline: group per-entry dicts by day in Python"""
+    days = {}
+    for item in data['list']:
+        day = datetime.fromtimestamp(item['dt'] + data['city'].get('timezone', 0), timezone.utc).strftime('%Y-%m-%d')
+        days.setdefault(day, []).append(item['main']['temp'])
+    return {
+        'location': data['city']['name'],
+        'country': data['city']['country'],
+        'days': [
+            {'date': day, 'min': min(temps), 'max': max(temps), 'mean': round(sum(temps) / len(temps), 1)}
+            for day, temps in days.items()
+        ]
+    }
+
+
+def per_city_loop(base_url, cities):
+    session = requests.Session()
+    results, payloads = {}, {}
+    for city in cities:
+        response = session.get(f"{base_url}/forecast", params={'q': city, 'appid': 'bench', 'units': 'metric'}, timeout=10)
+        payloads[city] = response.json()
+        results[city] = loop_rollup(payloads[city])
+    return results, payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cities', type=int, default=300)
+    parser.add_argument('--latency', default='fixed:0.02', help='mock upstream latency distribution')
+    parser.add_argument('--pool-size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=20, help='rollup-only repetitions')
+    args = parser.parse_args()
+
+    server = start_weather_mock(args.latency)
+    cities = [f'city-{index}' for index in range(args.cities)]
+
+    start = time.perf_counter()
+    baseline, payloads = per_city_loop(server.url, cities)
+    loop_elapsed = time.perf_counter() - start
+
+    service = WeatherService('bench', base_url=server.url, pool_size=args.pool_size)
+    start = time.perf_counter()
+    batch = service.get_daily_forecasts(cities)
+    batch_elapsed = time.perf_counter() - start
+    mismatched = sum(
+        [day['mean'] for day in baseline[city]['days']] != batch[city]['mean'] for city in cities
+    )
+
+    print(f"{args.cities} cities, upstream latency {args.latency}, {mismatched} mismatched rollups")
+    print(f"{'approach':>10} {'fetch+rollup s':>15} {'rollup ms':>10}")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for city in cities:
+            loop_rollup(payloads[city])
+    loop_rollup_ms = (time.perf_counter() - start) / args.repeat * 1e3
+    print(f"{'loop':>10} {loop_elapsed:>15.2f} {loop_rollup_ms:>10.2f}")
+
+    series = {city: WeatherService._parse_forecast_series(payloads[city]) for city in cities}
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        daily_rollups(series)
+    batch_rollup_ms = (time.perf_counter() - start) / args.repeat * 1e3
+    print(f"{'batch':>10} {batch_elapsed:>15.2f} {batch_rollup_ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
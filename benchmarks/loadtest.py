@@ -0,0 +1,280 @@
+"""
+Offline replay and load test for the webhook
+
+Replays recorded webhook payloads, or synthesizes multi-session segment
+streams, against the Flask app (or src.asgi with --asgi) with local mock servers standing in for
+OpenAI and OpenWeatherMap. Reports webhook latency percentiles, throughput,
+answered-question latency and memory growth per session, and exits non-zero
+when a regression gate is exceeded. Run from the repository root:
+
+    python -m benchmarks.loadtest --sessions 200 --concurrency 50 \\
+        --openai-latency lognormal:0.8,0.4 --max-p99-ms 50
+
+Replay files hold one webhook payload per line ({"session_id": ..., "segments": [...]}),
+optionally with a "delay" in seconds to wait before sending it.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.mock_servers import latency_distribution, start_openai_mock, start_weather_mock
+
+CHATTER = [
+    "so i was telling her about the trip",
+    "yeah the traffic this morning was terrible",
+    "we should grab lunch later",
+    "i think the meeting got moved",
+    "did you see the game last night",
+]
+QUESTIONS = [
+    "what's the tallest mountain in the world?",
+    "who wrote pride and prejudice?",
+    "what's the weather in london?",
+    "how far away is the moon?",
+    "what's the capital of australia?",
+]
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def synthesize(sessions, payloads, question_every, seed=0):
+    """Build Omi-style segment streams that resend the previous segment with each payload"""
+    rng = random.Random(seed)
+    streams = {}
+    for index in range(sessions):
+        session_id = f"loadtest-{index}"
+        stream, previous, clock = [], None, 0.0
+        for number in range(payloads):
+            if question_every and number % question_every == question_every - 1:
+                texts = ["hey omi", rng.choice(QUESTIONS)]
+            else:
+                texts = [rng.choice(CHATTER)]
+            segments = [] if previous is None else [previous]
+            for text in texts:
+                segment = {'id': f"{session_id}-{number}-{len(segments)}", 'text': text,
+                           'speaker': 'SPEAKER_00', 'start': clock, 'end': clock + 1.5}
+                clock += 1.5
+                segments.append(segment)
+            previous = segments[-1]
+            stream.append({'session_id': session_id, 'segments': segments})
+        streams[session_id] = stream
+    return streams
+
+
+def load_replay(path):
+    streams = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                payload = json.loads(line)
+                streams[payload['session_id']].append(payload)
+    return dict(streams)
+
+
+class AnswerReceiver(ThreadingHTTPServer):
+    """Callback endpoint recording when answer parts reach the wearer"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _ReceiverHandler)
+        self.arrivals = defaultdict(list)
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/answers"
+
+
+class _ReceiverHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        with self.server.lock:
+            self.server.arrivals[payload['session_id']].append(time.perf_counter())
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_app(args, receiver):
+    """Configure the environment for the mocks, then import and serve the app"""
+    openai_mock = start_openai_mock(args.openai_latency, args.token_delay)
+    weather_mock = start_weather_mock(args.weather_latency)
+    os.environ['OPENAI_BASE_URL'] = f"{openai_mock.url}/v1"
+    os.environ.setdefault('OPENAI_API_KEY', 'loadtest')
+    os.environ['OPENWEATHER_BASE_URL'] = weather_mock.url
+    os.environ.setdefault('OPENWEATHER_API_KEY', 'loadtest')
+    os.environ['ANSWER_CALLBACK_URL'] = receiver.url
+    # src.config reads the environment set above
+    from src.config import FAST_MODEL
+    if args.fast_model_latency:
+        openai_mock.model_latencies[FAST_MODEL] = latency_distribution(args.fast_model_latency)
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.asgi:
+        return serve_asgi(), openai_mock, weather_mock
+
+    from werkzeug.serving import make_server
+    from src.app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", openai_mock, weather_mock
+
+
+def serve_asgi():
+    """Serve src.asgi with uvicorn on a background thread"""
+    import socket
+    import uvicorn
+    from src.asgi import app
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level='warning', backlog=4096))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def run_device(target, stream, interval, results, questions):
+    """Send one session's payloads in order, like a single wearable"""
+    session = requests.Session()
+    for payload in stream:
+        time.sleep(payload.get('delay', interval))
+        body = {'session_id': payload['session_id'], 'segments': payload['segments']}
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{target}/webhook", json=body, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        latency = time.perf_counter() - start
+        results.append((latency, status))
+        if status == 202:
+            questions.append((payload['session_id'], start))
+
+
+def match_answers(receiver, questions):
+    """Pair each queued question with the first answer part that arrived after it"""
+    with receiver.lock:
+        arrivals = {session_id: sorted(times) for session_id, times in receiver.arrivals.items()}
+    latencies = []
+    for session_id, sent in questions:
+        later = [arrived for arrived in arrivals.get(session_id, []) if arrived >= sent]
+        if later:
+            latencies.append(later[0] - sent)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replay', help='JSONL file of recorded webhook payloads')
+    parser.add_argument('--sessions', type=int, default=100, help='synthesized sessions')
+    parser.add_argument('--payloads', type=int, default=20, help='payloads per synthesized session')
+    parser.add_argument('--question-every', type=int, default=10, help='ask a question every N payloads')
+    parser.add_argument('--concurrency', type=int, default=32, help='devices sending at the same time')
+    parser.add_argument('--interval', type=float, default=0.2, help='seconds between payloads from one device')
+    parser.add_argument('--asgi', action='store_true', help='serve src.asgi with uvicorn instead of the Flask app')
+    parser.add_argument('--openai-latency', default='lognormal:0.8,0.4')
+    parser.add_argument('--fast-model-latency', help='latency of FAST_MODEL requests (default: --openai-latency)')
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    parser.add_argument('--weather-latency', default='fixed:0.1')
+    parser.add_argument('--drain', type=float, default=30, help='seconds to wait for outstanding answers')
+    parser.add_argument('--trace-memory', action='store_true', help='measure Python heap growth with tracemalloc')
+    parser.add_argument('--max-p99-ms', type=float, help='fail if webhook p99 exceeds this')
+    parser.add_argument('--min-throughput', type=float, help='fail if webhook throughput falls below this')
+    parser.add_argument('--max-answer-p95-ms', type=float, help='fail if answer p95 exceeds this')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    receiver = AnswerReceiver()
+    target, openai_mock, weather_mock = start_app(args, receiver)
+    streams = load_replay(args.replay) if args.replay else synthesize(args.sessions, args.payloads, args.question_every)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0] if args.trace_memory else 0
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    results, questions = deque(), deque()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as devices:
+        for stream in streams.values():
+            devices.submit(run_device, target, stream, args.interval, results, questions)
+    elapsed = time.perf_counter() - start
+
+    deadline = time.time() + args.drain
+    answer_latencies = match_answers(receiver, questions)
+    while len(answer_latencies) < len(questions) and time.time() < deadline:
+        time.sleep(0.1)
+        answer_latencies = match_answers(receiver, questions)
+
+    from src.app import message_buffer
+    heap_growth = tracemalloc.get_traced_memory()[0] - heap_before if args.trace_memory else None
+    rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    latencies = [latency for latency, _ in results]
+    statuses = defaultdict(int)
+    for _, status in results:
+        statuses[str(status)] += 1
+
+    report = {
+        'sessions': len(streams),
+        'webhooks': len(results),
+        'statuses': dict(statuses),
+        'throughput_rps': len(results) / elapsed,
+        'webhook_p50_ms': percentile(latencies, 0.50) * 1e3,
+        'webhook_p95_ms': percentile(latencies, 0.95) * 1e3,
+        'webhook_p99_ms': percentile(latencies, 0.99) * 1e3,
+        'questions': len(questions),
+        'answered': len(answer_latencies),
+        'answer_p50_ms': (percentile(answer_latencies, 0.50) or 0) * 1e3,
+        'answer_p95_ms': (percentile(answer_latencies, 0.95) or 0) * 1e3,
+        'openai_requests': openai_mock.requests,
+        'openai_requests_by_model': dict(openai_mock.model_requests),
+        'weather_requests': weather_mock.requests,
+        'active_sessions': len(message_buffer),
+        'rss_growth_per_session_bytes': rss_growth / max(1, len(streams)),
+        'heap_growth_per_session_bytes': heap_growth / max(1, len(streams)) if heap_growth is not None else None,
+    }
+    for key, value in report.items():
+        print(f"{key:>32}: {round(value, 2) if isinstance(value, float) else value}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if args.max_p99_ms is not None and report['webhook_p99_ms'] > args.max_p99_ms:
+        failures.append(f"webhook p99 {report['webhook_p99_ms']:.1f}ms > {args.max_p99_ms}ms")
+    if args.min_throughput is not None and report['throughput_rps'] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_rps']:.1f}/s < {args.min_throughput}/s")
+    if args.max_answer_p95_ms is not None and report['answer_p95_ms'] > args.max_answer_p95_ms:
+        failures.append(f"answer p95 {report['answer_p95_ms']:.1f}ms > {args.max_answer_p95_ms}ms")
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
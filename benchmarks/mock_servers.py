@@ -0,0 +1,172 @@
+"""
+Local stand-ins for the OpenAI and OpenWeatherMap HTTP APIs
+
+Each server runs on a background thread and sleeps for a latency drawn from
+a configurable distribution before answering. Distributions are written as
+"fixed:SECONDS", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA". The OpenAI
+mock can use a different distribution per requested model.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+WEATHER_RE = re.compile(r"\b(?:weather|temperature|forecast|rain)\b.*?\bin ([a-z ]+?)\W*$")
+
+
+def latency_distribution(spec: str) -> Callable[[], float]:
+    kind, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(',') if value]
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency: str):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency_distribution(latency)
+        self.requests = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _OpenAIHandler(_Handler):
+    ANSWER = "That is a great question. Here is a short answer that is long enough to be read aloud."
+
+    def do_POST(self):
+        self.server.count()
+        request = self.read_json()
+        model = request.get('model')
+        with self.server.lock:
+            self.server.model_requests[model] = self.server.model_requests.get(model, 0) + 1
+        time.sleep(self.server.model_latencies.get(model, self.server.latency)())
+        messages = request.get('messages', [])
+        question = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+        weather = WEATHER_RE.search(question.lower())
+
+        if request.get('response_format', {}).get('type') == 'json_object':
+            intent = 'weather' if weather else 'unknown'
+            entities = [{'type': 'location', 'value': weather.group(1)}] if weather else []
+            content = json.dumps({'primary_intent': intent, 'confidence': 0.9, 'entities': entities,
+                                  'requires_clarification': False})
+            return self.complete(request, content)
+        if request.get('tools') and weather and messages[-1].get('role') != 'tool':
+            return self.tool_call(request, weather.group(1))
+        return self.complete(request, self.ANSWER)
+
+    def complete(self, request, content):
+        if not request.get('stream'):
+            return self.send_json({
+                'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 20, 'completion_tokens': 20, 'total_tokens': 40}
+            })
+        self.stream(request, [{'content': word} for word in re.findall(r'\S+\s*', content)], 'stop')
+
+    def tool_call(self, request, location):
+        call = {'index': 0, 'id': 'call_mock', 'type': 'function',
+                'function': {'name': 'get_weather', 'arguments': json.dumps({'location': location})}}
+        if not request.get('stream'):
+            return self.send_json({
+                'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'finish_reason': 'tool_calls',
+                             'message': {'role': 'assistant', 'content': None, 'tool_calls': [call]}}]
+            })
+        self.stream(request, [{'tool_calls': [call]}], 'tool_calls')
+
+    def stream(self, request, deltas, finish_reason):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for index, delta in enumerate(deltas + [{}]):
+            chunk = {
+                'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': None if delta else finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class _WeatherHandler(_Handler):
+    def do_GET(self):
+        self.server.count()
+        time.sleep(self.server.latency())
+        if self.path.startswith('/forecast'):
+            city = parse_qs(urlparse(self.path).query).get('q', ['Mockville'])[0]
+            return self.send_json({
+                'city': {'name': city, 'country': 'MC', 'timezone': 0},
+                'list': [
+                    {'dt': 1700000000 + 10800 * index, 'dt_txt': f'2026-10-{18 + index // 8:02d} {index % 8 * 3:02d}:00:00',
+                     'main': {'temp': 10 + index % 8, 'temp_min': 8, 'temp_max': 18, 'humidity': 70},
+                     'weather': [{'description': 'scattered clouds'}]}
+                    for index in range(40)
+                ]
+            })
+        return self.send_json({
+            'main': {'temp': 14.2, 'feels_like': 13.1, 'humidity': 72},
+            'weather': [{'description': 'scattered clouds'}],
+            'wind': {'speed': 4.2},
+            'name': 'Mockville',
+            'sys': {'country': 'MC'}
+        })
+
+
+def start_openai_mock(latency: str = 'fixed:0.5', token_delay: float = 0.005,
+                      model_latencies: Optional[Dict[str, str]] = None) -> _MockServer:
+    server = _MockServer(_OpenAIHandler, latency)
+    server.token_delay = token_delay
+    server.model_latencies = {model: latency_distribution(spec) for model, spec in (model_latencies or {}).items()}
+    server.model_requests = {}
+    return server
+
+
+def start_weather_mock(latency: str = 'fixed:0.1') -> _MockServer:
+    return _MockServer(_WeatherHandler, latency)
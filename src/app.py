@@ -1,155 +1,407 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import atexit
 import logging
 import time
-from collections import defaultdict
 from src.models.message_buffer import MessageBuffer
-from src.services.openai_service import get_openai_response
+from src.services.openai_service import (
+    get_openai_response, stream_openai_response, latency_summary, FALLBACK_RESPONSE, BUSY_RESPONSE
+)
+from src.services.admission import admission, shed, take_session_token
+from src.services.answer_cache import AnswerCache
+from src.services.question_router import route_question, stream_route_question, router_summary
+from src.services.prefetch import speculation_summary
+from src.services.model_router import model_router
+from src.services.upstream import breaker_summary
+from src.services.registry import services
+from src.services.wake_word import WakeWordEngine
+from src.services.segments import consume_segments
+from src.services.conversation import HEARD, build_history, is_follow_up, remember, remember_turn
+from src.models.session_store import create_session_store
+from src.services.answer_queue import AnswerQueue, CallbackSink, SessionSink
 from src.config import (
-    TRIGGER_PHRASES, PARTIAL_FIRST, PARTIAL_SECOND,
-    QUESTION_AGGREGATION_TIME, NOTIFICATION_COOLDOWN,
+    TRIGGER_PHRASES, TRIGGER_ALIASES, PARTIAL_FIRST, PARTIAL_SECOND,
+    QUESTION_AGGREGATION_TIME, NOTIFICATION_COOLDOWN, SESSION_EXPIRY,
+    SESSION_STORE, SESSION_DB_PATH, SESSION_JOURNAL_DIR,
+    ANSWER_WORKERS, ANSWER_QUEUE_SIZE, ANSWER_DEADLINE, ANSWER_CALLBACK_URL,
+    STREAM_ANSWERS, ANSWER_MODE, WARM_UP_SERVICES,
     PORT, DEBUG
 )
-from src.services.intent_analyzer import analyze_intent, get_intent_response
-import threading
+from src.utils.metrics import metrics, stage_timer, count
+from src.utils.log_pipeline import configure_logging, log_payload, log_session
+from src.utils.timer_wheel import TimerWheel
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Set up logging; records are written by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 start_time = time.time()
 
-# Initialize message buffer and cooldowns
-message_buffer = MessageBuffer()
-notification_cooldowns = defaultdict(float)
+# Initialize message buffer; cooldowns and pending answers live in the session state
+message_buffer = MessageBuffer(
+    store=create_session_store(
+        SESSION_STORE, SESSION_JOURNAL_DIR if SESSION_STORE == 'journal' else SESSION_DB_PATH, SESSION_EXPIRY
+    )
+)
+# A journaled store commits its pending updates on the way out
+atexit.register(message_buffer.stop)
+
+# Wake word matcher compiled once from the configured phrases
+wake_words = WakeWordEngine(TRIGGER_PHRASES + TRIGGER_ALIASES, PARTIAL_FIRST, PARTIAL_SECOND)
+
+# Repeated questions are answered from cache; failed and shed answers are never cached
+answer_cache = AnswerCache(is_cacheable=lambda answer: bool(answer) and answer not in (FALLBACK_RESPONSE, BUSY_RESPONSE))
+
+def answer_question(question, history=()):
+    """
+    Answer a question from cache or OpenAI, streaming the answer when enabled
+    Follow-ups and questions about what was said, asked with conversation
+    history, bypass the cache: their answer draws on what this session heard
+    and must not be served to others. Other questions are cached as usual.
+    """
+    contextual = bool(history) and is_follow_up(question)
+    if STREAM_ANSWERS:
+        stream = stream_route_question if ANSWER_MODE == 'router' else stream_openai_response
+        return answer_cache.get_or_stream(question, lambda text: stream(text, history), contextual)
+    compute = route_question if ANSWER_MODE == 'router' else get_openai_response
+    return answer_cache.get_or_compute(question, lambda text: compute(text, history), contextual)
+
+def remember_answer(session_id, question, answer):
+    """Mark a dispatched question answered and add it to the session's conversation context"""
+    with message_buffer.session(session_id) as buffer_data:
+        if buffer_data.dispatched_question == question:
+            buffer_data.dispatched_question = None
+        if answer not in (FALLBACK_RESPONSE, BUSY_RESPONSE):
+            remember_turn(buffer_data, question, answer)
+
+def forget_question(session_id, question):
+    """Clear a dispatched question that expired or failed, so a restart does not ask it again"""
+    with message_buffer.session(session_id) as buffer_data:
+        if buffer_data.dispatched_question == question:
+            buffer_data.dispatched_question = None
+
+# Questions are answered by a background pool so webhooks return immediately
+answer_queue = AnswerQueue(
+    answer_question,
+    CallbackSink(ANSWER_CALLBACK_URL) if ANSWER_CALLBACK_URL else SessionSink(message_buffer),
+    workers=ANSWER_WORKERS,
+    max_pending=ANSWER_QUEUE_SIZE,
+    deadline=ANSWER_DEADLINE,
+    on_answer=remember_answer,
+    on_drop=forget_question
+)
+
+# Questions are finalized when their aggregation window closes, even if no segment follows
+question_deadlines = TimerWheel()
+
+BUSY_MESSAGE = BUSY_RESPONSE
+
+def collect_app_metrics():
+    """Gauges and cache counters read at scrape time"""
+    yield ('buddybot_active_sessions', 'gauge', 'Sessions held in the session store', {}, len(message_buffer))
+    yield ('buddybot_pending_answers', 'gauge', 'Questions waiting for an answer worker', {}, answer_queue.pending())
+    yield ('buddybot_pending_deadlines', 'gauge', 'Triggered questions waiting for their deadline', {}, len(question_deadlines))
+    yield ('buddybot_expired_answers_total', 'counter', 'Questions that passed their deadline', {}, answer_queue.expired)
+    caches = [('answer', answer_cache)] + ([('weather', services.peek('weather'))] if services.peek('weather') else [])
+    for cache, stats in ((name, cache.stats()) for name, cache in caches):
+        yield ('buddybot_cache_hits_total', 'counter', 'Cache hits', {'cache': cache}, stats['hits'])
+        yield ('buddybot_cache_misses_total', 'counter', 'Cache misses', {'cache': cache}, stats['misses'])
+        yield ('buddybot_cache_entries', 'gauge', 'Entries held in each cache', {'cache': cache}, stats['entries'])
+
+metrics.register_collector(collect_app_metrics)
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
+    with stage_timer('webhook').time():
+        return handle_webhook()
+
+def handle_webhook():
     try:
-        data = request.json
-        logger.info(f"Received webhook data: {data}")
+        with stage_timer('json_parse').time():
+            data = request.json
+        body, status_code = handle_payload(data)
+        return jsonify(body), status_code
         
-        session_id = data.get('session_id')
+    except Exception as e:
+        logger.error(f"Webhook error: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def handle_payload(data):
+    """Process one webhook payload, returning the response body and status code"""
+    session_id = data.get('session_id')
+    with log_session(session_id):
+        log_payload(logger, "Received webhook data", data)
         if not session_id:
-            return jsonify({"status": "error", "message": "No session_id provided"}), 400
-        
-        segments = data.get('segments', [])
-        if not segments:
-            return jsonify({"status": "success", "message": "No segments to process"}), 200
+            return {"status": "error", "message": "No session_id provided"}, 400
+        return handle_session_payload(session_id, data)
+
+def handle_session_payload(session_id, data):
+    """Apply a payload's segments to its session"""
+    segments = data.get('segments', [])
+    if not segments:
+        return {"status": "success", "message": "No segments to process"}, 200
+    
+    # All state updates for this payload are applied in one store transaction
+    lock_start = time.perf_counter()
+    with message_buffer.session(session_id) as buffer_data:
+        stage_timer('session_lock').observe(time.perf_counter() - lock_start)
+        answer = buffer_data.pending_answer
+        buffer_data.pending_answer = None
+        with stage_timer('trigger_detection').time():
+            body, status_code = process_segments(session_id, segments, buffer_data, time.time())
+    
+    # Hand back an answer that finished since the last call
+    if answer:
+        return {"message": answer}, 200
+    return body, status_code
+
+def process_segments(session_id, segments, buffer_data, current_time):
+    """Run trigger detection and question collection over a batch of segments"""
+    # Right after a dispatched question only a full wake word starts another; partial triggers are ignored
+    cooling_down = current_time - buffer_data.last_notification < NOTIFICATION_COOLDOWN
+    
+    # Only text past the session's watermark is scanned; resent segments are skipped
+    batch = consume_segments(buffer_data, segments)
+    for result in ('new', 'merged', 'skipped'):
+        amount = getattr(batch, result)
+        if amount:
+            count('buddybot_segments_total', 'Transcript segments by how they were consumed', amount, result=result)
+    
+    for text in batch.texts:
+        logger.debug("Processing segment: '%s'", text)
         
-        current_time = time.time()
-        buffer_data = message_buffer.get_buffer(session_id)
+        # Check for complete trigger and extract the question after it
+        match = wake_words.match(text)
+        if match:
+            buffer_data.trigger_detected = True
+            buffer_data.trigger_time = current_time
+            buffer_data.collected_question = []
+            
+            if match.question:
+                buffer_data.collected_question.append(match.question)
+            continue
         
-        # Check cooldown
-        if buffer_data['trigger_detected']:
-            time_since_last = current_time - notification_cooldowns[session_id]
-            if time_since_last < NOTIFICATION_COOLDOWN:
-                logger.debug(f"Cooldown active for {session_id}, {NOTIFICATION_COOLDOWN - time_since_last:.1f}s remaining")
-                return jsonify({"status": "success", "message": "Cooldown active"}), 200
+        # Handle partial triggers; other speech outside a question is kept as context
+        if not buffer_data.trigger_detected:
+            if cooling_down:
+                count('buddybot_cooldown_segments_total', 'Segments checked for full wake words only during the cooldown')
+                remember(buffer_data, HEARD, text)
+            elif not handle_partial_trigger(text, buffer_data, current_time):
+                remember(buffer_data, HEARD, text)
+            continue
         
-        for segment in segments:
-            text = segment.get('text', '').lower().strip()
-            if not text:
-                continue
-                
-            logger.debug(f"Processing segment: '{text}' for session {session_id}")
+        # Collect question if trigger is active
+        if buffer_data.trigger_detected and not buffer_data.response_sent:
+            time_since_trigger = current_time - buffer_data.trigger_time
             
-            # Check for complete trigger
-            if any(trigger in text for trigger in TRIGGER_PHRASES):
-                buffer_data['trigger_detected'] = True
-                buffer_data['trigger_time'] = current_time
-                buffer_data['collected_question'] = []
-                notification_cooldowns[session_id] = current_time
-                
-                # Extract question after trigger
-                for trigger in TRIGGER_PHRASES:
-                    if trigger in text:
-                        question_part = text.split(trigger)[-1].strip()
-                        if question_part:
-                            buffer_data['collected_question'].append(question_part)
-                        break
-                continue
+            # Add to question collection
+            if time_since_trigger <= QUESTION_AGGREGATION_TIME:
+                buffer_data.collected_question.append(text)
             
-            # Handle partial triggers
-            if not buffer_data['trigger_detected']:
-                if handle_partial_trigger(text, buffer_data, current_time):
-                    continue
-            
-            # Collect question if trigger is active
-            if buffer_data['trigger_detected'] and not buffer_data['response_sent']:
-                time_since_trigger = current_time - buffer_data['trigger_time']
-                
-                # Add to question collection
-                if time_since_trigger <= QUESTION_AGGREGATION_TIME:
-                    buffer_data['collected_question'].append(text)
-                
-                # Check if we should process the question
-                if should_process_question(buffer_data, time_since_trigger, text):
-                    response = process_question(buffer_data)
-                    message_buffer.reset_buffer(session_id)
-                    return jsonify({"message": response}), 200
-        
-        return jsonify({"status": "success"}), 200
-        
-    except Exception as e:
-        logger.error(f"Webhook error: {str(e)}", exc_info=True)
-        return jsonify({"status": "error", "message": str(e)}), 500
+            # Check if we should process the question
+            if should_process_question(buffer_data, time_since_trigger, text):
+                count('buddybot_questions_finalized_total', 'Questions dispatched, by what closed them', by='segment')
+                if not dispatch_question(session_id, buffer_data, current_time):
+                    return {"message": BUSY_MESSAGE}, 200
+                return {"status": "queued"}, 202
+    
+    # A trigger in this payload starts the aggregation window
+    if buffer_data.trigger_detected and buffer_data.trigger_time == current_time:
+        schedule_deadline(session_id, buffer_data.trigger_time)
+    
+    return {"status": "success"}, 200
+
+def schedule_deadline(session_id, trigger_time):
+    """Finalize the question when its aggregation window closes"""
+    question_deadlines.schedule(
+        session_id,
+        trigger_time + QUESTION_AGGREGATION_TIME,
+        lambda: finalize_question(session_id, trigger_time)
+    )
+
+def finalize_question(session_id, trigger_time):
+    """Dispatch a question whose aggregation window closed without a closing segment"""
+    with message_buffer.session(session_id) as buffer_data:
+        # The question was already dispatched, or the session triggered again since
+        if not buffer_data.trigger_detected or buffer_data.trigger_time != trigger_time:
+            return
+        if not buffer_data.collected_question or buffer_data.response_sent:
+            buffer_data.reset()
+            return
+        count('buddybot_questions_finalized_total', 'Questions dispatched, by what closed them', by='deadline')
+        if not dispatch_question(session_id, buffer_data, time.time()):
+            buffer_data.pending_answer = BUSY_MESSAGE
+
+def dispatch_question(session_id, buffer_data, current_time):
+    """Queue the collected question and clear the trigger state"""
+    question_deadlines.cancel(session_id)
+    queued = process_question(session_id, buffer_data)
+    buffer_data.reset()
+    buffer_data.last_notification = current_time
+    return queued
 
 def handle_partial_trigger(text, buffer_data, current_time):
     """Handle partial trigger detection"""
-    if any(text.endswith(part) for part in PARTIAL_FIRST):
-        buffer_data['partial_trigger'] = True
-        buffer_data['partial_trigger_time'] = current_time
+    if wake_words.ends_with_partial(text):
+        buffer_data.partial_trigger = True
+        buffer_data.partial_trigger_time = current_time
         return True
         
-    if buffer_data['partial_trigger']:
-        time_since_partial = current_time - buffer_data['partial_trigger_time']
-        if time_since_partial <= 2.0 and any(part in text for part in PARTIAL_SECOND):
-            buffer_data['trigger_detected'] = True
-            buffer_data['trigger_time'] = current_time
-            buffer_data['collected_question'] = []
+    if buffer_data.partial_trigger:
+        time_since_partial = current_time - buffer_data.partial_trigger_time
+        match = wake_words.match_partial(text) if time_since_partial <= 2.0 else None
+        if match:
+            buffer_data.trigger_detected = True
+            buffer_data.trigger_time = current_time
+            buffer_data.collected_question = []
+            if match.question:
+                buffer_data.collected_question.append(match.question)
             return True
     return False
 
 def should_process_question(buffer_data, time_since_trigger, text):
     """Determine if question should be processed"""
     return (
-        buffer_data['collected_question'] and (
+        buffer_data.collected_question and (
             time_since_trigger > QUESTION_AGGREGATION_TIME or
             '?' in text or
             time_since_trigger > QUESTION_AGGREGATION_TIME * 1.5
         )
     )
 
-def process_question(buffer_data):
-    """Process collected question and get response"""
-    full_question = ' '.join(buffer_data['collected_question']).strip()
+def process_question(session_id, buffer_data):
+    """Queue the collected question for a background answer"""
+    full_question = ' '.join(buffer_data.collected_question).strip()
     if not full_question.endswith('?'):
         full_question += '?'
     
-    logger.info(f"Processing question: {full_question}")
-    return get_openai_response(full_question)
+    logger.info("Processing question: %s", full_question)
+    with stage_timer('enqueue').time():
+        history = build_history(buffer_data)
+        if not admit_question(buffer_data, full_question, history):
+            return False
+        if not answer_queue.submit(session_id, full_question, history):
+            shed('queue_full')
+            return False
+    # Kept until answered, so a journaled session can ask it again after a restart
+    buffer_data.dispatched_question = full_question
+    buffer_data.dispatched_at = time.time()
+    return True
+
+def resume_sessions():
+    """
+    Pick up questions a journaled session store restored at startup
+    Questions that were being answered are queued again while their answer
+    deadline lasts, and open questions get their aggregation deadline back.
+    """
+    current_time = time.time()
+    for session_id in message_buffer.resumable_sessions():
+        with message_buffer.session(session_id) as buffer_data:
+            question = buffer_data.dispatched_question
+            if question and current_time - buffer_data.dispatched_at <= ANSWER_DEADLINE:
+                if answer_queue.submit(session_id, question, build_history(buffer_data)):
+                    count('buddybot_resumed_questions_total', 'Questions resumed after a restart', state='dispatched')
+            elif question:
+                buffer_data.dispatched_question = None
+            if buffer_data.trigger_detected:
+                schedule_deadline(session_id, buffer_data.trigger_time)
+                count('buddybot_resumed_questions_total', 'Questions resumed after a restart', state='open')
+
+def admit_question(buffer_data, question, history):
+    """
+    Whether a question may be queued; questions answered from cache always are
+    Others are shed up front while the LLM wait queue or the answer queue is
+    full, or when the session has used up its question tokens. With only
+    ANSWER_WORKERS threads asking for LLM slots, the answer queue is where
+    questions wait in the threaded deployment.
+    """
+    contextual = bool(history) and is_follow_up(question)
+    if not contextual and answer_cache.cached(question) is not None:
+        return True
+    if admission.saturated() or answer_queue.saturated():
+        shed('queue_full')
+        return False
+    return take_session_token(buffer_data, time.time())
+
+# Questions left open or unanswered by the last run of a journaled store
+resume_sessions()
+
+def use_answer_queue(queue):
+    """Submit questions to another queue (the ASGI entry point answers them on its event loop)"""
+    global answer_queue
+    answer_queue = queue
+
+def collect_answer(session_id):
+    """Pop a finished answer for a session"""
+    with message_buffer.session(session_id) as buffer_data:
+        answer = buffer_data.pending_answer
+        buffer_data.pending_answer = None
+    if answer is None:
+        return {"status": "pending"}
+    return {"message": answer}
+
+SETUP_STATUS = {
+    "status": "OK",
+    "message": "Webhook setup is complete and ready to receive requests."
+}
+
+INSTRUCTIONS = {
+    "status": "OK",
+    "message": "Enable and enjoy! Just ask your questions and I'll do my best to answer them."
+}
+
+def status_report():
+    return {
+        "active_sessions": len(message_buffer),
+        "pending_answers": answer_queue.pending(),
+        "pending_deadlines": len(question_deadlines),
+        "answer_cache": answer_cache.stats(),
+        "openai_latency": latency_summary(),
+        "router": router_summary(),
+        "models": model_router.summary(),
+        "speculation": speculation_summary(),
+        "circuit_breakers": breaker_summary(),
+        "admission": admission.snapshot(),
+        "services": services.summary(),
+        "uptime": time.time() - start_time
+    }
+
+def warm_up(names=WARM_UP_SERVICES):
+    """
+    Build services ahead of traffic, e.g. from a server's post-fork hook
+    Services are otherwise built on first use.
+    """
+    names = [name.strip() for name in names.split(',') if name.strip()]
+    if names:
+        services.warm_up(None if names == ['all'] else names)
+
+@app.route('/answers/<session_id>', methods=['GET'])
+def answers(session_id):
+    return jsonify(collect_answer(session_id)), 200
 
 @app.route('/webhook/setup-status', methods=['GET'])
 def setup_status():
-    return jsonify({
-        "status": "OK",
-        "message": "Webhook setup is complete and ready to receive requests."
-    })
+    return jsonify(SETUP_STATUS)
 
 @app.route('/status', methods=['GET'])
 def status():
-    return jsonify({
-        "active_sessions": len(message_buffer.buffers),
-        "uptime": time.time() - start_time
-    })
+    return jsonify(status_report())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/instructions', methods=['GET'])
 def instructions():
-    return jsonify({
-        "status": "OK",
-        "message": "Enable and enjoy! Just ask your questions and I'll do my best to answer them."
-    })
+    return jsonify(INSTRUCTIONS)
+
+def create_app():
+    """
+    App factory for `flask run` and WSGI servers (FLASK_APP="src.app:create_app()")
+    Builds the WARM_UP_SERVICES before the app serves its first request.
+    """
+    warm_up()
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=PORT, debug=DEBUG)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=PORT, debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+ASGI entry point for the async serving mode
+
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5000
+
+Serves the same endpoints as the Flask app and shares its session handling,
+but questions are answered by tasks on the event loop using the async
+OpenAI, router and weather variants on pooled clients. A question waiting
+on the model costs a task rather than a thread.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Sequence, Tuple
+
+from src import app as flask_app
+from src.config import (
+    ANSWER_MODE, ANSWER_DEADLINE, ANSWER_CALLBACK_URL, ASYNC_MAX_IN_FLIGHT, SESSION_STORE
+)
+from src.services.answer_queue import AsyncAnswerQueue, CallbackSink, SessionSink
+from src.services.conversation import is_follow_up
+from src.services.openai_service import get_openai_response_async
+from src.services.question_router import route_question_async
+from src.utils import async_clients
+from src.utils.metrics import metrics, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# (status, content type, body)
+Response = Tuple[int, str, bytes]
+
+JSON = 'application/json'
+
+
+def answer_question_async(question: str, history: Sequence[Dict[str, str]] = ()) -> Awaitable[str]:
+    """Answer a question from cache or OpenAI on the event loop"""
+    compute = route_question_async if ANSWER_MODE == 'router' else get_openai_response_async
+    return flask_app.answer_cache.get_or_compute_async(
+        question, lambda text: compute(text, history), bool(history) and is_follow_up(question)
+    )
+
+
+answer_queue = AsyncAnswerQueue(
+    answer_question_async,
+    CallbackSink(ANSWER_CALLBACK_URL) if ANSWER_CALLBACK_URL else SessionSink(flask_app.message_buffer),
+    max_pending=ASYNC_MAX_IN_FLIGHT,
+    deadline=ANSWER_DEADLINE,
+    on_answer=flask_app.remember_answer,
+    on_drop=flask_app.forget_question
+)
+
+started = False
+
+
+def startup():
+    """Answer questions on the running loop instead of the Flask worker pool"""
+    global started
+    answer_queue.bind(asyncio.get_running_loop())
+    flask_app.use_answer_queue(answer_queue)
+    flask_app.warm_up()
+    started = True
+
+
+async def shutdown():
+    await async_clients.close_clients()
+
+
+def json_response(body: Any, status: int = 200) -> Response:
+    return status, JSON, json.dumps(body).encode()
+
+
+async def in_session_store(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a call that opens session transactions; SQLite ones can block on the file lock, so keep them off the loop"""
+    if SESSION_STORE == 'memory':
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+async def webhook(body: bytes) -> Response:
+    with stage_timer('webhook').time():
+        try:
+            with stage_timer('json_parse').time():
+                data = json.loads(body)
+            result, status = await in_session_store(flask_app.handle_payload, data)
+            return json_response(result, status)
+        except Exception as e:
+            logger.error(f"Webhook error: {str(e)}", exc_info=True)
+            return json_response({"status": "error", "message": str(e)}, 500)
+
+
+async def answers(session_id: str) -> Response:
+    return json_response(await in_session_store(flask_app.collect_answer, session_id))
+
+
+ROUTES: Dict[Tuple[str, str], Callable[..., Awaitable[Response]]] = {
+    ('POST', '/webhook'): webhook,
+    ('GET', '/webhook/setup-status'): lambda body: _static(flask_app.SETUP_STATUS),
+    ('GET', '/instructions'): lambda body: _static(flask_app.INSTRUCTIONS),
+    ('GET', '/status'): lambda body: _static(flask_app.status_report()),
+    ('GET', '/metrics'): lambda body: _text(metrics.render()),
+}
+
+
+async def _static(body: Any) -> Response:
+    return json_response(body)
+
+
+async def _text(body: str) -> Response:
+    return 200, 'text/plain; version=0.0.4; charset=utf-8', body.encode()
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            startup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    if not started:
+        startup()
+
+    method, path = scope['method'], scope['path']
+    handler = ROUTES.get((method, path))
+    if handler is not None:
+        status, content_type, body = await handler(await _read_body(receive))
+    elif method == 'GET' and path.startswith('/answers/'):
+        status, content_type, body = await answers(path[len('/answers/'):])
+    else:
+        status, content_type, body = json_response({"status": "error", "message": "Not found"}, 404)
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
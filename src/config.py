@@ -10,21 +10,146 @@ TRIGGER_PHRASES = ["hey omi", "hey, omi"]
 PARTIAL_FIRST = ["hey", "hey,"]
 PARTIAL_SECOND = ["omi"]
 
+# Extra wake words and common ASR misspellings, extendable per deployment
+# with a comma separated WAKE_WORD_ALIASES environment variable
+TRIGGER_ALIASES = ["hey omie", "hey omy", "hi omi"] + [
+    alias.strip().lower() for alias in os.getenv('WAKE_WORD_ALIASES', '').split(',') if alias.strip()
+]
+
 # Timing configurations
 QUESTION_AGGREGATION_TIME = 5  # seconds
 NOTIFICATION_COOLDOWN = 10  # seconds
 CLEANUP_INTERVAL = 300  # 5 minutes
 SESSION_EXPIRY = 3600  # 1 hour
 
+# Session state backend: "memory" for a single process, "sqlite" to share
+# sessions between worker processes through a WAL database at SESSION_DB_PATH
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+# "journal" keeps sessions in memory but journals them to SESSION_JOURNAL_DIR, committing dirty
+# sessions every SESSION_JOURNAL_COMMIT_INTERVAL seconds with one fsync and compacting the journal
+# into a snapshot every SESSION_SNAPSHOT_INTERVAL seconds, so a restart restores live sessions
+SESSION_JOURNAL_DIR = os.getenv('SESSION_JOURNAL_DIR', 'session-journal')
+SESSION_JOURNAL_COMMIT_INTERVAL = float(os.getenv('SESSION_JOURNAL_COMMIT_INTERVAL', 0.05))  # seconds
+SESSION_SNAPSHOT_INTERVAL = float(os.getenv('SESSION_SNAPSHOT_INTERVAL', 300))  # seconds
+SESSION_JOURNAL_FSYNC = os.getenv('SESSION_JOURNAL_FSYNC', 'true').lower() == 'true'
+
 # OpenAI configurations
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-OPENAI_MODEL = "gpt-4"
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', "gpt-4")
 MAX_TOKENS = 150
 TEMPERATURE = 0.7
 TIMEOUT = 30
+# Model routing (src/services/model_router.py): intent classification and short factual questions
+# use FAST_MODEL, longer or open-ended ones OPENAI_MODEL. The primary fails over to FAST_MODEL while
+# its estimated p95 latency exceeds MODEL_LATENCY_BUDGET or its error rate MODEL_MAX_ERROR_RATE
+FAST_MODEL = os.getenv('FAST_MODEL', 'gpt-4o-mini')
+MODEL_ROUTING = os.getenv('MODEL_ROUTING', 'true').lower() == 'true'  # false sends every call to OPENAI_MODEL
+MODEL_COMPLEX_TOKENS = int(os.getenv('MODEL_COMPLEX_TOKENS', 24))  # longer questions use OPENAI_MODEL
+MODEL_LATENCY_BUDGET = float(os.getenv('MODEL_LATENCY_BUDGET', 6.0))  # seconds
+MODEL_MAX_ERROR_RATE = float(os.getenv('MODEL_MAX_ERROR_RATE', 0.3))
+MODEL_MIN_SAMPLES = int(os.getenv('MODEL_MIN_SAMPLES', 10))
+MODEL_PROBE_INTERVAL = float(os.getenv('MODEL_PROBE_INTERVAL', 30))  # seconds between calls to a failed-over model
+MODEL_EWMA_ALPHA = float(os.getenv('MODEL_EWMA_ALPHA', 0.2))
+# Upstream call policy (src/services/upstream.py): each question's OpenAI calls share one
+# budget, retries back off within it, and slow attempts are hedged past a latency percentile
+UPSTREAM_BUDGET = float(os.getenv('UPSTREAM_BUDGET', 20))  # seconds per question
+UPSTREAM_ATTEMPTS = int(os.getenv('UPSTREAM_ATTEMPTS', 3))
+UPSTREAM_BACKOFF = float(os.getenv('UPSTREAM_BACKOFF', 0.25))  # seconds, doubled per retry
+HEDGE_QUANTILE = float(os.getenv('HEDGE_QUANTILE', 0.95))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.5))  # seconds
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))  # latencies needed before hedging
+HEDGE_WORKERS = int(os.getenv('HEDGE_WORKERS', 32))
+# The breaker opens when BREAKER_ERROR_RATE of at least BREAKER_MIN_CALLS calls in the last
+# BREAKER_WINDOW seconds failed, and probes again after BREAKER_COOLDOWN seconds
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', 0.5))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', 10))
+BREAKER_WINDOW = float(os.getenv('BREAKER_WINDOW', 30))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', 15))
+# Stream answers so the first sentence reaches the wearer before the rest is generated
+STREAM_ANSWERS = os.getenv('STREAM_ANSWERS', 'true').lower() == 'true'
+# "router" answers with one tool-calling model call, "direct" skips weather/calendar/email tools
+ANSWER_MODE = os.getenv('ANSWER_MODE', 'router')
+
+# Rolling conversation context (src/services/conversation.py): recent transcript and
+# question/answer turns are kept per session and sent with each question, up to
+# CONTEXT_TOKEN_BUDGET tokens; turns that no longer fit are folded into a short summary
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 600))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv('CONTEXT_SUMMARY_TOKENS', 120))
+CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', 2000))  # hard cap on what a session holds
+CONTEXT_MAX_ENTRY_TOKENS = int(os.getenv('CONTEXT_MAX_ENTRY_TOKENS', 200))  # longer text is truncated
+
+# Background answering configurations
+ANSWER_WORKERS = int(os.getenv('ANSWER_WORKERS', 4))
+ANSWER_QUEUE_SIZE = int(os.getenv('ANSWER_QUEUE_SIZE', 100))
+ANSWER_DEADLINE = int(os.getenv('ANSWER_DEADLINE', 60))  # seconds
+ANSWER_CALLBACK_URL = os.getenv('ANSWER_CALLBACK_URL')  # poll for answers when unset
+
+# Start likely tool fetches (weather for a named city, upcoming events) while the
+# question is still being classified
+SPECULATIVE_PREFETCH = os.getenv('SPECULATIVE_PREFETCH', 'true').lower() == 'true'
+TOOL_WORKERS = int(os.getenv('TOOL_WORKERS', 8))
+
+# Admission control (src/services/admission.py): at most ADMISSION_MAX_IN_FLIGHT questions do
+# LLM work at once, ADMISSION_MAX_WAITING more wait up to ADMISSION_MAX_WAIT seconds each, and
+# each session may ask ADMISSION_SESSION_BURST questions at once, refilled at ADMISSION_SESSION_RATE
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 32))
+ADMISSION_MAX_WAITING = int(os.getenv('ADMISSION_MAX_WAITING', 64))
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', 10))  # seconds
+ADMISSION_SESSION_RATE = float(os.getenv('ADMISSION_SESSION_RATE', 0.1))  # questions per second
+ADMISSION_SESSION_BURST = float(os.getenv('ADMISSION_SESSION_BURST', 3))
+
+# Answer cache configurations
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 3600))  # seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 10000))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv('ANSWER_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+# Questions about these intents are time-sensitive and never cached
+NEVER_CACHE_INTENTS = [
+    intent.strip() for intent in os.getenv('NEVER_CACHE_INTENTS', 'time,weather,calendar,email,news').split(',')
+    if intent.strip()
+]
+
+# Intent detection configurations
+SUPPORTED_INTENTS = {
+    'weather': ['weather', 'temperature', 'forecast', 'rain', 'sunny'],
+    'calendar': ['schedule', 'appointment', 'meeting', 'calendar', 'event'],
+    'email': ['email', 'mail', 'inbox', 'message', 'send'],
+    'drinking': ['drink', 'alcohol', 'beer', 'wine', 'drunk']
+}
+# Local classifier results at or above this confidence skip the LLM classifier
+LOCAL_INTENT_THRESHOLD = float(os.getenv('LOCAL_INTENT_THRESHOLD', 0.7))
 
 # OpenWeatherMap configuration
 OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
+OPENWEATHER_BASE_URL = os.getenv('OPENWEATHER_BASE_URL', 'http://api.openweathermap.org/data/2.5')
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 600))  # seconds
+WEATHER_STALE_TTL = int(os.getenv('WEATHER_STALE_TTL', 3600))  # serve stale this long past expiry
+WEATHER_SOFT_TIMEOUT = float(os.getenv('WEATHER_SOFT_TIMEOUT', 1.0))  # seconds before serving stale
+WEATHER_POOL_SIZE = int(os.getenv('WEATHER_POOL_SIZE', 10))
+# Bulk daily forecasts get their own fetch workers and cache, so a large batch
+# neither queues ahead of nor evicts the lookups made while answering questions
+WEATHER_BATCH_WORKERS = int(os.getenv('WEATHER_BATCH_WORKERS', 4))
+WEATHER_BATCH_CACHE_ENTRIES = int(os.getenv('WEATHER_BATCH_CACHE_ENTRIES', 1024))
+
+# Async serving (src.asgi): one pooled HTTP client per event loop for OpenAI and weather calls
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', 1000))
+ASYNC_MAX_KEEPALIVE = int(os.getenv('ASYNC_MAX_KEEPALIVE', 100))
+ASYNC_CONNECT_TIMEOUT = float(os.getenv('ASYNC_CONNECT_TIMEOUT', 5.0))  # seconds
+ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', 2000))  # questions answered concurrently
+
+# Services built before serving by the warm-up hook (src.app.warm_up): a comma separated
+# list of registry names (openai, weather, calendar), "all", or empty to build on first use
+WARM_UP_SERVICES = os.getenv('WARM_UP_SERVICES', '')
+
+# Logging (src/utils/log_pipeline.py): records are written as JSON ("json") or plain lines ("text")
+# by a background thread when LOG_ASYNC is set; LOG_PAYLOAD_SAMPLE_RATE of request payloads are
+# logged, each cut to LOG_PAYLOAD_MAX_CHARS
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records; further records are dropped
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 0.01))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', 500))
 
 # Flask configurations
 PORT = int(os.getenv('PORT', 5000))
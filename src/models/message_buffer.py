@@ -1,44 +1,59 @@
 import threading
-import time
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from src.config import CLEANUP_INTERVAL
+from src.models.session_state import SessionState
+from src.models.session_store import InMemorySessionStore, SessionStore
 
 class MessageBuffer:
-    def __init__(self, cleanup_interval: int = 300):
-        self.buffers: Dict[str, Dict[str, Any]] = {}
-        self.lock = threading.Lock()
+    """Session state held in a SessionStore, with expiry swept by a background thread"""
+
+    def __init__(self, cleanup_interval: int = CLEANUP_INTERVAL, store: Optional[SessionStore] = None):
+        self.store = store if store is not None else InMemorySessionStore()
         self.cleanup_interval = cleanup_interval
-        self.last_cleanup = time.time()
+        self.sweeper: Optional[threading.Thread] = None
+        self.sweeper_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Start the background expiry sweeper"""
+        with self.sweeper_lock:
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True)
+                self.sweeper.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.store.close()
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[SessionState]:
+        """Load a session for update and save it atomically on exit"""
+        if self.sweeper is None:
+            self.start()
+        with self.store.transaction(session_id) as state:
+            yield state
+
+    def get_buffer(self, session_id: str) -> SessionState:
+        if self.sweeper is None:
+            self.start()
+        return self.store.get(session_id)
 
-    def get_buffer(self, session_id: str) -> Dict[str, Any]:
-        current_time = time.time()
-        
-        if current_time - self.last_cleanup > self.cleanup_interval:
+    def reset_buffer(self, session_id: str):
+        """Clear trigger and question state after a question is dispatched"""
+        self.store.reset(session_id)
+
+    def resumable_sessions(self) -> List[str]:
+        """Sessions the store restored with a question still to answer"""
+        return self.store.resumable_sessions()
+
+    def cleanup_old_sessions(self, current_time: Optional[float] = None) -> int:
+        """Remove expired sessions, returning how many were dropped"""
+        return self.store.cleanup_expired(current_time)
+
+    def _sweep_loop(self):
+        while not self.stopped.wait(self.cleanup_interval):
             self.cleanup_old_sessions()
-        
-        with self.lock:
-            if session_id not in self.buffers:
-                self.buffers[session_id] = {
-                    'messages': [],
-                    'trigger_detected': False,
-                    'trigger_time': 0,
-                    'collected_question': [],
-                    'response_sent': False,
-                    'partial_trigger': False,
-                    'partial_trigger_time': 0,
-                    'last_activity': current_time
-                }
-            else:
-                self.buffers[session_id]['last_activity'] = current_time
-                
-        return self.buffers[session_id]
-
-    def cleanup_old_sessions(self):
-        current_time = time.time()
-        with self.lock:
-            expired_sessions = [
-                session_id for session_id, data in self.buffers.items()
-                if current_time - data['last_activity'] > 3600
-            ]
-            for session_id in expired_sessions:
-                del self.buffers[session_id]
-            self.last_cleanup = current_time 
\ No newline at end of file
+
+    def __len__(self) -> int:
+        return len(self.store)
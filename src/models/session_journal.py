@@ -0,0 +1,279 @@
+"""
+Write-ahead journal for in-memory sessions
+
+JournaledSessionStore keeps sessions in memory like InMemorySessionStore.
+A transaction only marks its session dirty. Every commit_interval a
+background committer serializes each dirty session once, appends the
+records to the journal in a single write and fsyncs once for the whole
+batch. Webhooks never wait on disk, and a session updated many times
+within one interval costs one record.
+
+Every snapshot_interval the journal is compacted. The committer starts a
+new journal file, writes all live sessions to a snapshot and deletes the
+journal files the snapshot covers. Each record carries a commit sequence
+number, so replay keeps the newest image of each session whichever file it
+came from.
+
+Records are one line each: sequence, expiry time, session id and the
+session state as JSON, separated by tabs. At startup the
+snapshot and journals are read, superseded and expired records are skipped
+without parsing their state, and only live sessions are restored. A torn
+last line from a crash is ignored. Sessions restored with an open trigger or
+a question that was still being answered are listed by
+resumable_sessions() so the app can pick them up again.
+
+A store holds an exclusive lock on its directory, since two processes
+compacting the same journal would delete each other's records.
+"""
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from src.config import SESSION_EXPIRY, SESSION_JOURNAL_COMMIT_INTERVAL, SESSION_SNAPSHOT_INTERVAL, SESSION_JOURNAL_FSYNC
+from src.models.session_state import SessionState
+from src.models.session_store import InMemorySessionStore
+from src.utils.metrics import metrics, count
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT = 'snapshot.jsonl'
+LOCK = 'lock'
+JOURNAL_PATTERN = 'journal-*.log'
+# Live session states parsed per json.loads call at startup
+REPLAY_BATCH = 10000
+
+
+def _encode_id(session_id: str) -> str:
+    """Session ids are written as is unless they could be mistaken for a separator or an encoded id"""
+    if '\t' in session_id or '\n' in session_id or session_id.startswith('"'):
+        return json.dumps(session_id)
+    return session_id
+
+
+def _decode_id(field: str) -> str:
+    return json.loads(field) if field.startswith('"') else field
+
+
+def _journal_number(path: str) -> int:
+    return int(os.path.basename(path)[len('journal-'):-len('.log')])
+
+
+class JournaledSessionStore(InMemorySessionStore):
+    """
+    In-memory sessions that survive restarts through a journal and snapshots in directory
+    Meant for a single process; share sessions between workers with the
+    sqlite store instead. Up to commit_interval of updates are lost on a
+    crash; close() commits what is pending.
+    """
+
+    def __init__(self, directory: str, session_expiry: float = SESSION_EXPIRY, shard_count: int = 64,
+                 commit_interval: float = SESSION_JOURNAL_COMMIT_INTERVAL,
+                 snapshot_interval: float = SESSION_SNAPSHOT_INTERVAL, fsync: bool = SESSION_JOURNAL_FSYNC):
+        super().__init__(session_expiry, shard_count)
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.dirty: Set[str] = set()
+        self.dirty_lock = threading.Lock()
+        # Serializes commits, snapshots and close()
+        self.commit_lock = threading.Lock()
+        self.sequence_number = 0
+        self.commit_seconds = metrics.histogram('buddybot_journal_commit_seconds',
+                                                'Time to write and fsync one journal batch')
+        os.makedirs(directory, exist_ok=True)
+        self.lock_file = open(os.path.join(directory, LOCK), 'a')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.lock_file.close()
+            raise RuntimeError(f"Session journal {directory} is in use by another process")
+        self.resumable: List[str] = []
+        self.restored = self._replay(time.time())
+        numbers = [_journal_number(path) for path in glob.glob(os.path.join(directory, JOURNAL_PATTERN))]
+        self.journal_number = max(numbers, default=0) + 1
+        self.journal = open(self._journal_path(self.journal_number), 'a', encoding='utf-8')
+        self.last_snapshot = time.monotonic()
+        self.stopped = threading.Event()
+        self.committer = threading.Thread(target=self._commit_loop, name='session-journal', daemon=True)
+        self.committer.start()
+
+    def _journal_path(self, number: int) -> str:
+        return os.path.join(self.directory, f'journal-{number:06d}.log')
+
+    def _mark(self, session_id: str):
+        with self.dirty_lock:
+            self.dirty.add(session_id)
+
+    @contextmanager
+    def transaction(self, session_id: str) -> Iterator[SessionState]:
+        try:
+            with super().transaction(session_id) as state:
+                yield state
+        finally:
+            self._mark(session_id)
+
+    def get(self, session_id: str) -> SessionState:
+        state = super().get(session_id)
+        self._mark(session_id)
+        return state
+
+    def reset(self, session_id: str):
+        super().reset(session_id)
+        self._mark(session_id)
+
+    def _record(self, session_id: str) -> Optional[str]:
+        """The journal line for a session's current state, or None if it is gone; call with commit_lock held"""
+        shard = self._shard(session_id)
+        with shard.lock:
+            state = shard.sessions.get(session_id)
+            if state is None:
+                return None
+            self.sequence_number += 1
+            return (f"{self.sequence_number}\t{state.last_activity + self.session_expiry!r}\t"
+                    f"{_encode_id(session_id)}\t{json.dumps(state.to_dict(), separators=(',', ':'))}\n")
+
+    def _sync(self, file):
+        file.flush()
+        if self.fsync:
+            os.fsync(file.fileno())
+
+    def commit(self) -> int:
+        """Write every dirty session to the journal with one fsync, returning how many were written"""
+        with self.dirty_lock:
+            dirty, self.dirty = self.dirty, set()
+        if not dirty:
+            return 0
+        with self.commit_lock:
+            start = time.perf_counter()
+            try:
+                lines = [line for line in map(self._record, dirty) if line is not None]
+                self.journal.write(''.join(lines))
+                self._sync(self.journal)
+            except BaseException:
+                # Retried with the next batch
+                with self.dirty_lock:
+                    self.dirty |= dirty
+                raise
+            self.commit_seconds.observe(time.perf_counter() - start)
+        count('buddybot_journal_records_total', 'Session records written to the journal', len(lines))
+        return len(lines)
+
+    def snapshot(self) -> int:
+        """Write all live sessions to a new snapshot and drop the journals it covers, returning its size"""
+        self.commit()
+        with self.commit_lock:
+            # Commits from here on go to a fresh journal that replay reads after the snapshot
+            self.journal.close()
+            covered = self.journal_number
+            self.journal_number += 1
+            self.journal = open(self._journal_path(self.journal_number), 'a', encoding='utf-8')
+            session_ids = [session_id for shard in self.shards for session_id in list(shard.sessions)]
+            temporary = os.path.join(self.directory, SNAPSHOT + '.tmp')
+            written = 0
+            with open(temporary, 'w', encoding='utf-8') as snapshot:
+                for session_id in session_ids:
+                    line = self._record(session_id)
+                    if line is not None:
+                        snapshot.write(line)
+                        written += 1
+                self._sync(snapshot)
+            os.replace(temporary, os.path.join(self.directory, SNAPSHOT))
+            for path in glob.glob(os.path.join(self.directory, JOURNAL_PATTERN)):
+                if _journal_number(path) <= covered:
+                    os.remove(path)
+        self.last_snapshot = time.monotonic()
+        logger.info("Wrote session snapshot with %d sessions", written)
+        return written
+
+    def _replay(self, current_time: float) -> int:
+        """Restore unexpired sessions from the snapshot and journals, returning how many"""
+        latest: Dict[str, Tuple[int, str, str]] = {}
+        paths = [os.path.join(self.directory, SNAPSHOT)]
+        paths += sorted(glob.glob(os.path.join(self.directory, JOURNAL_PATTERN)), key=_journal_number)
+        torn = 0
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    fields = line.split('\t', 3)
+                    if len(fields) != 4 or not line.endswith('\n'):
+                        torn += 1
+                        continue
+                    sequence = int(fields[0])
+                    previous = latest.get(fields[2])
+                    if previous is None or previous[0] < sequence:
+                        latest[fields[2]] = (sequence, fields[1], fields[3])
+        live = []
+        for key, (sequence, expires_at, data) in latest.items():
+            self.sequence_number = max(self.sequence_number, sequence)
+            if float(expires_at) > current_time:
+                live.append((key, data))
+        restored = 0
+        for offset in range(0, len(live), REPLAY_BATCH):
+            batch = live[offset:offset + REPLAY_BATCH]
+            for (key, _), data in zip(batch, self._parse(batch)):
+                if data is None:
+                    torn += 1
+                    continue
+                session_id, state = _decode_id(key), SessionState.from_dict(data)
+                self._restore(session_id, state)
+                if state.trigger_detected or state.dispatched_question:
+                    self.resumable.append(session_id)
+                restored += 1
+        if torn:
+            logger.warning("Skipped %d unreadable session journal records", torn)
+        if restored:
+            logger.info("Restored %d sessions from the session journal", restored)
+        return restored
+
+    @staticmethod
+    def _parse(batch: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        """Parse a batch of session states with one json.loads, falling back to one at a time"""
+        try:
+            return json.loads('[' + ','.join(data for _, data in batch) + ']')
+        except ValueError:
+            parsed = []
+            for _, data in batch:
+                try:
+                    parsed.append(json.loads(data))
+                except ValueError:
+                    parsed.append(None)
+            return parsed
+
+    def resumable_sessions(self) -> List[str]:
+        resumable, self.resumable = self.resumable, []
+        return resumable
+
+    def _restore(self, session_id: str, state: SessionState):
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.sessions[session_id] = state
+            self._push_expiry(shard, session_id, state)
+
+    def _commit_loop(self):
+        while not self.stopped.wait(self.commit_interval):
+            try:
+                self.commit()
+                if time.monotonic() - self.last_snapshot >= self.snapshot_interval:
+                    self.snapshot()
+            except Exception as e:
+                logger.error(f"Session journal commit failed: {str(e)}", exc_info=True)
+
+    def close(self):
+        """Stop the committer after writing out pending updates, and release the directory"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.committer.join()
+        self.commit()
+        with self.commit_lock:
+            self.journal.close()
+        self.lock_file.close()
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+
+class SessionState:
+    """Per-session trigger and question state"""
+    __slots__ = (
+        'messages', 'trigger_detected', 'trigger_time', 'collected_question',
+        'response_sent', 'partial_trigger', 'partial_trigger_time', 'last_activity',
+        'last_notification', 'pending_answer', 'segment_watermark', 'last_segment_text',
+        'recent_segment_ids', 'context_tokens', 'summary', 'summary_tokens',
+        'question_tokens', 'question_tokens_at', 'dispatched_question', 'dispatched_at'
+    )
+
+    def __init__(self, current_time: float):
+        # Rolling conversation context: [role, text, tokens] entries and the summary of older turns
+        self.messages: List[List[Any]] = []
+        self.context_tokens = 0
+        self.summary: List[List[Any]] = []
+        self.summary_tokens = 0
+        self.last_activity = current_time
+        self.last_notification = 0.0
+        self.pending_answer: Optional[str] = None
+        # Position in the device's segment stream; survives question resets
+        self.segment_watermark = -1.0
+        self.last_segment_text = ''
+        self.recent_segment_ids: List[str] = []
+        # Admission token bucket; None until the first question (a full bucket)
+        self.question_tokens: Optional[float] = None
+        self.question_tokens_at = 0.0
+        # Question handed to the answer queue and not answered yet; survives question resets
+        self.dispatched_question: Optional[str] = None
+        self.dispatched_at = 0.0
+        self.reset()
+
+    def reset(self):
+        self.trigger_detected = False
+        self.trigger_time = 0.0
+        self.collected_question: List[str] = []
+        self.response_sent = False
+        self.partial_trigger = False
+        self.partial_trigger_time = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SessionState':
+        state = cls(data.get('last_activity', 0.0))
+        for name in cls.__slots__:
+            if name in data:
+                setattr(state, name, data[name])
+        return state
@@ -0,0 +1,217 @@
+import abc
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+from src.config import SESSION_EXPIRY
+from src.models.session_state import SessionState
+
+class SessionStore(abc.ABC):
+    """
+    Storage backend for per-session state
+    `transaction` loads a session (creating it if needed), yields it for the
+    caller to update and saves it atomically when the block exits, so one
+    webhook call is a single read-modify-write against the store.
+    """
+
+    def __init__(self, session_expiry: float = SESSION_EXPIRY):
+        self.session_expiry = session_expiry
+
+    @abc.abstractmethod
+    def transaction(self, session_id: str) -> ContextManager[SessionState]:
+        """Load a session for update and save it when the block exits"""
+
+    def get(self, session_id: str) -> SessionState:
+        """Touch a session and return its state"""
+        with self.transaction(session_id) as state:
+            return state
+
+    def reset(self, session_id: str):
+        with self.transaction(session_id) as state:
+            state.reset()
+
+    @abc.abstractmethod
+    def cleanup_expired(self, current_time: Optional[float] = None) -> int:
+        """Remove expired sessions, returning how many were dropped"""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of live sessions"""
+
+    def close(self):
+        """Write out anything pending; the store is not used afterwards"""
+
+    def resumable_sessions(self) -> List[str]:
+        """
+        Sessions restored at startup with an open or dispatched question, returned once
+        Stores that start empty have none.
+        """
+        return []
+
+class _Shard:
+    __slots__ = ('sessions', 'expiry_heap', 'lock')
+
+    def __init__(self):
+        self.sessions: Dict[str, SessionState] = {}
+        # (expires_at, sequence, session_id, state); one entry per live session
+        self.expiry_heap: List[Tuple[float, int, str, SessionState]] = []
+        self.lock = threading.Lock()
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local sessions split across lock-striped shards
+    Each shard keeps a heap of expiry times so cleanup pops expired sessions
+    instead of scanning all of them. Heap entries are refreshed lazily: an
+    entry whose session has seen activity since it was pushed is re-pushed
+    with the new expiry time. The shard lock is held for the whole
+    transaction, so callers must not re-enter the store inside one.
+    """
+
+    def __init__(self, session_expiry: float = SESSION_EXPIRY, shard_count: int = 64):
+        super().__init__(session_expiry)
+        self.shards = [_Shard() for _ in range(shard_count)]
+        self.sequence = itertools.count()
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self.shards[hash(session_id) % len(self.shards)]
+
+    def _touch(self, shard: _Shard, session_id: str, current_time: float) -> SessionState:
+        state = shard.sessions.get(session_id)
+        if state is None:
+            state = shard.sessions[session_id] = SessionState(current_time)
+            self._push_expiry(shard, session_id, state)
+        else:
+            state.last_activity = current_time
+        return state
+
+    def _push_expiry(self, shard: _Shard, session_id: str, state: SessionState):
+        heapq.heappush(shard.expiry_heap, (
+            state.last_activity + self.session_expiry, next(self.sequence), session_id, state
+        ))
+
+    @contextmanager
+    def transaction(self, session_id: str) -> Iterator[SessionState]:
+        shard = self._shard(session_id)
+        with shard.lock:
+            yield self._touch(shard, session_id, time.time())
+
+    def get(self, session_id: str) -> SessionState:
+        shard = self._shard(session_id)
+        with shard.lock:
+            return self._touch(shard, session_id, time.time())
+
+    def reset(self, session_id: str):
+        shard = self._shard(session_id)
+        with shard.lock:
+            state = shard.sessions.get(session_id)
+            if state is not None:
+                state.reset()
+
+    def cleanup_expired(self, current_time: Optional[float] = None) -> int:
+        current_time = time.time() if current_time is None else current_time
+        removed = 0
+        for shard in self.shards:
+            with shard.lock:
+                removed += self._sweep_shard(shard, current_time)
+        return removed
+
+    def _sweep_shard(self, shard: _Shard, current_time: float) -> int:
+        removed = 0
+        heap = shard.expiry_heap
+        while heap and heap[0][0] <= current_time:
+            _, _, session_id, state = heapq.heappop(heap)
+            if shard.sessions.get(session_id) is not state:
+                continue
+            expires_at = state.last_activity + self.session_expiry
+            if expires_at > current_time:
+                heapq.heappush(heap, (expires_at, next(self.sequence), session_id, state))
+            else:
+                del shard.sessions[session_id]
+                removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(shard.sessions) for shard in self.shards)
+
+class SqliteSessionStore(SessionStore):
+    """
+    Sessions shared between worker processes through a SQLite database in WAL mode
+    Each transaction runs under BEGIN IMMEDIATE, so concurrent webhook calls
+    for the same session from different processes are serialized. `get`
+    returns a detached copy; updates must go through `transaction`.
+    """
+
+    def __init__(self, path: str, session_expiry: float = SESSION_EXPIRY, busy_timeout: int = 5000):
+        super().__init__(session_expiry)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        self._connection().executescript('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+        ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=self.busy_timeout / 1000)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA busy_timeout={int(self.busy_timeout)}')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def transaction(self, session_id: str) -> Iterator[SessionState]:
+        connection = self._connection()
+        current_time = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT state FROM sessions WHERE session_id = ? AND expires_at > ?',
+                (session_id, current_time)
+            ).fetchone()
+            state = SessionState.from_dict(json.loads(row[0])) if row else SessionState(current_time)
+            state.last_activity = current_time
+            yield state
+            connection.execute(
+                'INSERT INTO sessions (session_id, state, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at',
+                (session_id, json.dumps(state.to_dict()), state.last_activity + self.session_expiry)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def cleanup_expired(self, current_time: Optional[float] = None) -> int:
+        current_time = time.time() if current_time is None else current_time
+        cursor = self._connection().execute('DELETE FROM sessions WHERE expires_at <= ?', (current_time,))
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        row = self._connection().execute(
+            'SELECT COUNT(*) FROM sessions WHERE expires_at > ?', (time.time(),)
+        ).fetchone()
+        return row[0]
+
+def create_session_store(backend: str, path: Optional[str] = None,
+                         session_expiry: float = SESSION_EXPIRY) -> SessionStore:
+    if backend == 'memory':
+        return InMemorySessionStore(session_expiry)
+    if backend == 'sqlite':
+        return SqliteSessionStore(path or 'sessions.db', session_expiry)
+    if backend == 'journal':
+        from src.models.session_journal import JournaledSessionStore
+        return JournaledSessionStore(path or 'session-journal', session_expiry)
+    raise ValueError(f"Unknown session store backend: {backend}")
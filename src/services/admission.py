@@ -0,0 +1,210 @@
+"""
+Admission control for LLM calls
+
+At most max_in_flight questions do LLM work at once. Further questions wait
+in a bounded FIFO queue, and each waits only until its own deadline. When
+a slot frees up it is handed to the oldest waiter. Under overload, work is
+shed in this order:
+
+1. Cached answers and the local intent classifier never take a slot.
+2. Questions still waiting at their deadline are dropped as stale.
+3. New questions get an immediate busy answer once the wait queue is full.
+
+Each session also has a token bucket, so one chatty session cannot take
+every slot. Queue depth, wait time and shed counts are exported as metrics.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+from src.config import (
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_WAITING, ADMISSION_MAX_WAIT, ADMISSION_SESSION_RATE,
+    ADMISSION_SESSION_BURST
+)
+from src.models.session_state import SessionState
+from src.utils.metrics import metrics, count
+
+SHED_REASONS = ('queue_full', 'expired', 'session_rate')
+
+
+class Overloaded(Exception):
+    """A question was shed instead of waiting for an LLM slot"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Shed by admission control: {reason}")
+        self.reason = reason
+
+
+class _Waiter:
+    """A queued question; granted is set under the controller lock when a slot is handed over"""
+    __slots__ = ('granted', 'event', 'loop', 'future')
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded, deadline-aware wait queue
+    Usable from threads (slot) and event loops (slot_async) at once; slots
+    are handed to waiters directly so a release never races a new arrival.
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_waiting: int = ADMISSION_MAX_WAITING,
+                 max_wait: float = ADMISSION_MAX_WAIT, clock: Callable[[], float] = time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.clock = clock
+        self.in_flight = 0
+        self.waiters: Deque[_Waiter] = deque()
+        self.lock = threading.Lock()
+        self.wait_time = metrics.histogram('buddybot_admission_wait_seconds', 'Time questions waited for an LLM slot')
+
+    def saturated(self) -> bool:
+        """Whether a new question would be shed right now"""
+        with self.lock:
+            return self.in_flight >= self.max_in_flight and len(self.waiters) >= self.max_waiting
+
+    def busy(self) -> bool:
+        """Whether a new question would have to wait"""
+        with self.lock:
+            return self.in_flight >= self.max_in_flight
+
+    def _enqueue(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """Take a free slot (returning None) or join the queue"""
+        with self.lock:
+            if self.in_flight < self.max_in_flight and not self.waiters:
+                self.in_flight += 1
+                self.wait_time.observe(0.0)
+                return None
+            if len(self.waiters) >= self.max_waiting:
+                shed('queue_full')
+                raise Overloaded('queue_full')
+            waiter = _Waiter(loop)
+            self.waiters.append(waiter)
+            return waiter
+
+    def _leave(self, waiter: _Waiter) -> bool:
+        """Leave the queue after a timeout or cancellation; True if a slot was handed over meanwhile"""
+        with self.lock:
+            if waiter.granted:
+                return True
+            self.waiters.remove(waiter)
+            return False
+
+    def release(self):
+        with self.lock:
+            if self.waiters:
+                waiter = self.waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+                return
+            self.in_flight -= 1
+
+    def acquire(self, deadline: Optional[float] = None):
+        """Wait for a slot until deadline (default max_wait from now), raising Overloaded if shed"""
+        start = self.clock()
+        waiter = self._enqueue()
+        if waiter is None:
+            return
+        deadline = deadline if deadline is not None else start + self.max_wait
+        if not waiter.event.wait(max(0.0, deadline - self.clock())) and not self._leave(waiter):
+            shed('expired')
+            raise Overloaded('expired')
+        self.wait_time.observe(self.clock() - start)
+
+    async def acquire_async(self, deadline: Optional[float] = None):
+        """Async variant of acquire; waiting does not block the event loop"""
+        start = self.clock()
+        waiter = self._enqueue(asyncio.get_running_loop())
+        if waiter is None:
+            return
+        deadline = deadline if deadline is not None else start + self.max_wait
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, deadline - self.clock()))
+        except asyncio.TimeoutError:
+            if not self._leave(waiter):
+                shed('expired')
+                raise Overloaded('expired')
+        except asyncio.CancelledError:
+            if self._leave(waiter):
+                self.release()
+            raise
+        self.wait_time.observe(self.clock() - start)
+
+    @contextmanager
+    def slot(self, deadline: Optional[float] = None) -> Iterator[None]:
+        self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self, deadline: Optional[float] = None) -> AsyncIterator[None]:
+        await self.acquire_async(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            in_flight, waiting = self.in_flight, len(self.waiters)
+        return {
+            'in_flight': in_flight,
+            'waiting': waiting,
+            'max_in_flight': self.max_in_flight,
+            'max_waiting': self.max_waiting,
+            'wait_p95': self.wait_time.quantile(0.95),
+            'shed': {reason: int(metrics.counter('buddybot_shed_total', reason=reason).value) for reason in SHED_REASONS}
+        }
+
+
+def shed(reason: str):
+    count('buddybot_shed_total', 'Questions shed by admission control', reason=reason)
+
+
+def take_session_token(state: SessionState, now: float, rate: float = ADMISSION_SESSION_RATE,
+                       burst: float = ADMISSION_SESSION_BURST) -> bool:
+    """Spend one of the session's question tokens, refilled at rate per second up to burst"""
+    if state.question_tokens is None:
+        state.question_tokens = burst
+    else:
+        state.question_tokens = min(burst, state.question_tokens + (now - state.question_tokens_at) * rate)
+    state.question_tokens_at = now
+    if state.question_tokens < 1:
+        shed('session_rate')
+        return False
+    state.question_tokens -= 1
+    return True
+
+
+# Shared by every LLM-backed answer and intent analysis in the process
+admission = AdmissionController()
+
+
+def collect_admission_metrics():
+    snapshot = admission.snapshot()
+    yield ('buddybot_admission_in_flight', 'gauge', 'Questions holding an LLM slot', {}, snapshot['in_flight'])
+    yield ('buddybot_admission_waiting', 'gauge', 'Questions waiting for an LLM slot', {}, snapshot['waiting'])
+
+
+metrics.register_collector(collect_admission_metrics)
@@ -0,0 +1,195 @@
+import logging
+import re
+import threading
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, Optional
+from src.config import (
+    TRIGGER_PHRASES, TRIGGER_ALIASES, PARTIAL_FIRST, PARTIAL_SECOND,
+    ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_BYTES, NEVER_CACHE_INTENTS
+)
+from src.utils.cache import AsyncSingleFlight, SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
+
+FILLER_WORDS = {
+    'um', 'umm', 'uh', 'uhm', 'er', 'erm', 'hmm', 'ah', 'oh', 'well', 'so', 'okay', 'ok',
+    'please', 'actually', 'basically', 'just'
+}
+
+CONTRACTIONS = {
+    "what's": 'what is', "who's": 'who is', "where's": 'where is', "when's": 'when is',
+    "how's": 'how is', "it's": 'it is', "that's": 'that is', "there's": 'there is'
+}
+
+# Keywords marking questions whose answers go stale, grouped by intent
+TIME_SENSITIVE_KEYWORDS = {
+    'time': {'time', 'date', 'today', 'tonight', 'tomorrow', 'yesterday', 'now', 'current', 'currently', 'latest'},
+    'weather': {'weather', 'temperature', 'forecast', 'rain', 'sunny', 'snow', 'wind'},
+    'calendar': {'schedule', 'appointment', 'meeting', 'calendar', 'event', 'remind', 'reminder'},
+    'email': {'email', 'mail', 'inbox'},
+    'news': {'news', 'headlines', 'score', 'stock', 'price'}
+}
+
+_TRIGGER_WORDS = {
+    word.strip(',') for phrase in TRIGGER_PHRASES + TRIGGER_ALIASES + PARTIAL_FIRST + PARTIAL_SECOND
+    for word in phrase.lower().split()
+}
+# Numbers keep their decimal point and arithmetic operators are words of their own,
+# so "5 + 3" and "5 - 3" or "2.5" and "2 5" get different keys
+_WORD_RE = re.compile(r"\d+(?:,\d{3})*(?:\.\d+)?|[a-z0-9']+|[-+*/^=%<>]")
+
+# Set while computing an answer that must not be cached
+_uncacheable: ContextVar[bool] = ContextVar('uncacheable', default=False)
+
+
+def skip_cache():
+    """
+    Keep the answer being computed out of the cache
+    Called by answer producers whose answer was built from live data, such
+    as the router after running tools.
+    """
+    _uncacheable.set(True)
+
+
+def normalize_question(question: str, trigger_words: Iterable[str] = _TRIGGER_WORDS) -> str:
+    """
+    Reduce a question to a cache key
+    Lowercases, drops punctuation other than operators and decimal points,
+    expands common contractions and strips the trigger and filler words
+    leading the question. Fillers later on are kept, since words like "well"
+    or "just" can carry meaning there.
+    """
+    words = []
+    for word in _WORD_RE.findall(question.lower()):
+        word = CONTRACTIONS.get(word, word).replace("'", '')
+        words.extend(word.replace(',', '').split())
+    skipped = FILLER_WORDS | set(trigger_words)
+    start = 0
+    while start < len(words) and words[start] in skipped:
+        start += 1
+    return ' '.join(words[start:])
+
+
+class AnswerCache:
+    """
+    Caches answers by normalized question
+    Identical questions that are in flight at the same time share one
+    upstream call. Questions matching a never-cache intent bypass the cache,
+    and answers computed after skip_cache() are not stored.
+    """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 max_bytes: int = ANSWER_CACHE_MAX_BYTES, never_cache_intents: Iterable[str] = NEVER_CACHE_INTENTS,
+                 is_cacheable: Callable[[str], bool] = bool):
+        self.cache = TTLCache(ttl, max_entries=max_entries, max_bytes=max_bytes)
+        self.flights = SingleFlight()
+        self.async_flights = AsyncSingleFlight()
+        self.is_cacheable = is_cacheable
+        self.never_cache_keywords = set()
+        for intent in never_cache_intents:
+            self.never_cache_keywords |= TIME_SENSITIVE_KEYWORDS.get(intent, {intent})
+        self.bypassed = 0
+        self.lock = threading.Lock()
+
+    def is_time_sensitive(self, key: str) -> bool:
+        return not self.never_cache_keywords.isdisjoint(key.split())
+
+    def cached(self, question: str) -> Optional[str]:
+        """The cached answer to a question, without computing or counting a bypass"""
+        key = normalize_question(question)
+        if not key or self.is_time_sensitive(key):
+            return None
+        return self.cache.get(key)
+
+    def get_or_compute(self, question: str, compute: Callable[[str], str], contextual: bool = False) -> str:
+        """Answer from cache or compute; contextual answers depend on the conversation and skip the cache"""
+        key = normalize_question(question)
+        if not key or contextual or self.is_time_sensitive(key):
+            with self.lock:
+                self.bypassed += 1
+            return compute(question)
+
+        answer = self.cache.get(key)
+        if answer is not None:
+            logger.debug("Answer cache hit for '%s'", key)
+            return answer
+
+        def load() -> str:
+            _uncacheable.set(False)
+            answer = compute(question)
+            if self.is_cacheable(answer) and not _uncacheable.get():
+                self.cache.set(key, answer)
+            return answer
+
+        answer, _ = self.flights.do(key, load)
+        return answer
+
+    async def get_or_compute_async(self, question: str, compute: Callable[[str], Awaitable[str]],
+                                   contextual: bool = False) -> str:
+        """Async variant of get_or_compute; concurrent questions share one task"""
+        key = normalize_question(question)
+        if not key or contextual or self.is_time_sensitive(key):
+            with self.lock:
+                self.bypassed += 1
+            return await compute(question)
+
+        answer = self.cache.get(key)
+        if answer is not None:
+            logger.debug("Answer cache hit for '%s'", key)
+            return answer
+
+        async def load() -> str:
+            _uncacheable.set(False)
+            answer = await compute(question)
+            if self.is_cacheable(answer) and not _uncacheable.get():
+                self.cache.set(key, answer)
+            return answer
+
+        answer, _ = await self.async_flights.do(key, load)
+        return answer
+
+    def get_or_stream(self, question: str, stream: Callable[[str], Iterator[str]],
+                      contextual: bool = False) -> Iterator[str]:
+        """
+        Streaming variant of get_or_compute
+        A cached answer is yielded whole. Otherwise the first caller streams
+        chunks as they arrive and concurrent callers for the same question
+        receive the joined answer once it is complete.
+        """
+        key = normalize_question(question)
+        if not key or contextual or self.is_time_sensitive(key):
+            with self.lock:
+                self.bypassed += 1
+            yield from stream(question)
+            return
+
+        answer = self.cache.get(key)
+        if answer is not None:
+            yield answer
+            return
+
+        call, leader = self.flights.begin(key)
+        if not leader:
+            yield self.flights.wait(call)
+            return
+        chunks = []
+        _uncacheable.set(False)
+        try:
+            for chunk in stream(question):
+                chunks.append(chunk)
+                yield chunk
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                e = RuntimeError("Answer stream was closed before it finished")
+            self.flights.finish(key, call, error=e)
+            raise
+        answer = ' '.join(chunks)
+        if self.is_cacheable(answer) and not _uncacheable.get():
+            self.cache.set(key, answer)
+        self.flights.finish(key, call, answer)
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        stats = self.cache.stats()
+        stats['coalesced'] = self.flights.shared + self.async_flights.shared
+        stats['bypassed'] = self.bypassed
+        return stats
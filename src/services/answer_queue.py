@@ -0,0 +1,275 @@
+import abc
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Union
+
+import httpx
+import requests
+from src.models.message_buffer import MessageBuffer
+from src.utils import async_clients
+from src.utils.log_pipeline import log_session
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerSink(abc.ABC):
+    """Destination for answers produced by the background workers"""
+
+    @abc.abstractmethod
+    def deliver(self, session_id: str, answer: str) -> None:
+        """Deliver an answer, or the next part of a streamed answer"""
+
+    async def deliver_async(self, session_id: str, answer: str) -> None:
+        """Deliver from the event loop; blocking sinks run in a worker thread"""
+        await asyncio.to_thread(self.deliver, session_id, answer)
+
+
+class SessionSink(AnswerSink):
+    """
+    Stores answers in the session state until the device polls for them
+    Works across worker processes when the buffer uses a shared session store.
+    """
+
+    def __init__(self, message_buffer: MessageBuffer):
+        self.message_buffer = message_buffer
+
+    def deliver(self, session_id: str, answer: str) -> None:
+        with self.message_buffer.session(session_id) as state:
+            if state.pending_answer:
+                answer = f"{state.pending_answer} {answer}"
+            state.pending_answer = answer
+
+
+class CallbackSink(AnswerSink):
+    """Posts answers to a notification URL"""
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def deliver(self, session_id: str, answer: str) -> None:
+        try:
+            response = self.session.post(
+                self.url,
+                json={'session_id': session_id, 'message': answer},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f"Error delivering answer for {session_id}: {str(e)}")
+
+    async def deliver_async(self, session_id: str, answer: str) -> None:
+        try:
+            response = await async_clients.http_client().post(
+                self.url,
+                json={'session_id': session_id, 'message': answer},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Error delivering answer for {session_id}: {str(e)}")
+
+
+# Earlier conversation messages sent with a question
+History = Sequence[Dict[str, str]]
+# Called with (session_id, question, answer) once a whole answer was delivered
+AnswerCallback = Callable[[str, str, str], None]
+# Called with (session_id, question) when a question is given up: it expired or answering it failed
+DropCallback = Callable[[str, str], None]
+
+
+class AnswerJob(NamedTuple):
+    session_id: str
+    question: str
+    history: History
+    deadline: float
+
+
+class AnswerQueue:
+    """
+    Bounded worker pool that answers questions off the webhook thread
+    The handler returns either the full answer or an iterator of answer
+    parts, each delivered to the sink as soon as it is produced. Jobs that
+    are still queued when their deadline passes are dropped, and answers (or
+    remaining parts) that arrive after the deadline are discarded.
+    `handler(question, history)` receives the conversation history the
+    question was submitted with; on_answer sees every completed answer and
+    on_drop every question that expired or failed instead.
+    """
+
+    def __init__(self, handler: Callable[[str, History], Union[str, Iterable[str]]], sink: AnswerSink,
+                 workers: int = 4, max_pending: int = 100, deadline: float = 60,
+                 on_answer: Optional[AnswerCallback] = None, on_drop: Optional[DropCallback] = None):
+        self.handler = handler
+        self.sink = sink
+        self.on_answer = on_answer
+        self.on_drop = on_drop
+        self.workers = workers
+        self.deadline = deadline
+        self.jobs: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.expired = 0
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"answer-worker-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, session_id: str, question: str, history: History = ()) -> bool:
+        """Queue a question, returning False if the queue is full"""
+        self.start()
+        try:
+            self.jobs.put_nowait(AnswerJob(session_id, question, history, time.time() + self.deadline))
+            return True
+        except queue.Full:
+            logger.warning(f"Answer queue full, rejecting question for {session_id}")
+            return False
+
+    def pending(self) -> int:
+        return self.jobs.qsize()
+
+    def saturated(self) -> bool:
+        """Whether a new question would be rejected: no room is left behind the busy workers"""
+        return self.jobs.full()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                with log_session(job.session_id):
+                    self._answer(job)
+            finally:
+                self.jobs.task_done()
+
+    def _answer(self, job: AnswerJob):
+        if time.time() > job.deadline:
+            self._expire(job, "before it was started")
+            return
+        try:
+            answer = self.handler(job.question, job.history)
+            parts = iter([answer] if isinstance(answer, str) else answer)
+            delivered: List[str] = []
+            for part in parts:
+                if time.time() > job.deadline:
+                    self._expire(job, "while it was being answered")
+                    return
+                self.sink.deliver(job.session_id, part)
+                delivered.append(part)
+            if self.on_answer is not None and delivered:
+                self.on_answer(job.session_id, job.question, ' '.join(delivered))
+        except Exception as e:
+            logger.error(f"Error answering question for {job.session_id}: {str(e)}", exc_info=True)
+            self._drop(job.session_id, job.question)
+
+    def _expire(self, job: AnswerJob, when: str):
+        with self.lock:
+            self.expired += 1
+        logger.warning(f"Question for {job.session_id} passed its deadline {when}")
+        self._drop(job.session_id, job.question)
+
+    def _drop(self, session_id: str, question: str):
+        if self.on_drop is None:
+            return
+        try:
+            self.on_drop(session_id, question)
+        except Exception as e:
+            logger.error(f"Error dropping question for {session_id}: {str(e)}", exc_info=True)
+
+
+class AsyncAnswerQueue:
+    """
+    asyncio counterpart of AnswerQueue for the ASGI entry point
+    Each question is answered by its own task on the serving loop, so many
+    questions can wait on the model without holding a thread each. At most
+    max_pending questions are in flight, and an answer that takes longer
+    than the deadline is cancelled. submit() may be called from other
+    threads, such as the question deadline timer.
+    """
+
+    def __init__(self, handler: Callable[[str, History], Awaitable[str]], sink: AnswerSink,
+                 max_pending: int = 100, deadline: float = 60, on_answer: Optional[AnswerCallback] = None,
+                 on_drop: Optional[DropCallback] = None):
+        self.handler = handler
+        self.sink = sink
+        self.on_answer = on_answer
+        self.on_drop = on_drop
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.expired = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Answer questions on loop (called at ASGI startup)"""
+        self.loop = loop
+
+    def submit(self, session_id: str, question: str, history: History = ()) -> bool:
+        """Start answering a question, returning False if too many are in flight"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        with self.lock:
+            if self.loop is None:
+                self.loop = running
+            if self.loop is None or self.in_flight >= self.max_pending:
+                logger.warning(f"Answer queue full, rejecting question for {session_id}")
+                return False
+            self.in_flight += 1
+        if running is self.loop:
+            self._start(session_id, question, history)
+        else:
+            self.loop.call_soon_threadsafe(self._start, session_id, question, history)
+        return True
+
+    def pending(self) -> int:
+        return self.in_flight
+
+    def saturated(self) -> bool:
+        """Whether a new question would be rejected"""
+        with self.lock:
+            return self.in_flight >= self.max_pending
+
+    def _start(self, session_id: str, question: str, history: History):
+        # The task copies the current context, so its log records carry the session id
+        with log_session(session_id):
+            task = self.loop.create_task(self._answer(session_id, question, history))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _answer(self, session_id: str, question: str, history: History):
+        try:
+            answer = await asyncio.wait_for(self.handler(question, history), self.deadline)
+            await self.sink.deliver_async(session_id, answer)
+            if self.on_answer is not None:
+                await asyncio.to_thread(self.on_answer, session_id, question, answer)
+        except asyncio.TimeoutError:
+            with self.lock:
+                self.expired += 1
+            logger.warning(f"Question for {session_id} passed its deadline while it was being answered")
+            await self._drop(session_id, question)
+        except Exception as e:
+            logger.error(f"Error answering question for {session_id}: {str(e)}", exc_info=True)
+            await self._drop(session_id, question)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    async def _drop(self, session_id: str, question: str):
+        if self.on_drop is None:
+            return
+        try:
+            await asyncio.to_thread(self.on_drop, session_id, question)
+        except Exception as e:
+            logger.error(f"Error dropping question for {session_id}: {str(e)}", exc_info=True)
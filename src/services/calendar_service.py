@@ -2,26 +2,57 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 import os.path
 import pickle
 import datetime
 import logging
+import threading
+import time
+from src.utils.cache import SingleFlight
+from src.utils.metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly',
           'https://www.googleapis.com/auth/calendar.events']
 
+# Minimum seconds between incremental syncs of the upcoming events cache
+CALENDAR_SYNC_INTERVAL = 30
+# How far back the mirror reaches; older events are neither fetched nor kept
+CALENDAR_SYNC_LOOKBACK = datetime.timedelta(days=1)
+# How far ahead a full sync reaches, which bounds recurring events without an end date
+CALENDAR_SYNC_LOOKAHEAD = datetime.timedelta(days=30)
+# A full sync is redone once its horizon is this much closer than the lookahead
+CALENDAR_SYNC_HORIZON_SLACK = datetime.timedelta(days=1)
+
+def _event_start(event):
+    start = event['start'].get('dateTime', event['start'].get('date'))
+    start_dt = datetime.datetime.fromisoformat(start.replace('Z', '+00:00'))
+    if start_dt.tzinfo is None:
+        start_dt = start_dt.replace(tzinfo=datetime.timezone.utc)
+    return start_dt
+
 class CalendarService:
-    def __init__(self):
+    def __init__(self, token_path='token.pickle', service=None, sync_interval=CALENDAR_SYNC_INTERVAL):
+        self.token_path = token_path
         self.creds = None
-        self.service = None
-        self.initialize_credentials()
+        self.service = service
+        self.sync_interval = sync_interval
+        # Local mirror of the primary calendar kept fresh with sync tokens
+        self.events = {}
+        self.sync_token = None
+        self.horizon = None
+        self.last_sync = 0.0
+        self.sync_lock = threading.Lock()
+        self.creds_lock = threading.Lock()
+        if self.service is None:
+            self.initialize_credentials()
 
     def initialize_credentials(self):
         """Initialize or load credentials for Google Calendar API"""
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
                 self.creds = pickle.load(token)
 
         if not self.creds or not self.creds.valid:
@@ -32,32 +63,101 @@ class CalendarService:
                     'client_secrets.json', SCOPES)
                 self.creds = flow.run_local_server(port=0)
             
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(self.creds, token)
+            self.save_credentials()
+
+        # Use the discovery document bundled with googleapiclient instead of fetching it
+        self.service = build('calendar', 'v3', credentials=self.creds,
+                             static_discovery=True, cache_discovery=False)
+
+    def save_credentials(self):
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(self.creds, token)
+
+    def refresh_credentials(self):
+        """Refresh expired credentials in place, keeping the built service; concurrent callers refresh once"""
+        with self.creds_lock:
+            if self.creds and self.creds.expired and self.creds.refresh_token:
+                self.creds.refresh(Request())
+                self.save_credentials()
+
+    def sync_events(self, force=False):
+        """
+        Bring the local event mirror up to date
+        A full sync lists events from CALENDAR_SYNC_LOOKBACK ago up to
+        CALENDAR_SYNC_LOOKAHEAD ahead; later syncs pass the stored sync token
+        and only apply what changed within that window. The window is moved
+        forward by a new full sync once its horizon comes a day closer, and an
+        expired token (HTTP 410) also falls back to a full sync. The mirror is
+        only replaced once every page of a sync arrived.
+        """
+        with self.sync_lock:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if self.horizon and self.horizon - now < CALENDAR_SYNC_LOOKAHEAD - CALENDAR_SYNC_HORIZON_SLACK:
+                self.sync_token = None
+            if not force and self.sync_token and time.time() - self.last_sync < self.sync_interval:
+                return
+            try:
+                self._sync_pages(self.sync_token)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                logger.info("Calendar sync token expired, running a full sync")
+                self.sync_token = None
+                self._sync_pages(None)
+            self.last_sync = time.time()
+
+    def _sync_pages(self, sync_token):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cutoff = now - CALENDAR_SYNC_LOOKBACK
+        horizon = self.horizon if sync_token else now + CALENDAR_SYNC_LOOKAHEAD
+        events = dict(self.events) if sync_token else {}
+        page_token = None
+        while True:
+            params = {'calendarId': 'primary', 'singleEvents': True, 'pageToken': page_token}
+            if sync_token:
+                params['syncToken'] = sync_token
+            else:
+                params['timeMin'] = cutoff.isoformat()
+                params['timeMax'] = horizon.isoformat()
+            with stage_timer('calendar_sync').time():
+                result = self.service.events().list(**params).execute()
+            for event in result.get('items', []):
+                if event.get('status') == 'cancelled':
+                    events.pop(event['id'], None)
+                else:
+                    events[event['id']] = event
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                # Incremental syncs also report changes outside the window; the mirror keeps the same window
+                self.events = {
+                    event_id: event for event_id, event in events.items() if cutoff <= _event_start(event) < horizon
+                }
+                self.sync_token = result.get('nextSyncToken')
+                self.horizon = horizon
+                return
 
-        self.service = build('calendar', 'v3', credentials=self.creds)
+    def invalidate_events(self):
+        """Force the next read to sync before answering"""
+        self.last_sync = 0.0
 
     def get_upcoming_events(self, max_results=5):
         """Get upcoming calendar events"""
         try:
-            now = datetime.datetime.utcnow().isoformat() + 'Z'
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=now,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
+            self.sync_events()
+            with self.sync_lock:
+                events = list(self.events.values())
+            now = datetime.datetime.now(datetime.timezone.utc)
+            upcoming = sorted(
+                (event for event in events if _event_start(event) >= now),
+                key=_event_start
+            )[:max_results]
             
-            events = events_result.get('items', [])
-            
-            if not events:
+            if not upcoming:
                 return "No upcoming events found."
                 
             response = "Upcoming events:\n"
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                start_dt = datetime.datetime.fromisoformat(start.replace('Z', '+00:00'))
+            for event in upcoming:
+                start_dt = _event_start(event)
                 response += f"- {event['summary']} on {start_dt.strftime('%Y-%m-%d %H:%M')}\n"
                 
             return response
@@ -84,13 +184,69 @@ class CalendarService:
             if description:
                 event['description'] = description
 
-            event = self.service.events().insert(
-                calendarId='primary',
-                body=event
-            ).execute()
+            with stage_timer('calendar_insert').time():
+                event = self.service.events().insert(
+                    calendarId='primary',
+                    body=event
+                ).execute()
+            self.invalidate_events()
 
             return f"Event created: {event.get('htmlLink')}"
 
         except Exception as e:
             logger.error(f"Error creating calendar event: {str(e)}")
-            return "Sorry, I couldn't create the calendar event." 
\ No newline at end of file
+            return "Sorry, I couldn't create the calendar event."
+
+class CalendarClientPool:
+    """
+    Process-wide cache of CalendarService clients, one per user
+    Building a client loads the token and the discovery document, so it is
+    done once per user; later lookups only refresh expired credentials.
+    Builds run outside the pool lock, so a slow sign-in or token refresh
+    only holds up callers for the same user.
+    """
+
+    def __init__(self, factory=None):
+        self.factory = factory or self._default_factory
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.builds = SingleFlight()
+
+    @staticmethod
+    def token_path(user_id):
+        return 'token.pickle' if user_id == 'default' else f'token_{user_id}.pickle'
+
+    @classmethod
+    def _default_factory(cls, user_id):
+        return CalendarService(token_path=cls.token_path(user_id))
+
+    def get(self, user_id='default'):
+        with self.lock:
+            client = self.clients.get(user_id)
+        if client is None:
+            client, _ = self.builds.do(user_id, lambda: self._build(user_id))
+        client.refresh_credentials()
+        return client
+
+    def _build(self, user_id):
+        with self.lock:
+            client = self.clients.get(user_id)
+        if client is None:
+            # A build that finished just before this one started is reused
+            client = self.factory(user_id)
+            with self.lock:
+                client = self.clients.setdefault(user_id, client)
+        return client
+
+    def ready(self, user_id='default'):
+        """Whether get() can return without an interactive sign-in: the client is built or a token is saved"""
+        with self.lock:
+            if user_id in self.clients:
+                return True
+        return os.path.exists(self.token_path(user_id))
+
+    def evict(self, user_id='default'):
+        with self.lock:
+            self.clients.pop(user_id, None)
+
+calendar_clients = CalendarClientPool()
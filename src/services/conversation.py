@@ -0,0 +1,146 @@
+"""
+Rolling conversation context per session.
+
+Each session keeps a ring of recent entries in `SessionState.messages`:
+ambient transcript ('heard') and answered questions ('user' and
+'assistant' turns), each stored with its token estimate so totals are kept
+incrementally. A question is sent with the newest entries that fit
+CONTEXT_TOKEN_BUDGET. Turns that no longer fit are folded into a short
+extractive summary only then, so short sessions never pay for it. The ring
+and the summary are capped in tokens, which bounds both memory per session
+and prompt size however long the session runs.
+"""
+import re
+from typing import Any, Dict, List
+
+from src.config import CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARY_TOKENS, CONTEXT_MAX_TOKENS, CONTEXT_MAX_ENTRY_TOKENS
+from src.models.session_state import SessionState
+from src.utils.metrics import count
+
+HEARD, USER, ASSISTANT = 'heard', 'user', 'assistant'
+
+# Roughly four characters per token for English text
+CHARS_PER_TOKEN = 4
+# Each summarized turn keeps at most this many tokens of its first sentence
+SUMMARY_CLAUSE_TOKENS = 30
+
+# Words that point back at earlier turns or at speech heard in the session. Asked with
+# history, questions using them go to the primary model and bypass the answer cache,
+# since their answer depends on that session's context
+FOLLOW_UP_WORDS = {
+    'it', 'its', 'that', 'this', 'those', 'these', 'they', 'them', 'their', 'he', 'him', 'his',
+    'she', 'her', 'there', 'then', 'else', 'again', 'also', 'more', 'another', 'same', 'one'
+}
+RECALL_WORDS = {
+    'was', 'were', 'did', 'said', 'say', 'told', 'mentioned', 'heard', 'talked', 'talking', 'discussed',
+    'earlier', 'before', 'previous', 'last', 'ago', 'we', 'us', 'our'
+}
+FOLLOW_UP_OPENERS = ('and ', 'but ', 'what about', 'how about', 'why ', 'so ')
+
+_WORD_RE = re.compile(r"[a-z']+")
+_SENTENCE_END_RE = re.compile(r'[.!?](\s|$)')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; close enough for budgeting without a tokenizer"""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _clip(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether a question likely depends on what was said before it"""
+    text = question.lower().strip()
+    words = _WORD_RE.findall(text)
+    return (text.startswith(FOLLOW_UP_OPENERS) or not FOLLOW_UP_WORDS.isdisjoint(words)
+            or not RECALL_WORDS.isdisjoint(words))
+
+
+def remember(state: SessionState, role: str, text: str, max_tokens: int = CONTEXT_MAX_TOKENS):
+    """Append an entry, evicting the oldest entries past the session's token cap"""
+    text = _clip(' '.join(text.split()), CONTEXT_MAX_ENTRY_TOKENS)
+    if not text:
+        return
+    if role == HEARD and state.messages and state.messages[-1][0] == HEARD:
+        # Consecutive transcript pieces share one entry
+        entry = state.messages[-1]
+        text = _clip(f"{entry[1]} {text}", CONTEXT_MAX_ENTRY_TOKENS)
+        state.context_tokens -= entry[2]
+        entry[1], entry[2] = text, estimate_tokens(text)
+        state.context_tokens += entry[2]
+    else:
+        tokens = estimate_tokens(text)
+        state.messages.append([role, text, tokens])
+        state.context_tokens += tokens
+    while state.context_tokens > max_tokens and len(state.messages) > 1:
+        _evict(state, 0)
+
+
+def remember_turn(state: SessionState, question: str, answer: str):
+    remember(state, USER, question)
+    remember(state, ASSISTANT, answer)
+
+
+def _evict(state: SessionState, index: int):
+    role, text, tokens = state.messages.pop(index)
+    state.context_tokens -= tokens
+    if role != HEARD:
+        _summarize(state, role, text)
+
+
+def _summarize(state: SessionState, role: str, text: str):
+    """Fold a turn into the summary, dropping the oldest clauses past the summary cap"""
+    end = _SENTENCE_END_RE.search(text)
+    sentence = text[:end.start() + 1] if end else text
+    clause = _clip(f"{'User asked' if role == USER else 'You answered'}: {sentence}", SUMMARY_CLAUSE_TOKENS)
+    tokens = estimate_tokens(clause)
+    state.summary.append([clause, tokens])
+    state.summary_tokens += tokens
+    while state.summary_tokens > CONTEXT_SUMMARY_TOKENS and len(state.summary) > 1:
+        state.summary_tokens -= state.summary.pop(0)[1]
+    count('buddybot_context_summarized_total', 'Turns folded into a session summary')
+
+
+def build_history(state: SessionState, budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """
+    Chat messages carrying the session's context, oldest first
+    The newest entries that fit the budget (less a quarter kept for the
+    summary) are included, then as much of the summary as still fits. Older
+    turns are summarized and dropped from the ring; older transcript is left
+    out and ages out of the ring on its own.
+    """
+    summary_budget = min(CONTEXT_SUMMARY_TOKENS, budget // 4)
+    available = budget - summary_budget
+    used, start = 0, len(state.messages)
+    while start > 0 and used + state.messages[start - 1][2] <= available:
+        start -= 1
+        used += state.messages[start][2]
+    for index in range(start - 1, -1, -1):
+        if state.messages[index][0] != HEARD:
+            _evict(state, index)
+            start -= 1
+    history = _render(state.messages[start:])
+    clauses: List[str] = []
+    for clause, tokens in reversed(state.summary):
+        if used + tokens > budget:
+            break
+        clauses.insert(0, clause)
+        used += tokens
+    if clauses:
+        history.insert(0, {"role": "system", "content": f"Earlier in this conversation: {'; '.join(clauses)}"})
+    if used:
+        count('buddybot_context_tokens_total', 'Estimated context tokens sent with questions', used)
+    return history
+
+
+def _render(entries: List[List[Any]]) -> List[Dict[str, str]]:
+    messages = []
+    for role, text, _ in entries:
+        if role == HEARD:
+            messages.append({"role": "system", "content": f"Recently heard nearby: {text}"})
+        else:
+            messages.append({"role": role, "content": text})
+    return messages
@@ -1,84 +1,194 @@
+import asyncio
 import logging
-from openai import OpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import Optional
 from src.config import (
-    OPENAI_API_KEY, OPENAI_MODEL, MAX_TOKENS, TEMPERATURE, TIMEOUT,
-    OPENWEATHER_API_KEY
+    MAX_TOKENS, TEMPERATURE, LOCAL_INTENT_THRESHOLD
 )
-from src.services.weather_service import WeatherService
-from src.services.calendar_service import CalendarService
-import os
+from src.services.admission import admission
+from src.services.intent_classifier import intent_classifier
+from src.services.model_router import model_router
+from src.services.openai_service import log_upstream_error
+from src.services.upstream import UpstreamPolicy, openai_breaker
+from src.services.prefetch import Prefetch, tool_executor
+from src.services.registry import services
+from src.utils.metrics import stage_timer, count
+from src.utils import async_clients
+from src.utils.log_pipeline import log_payload
 import json
 import datetime
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client with proper configuration
-client_kwargs = {
-    'api_key': OPENAI_API_KEY,
-}
+# The OpenAI client, weather service and calendar clients come from the service registry
+intent_policy = UpstreamPolicy('intent', openai_breaker)
 
-# Only add proxy if it's configured
-if os.getenv('HTTPS_PROXY'):
-    # For newer versions of openai, we need to handle proxies differently
-    os.environ['OPENAI_PROXY'] = os.getenv('HTTPS_PROXY')
-
-client = OpenAI(**client_kwargs)
+INTENT_PROMPT = """You are an AI that analyzes user messages to detect their intent.
+        Respond with a JSON object containing these fields:
+        - primary_intent: The main intent detected (weather, calendar, email, drinking, or unknown)
+        - confidence: A score from 0 to 1 indicating confidence in the detection
+        - entities: Any relevant entities mentioned (dates, locations, people, etc.)
+        - requires_clarification: Boolean indicating if user input needs clarification
+        """
 
-# Initialize Weather service
-weather_service = WeatherService(OPENWEATHER_API_KEY)
+def _intent_request(text: str, timeout: float, model: str) -> dict:
+    return {
+        'model': model,
+        'messages': [
+            {"role": "system", "content": INTENT_PROMPT},
+            {"role": "user", "content": f"Analyze this message: {text}"}
+        ],
+        'temperature': TEMPERATURE,
+        'max_tokens': MAX_TOKENS,
+        'timeout': timeout,
+        'response_format': { "type": "json_object" }
+    }
 
-# Define supported intents
-SUPPORTED_INTENTS = {
-    'weather': ['weather', 'temperature', 'forecast', 'rain', 'sunny'],
-    'calendar': ['schedule', 'appointment', 'meeting', 'calendar', 'event'],
-    'email': ['email', 'mail', 'inbox', 'message', 'send'],
-    'drinking': ['drink', 'alcohol', 'beer', 'wine', 'drunk']
-}
+def _unknown_intent() -> dict:
+    return {
+        "primary_intent": "unknown",
+        "confidence": 0,
+        "entities": [],
+        "requires_clarification": True
+    }
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def analyze_intent(text: str) -> dict:
+    """
+    Analyze text to detect user intents
+    The local classifier answers when it is confident enough; otherwise the
+    question is escalated to OpenAI. The result's `tier` records which one
+    answered ("local" or "llm").
+    """
+    result = _analyze_intent_local(text)
+    if result is not None:
+        return result
+    with stage_timer('intent_llm').time():
+        result = analyze_intent_llm(text)
+    result['tier'] = 'llm'
+    count('buddybot_intent_tier_total', 'Intent analyses by answering tier', tier='llm')
+    return result
+
+async def analyze_intent_async(text: str) -> dict:
+    """Async variant of analyze_intent; only the LLM tier awaits"""
+    result = _analyze_intent_local(text)
+    if result is not None:
+        return result
+    with stage_timer('intent_llm').time():
+        result = await analyze_intent_llm_async(text)
+    result['tier'] = 'llm'
+    count('buddybot_intent_tier_total', 'Intent analyses by answering tier', tier='llm')
+    return result
+
+def _analyze_intent_local(text: str) -> Optional[dict]:
+    """
+    The local classifier's result when it is confident enough, otherwise None
+    Requests to create a calendar event also escalate, since only the LLM
+    extracts the event's name and times. While the OpenAI circuit is open,
+    or every admission slot is taken, the local result is used regardless.
+    """
+    with stage_timer('intent_local').time():
+        result = intent_classifier.classify(text)
+    if result['confidence'] < LOCAL_INTENT_THRESHOLD or _creates_event(result):
+        if not openai_breaker.is_open and not admission.busy():
+            return None
+        count('buddybot_intent_tier_total', 'Intent analyses by answering tier', tier='local_fallback')
+    else:
+        count('buddybot_intent_tier_total', 'Intent analyses by answering tier', tier='local')
+    log_payload(logger, "Local intent analysis result", result)
+    return result
+
+def _creates_event(result: dict) -> bool:
+    return result['primary_intent'] == 'calendar' and any(
+        entity.get('type') == 'action' and entity.get('value') == 'create' for entity in result['entities']
+    )
+
+def analyze_intent_llm(text: str) -> dict:
     """
     Analyze text to detect user intents using OpenAI
     Returns a dictionary with detected intents and confidence scores
     """
     try:
-        logger.info(f"Analyzing intent for text: {text}")
-        
-        system_prompt = """You are an AI that analyzes user messages to detect their intent.
-        Respond with a JSON object containing these fields:
-        - primary_intent: The main intent detected (weather, calendar, email, drinking, or unknown)
-        - confidence: A score from 0 to 1 indicating confidence in the detection
-        - entities: Any relevant entities mentioned (dates, locations, people, etc.)
-        - requires_clarification: Boolean indicating if user input needs clarification
-        """
-        
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Analyze this message: {text}"}
-            ],
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS,
-            timeout=TIMEOUT,
-            response_format={ "type": "json_object" }
-        )
-        
+        logger.info("Analyzing intent for text: %s", text)
+        model = model_router.choose('classify', text).model
+        with admission.slot():
+            response = intent_policy.call(model_router.attempt(
+                model, 'classify',
+                lambda timeout: services.get('openai').chat.completions.create(**_intent_request(text, timeout, model))
+            ))
         result = json.loads(response.choices[0].message.content)
-        logger.info(f"Intent analysis result: {result}")
+        log_payload(logger, "Intent analysis result", result)
         return result
 
     except Exception as e:
-        logger.error(f"Error analyzing intent: {str(e)}")
-        return {
-            "primary_intent": "unknown",
-            "confidence": 0,
-            "entities": [],
-            "requires_clarification": True
-        }
-
-def get_intent_response(intent_data: dict) -> str:
+        log_upstream_error('intent', e)
+        return _unknown_intent()
+
+async def analyze_intent_llm_async(text: str) -> dict:
+    """Async variant of analyze_intent_llm on the event loop's shared client"""
+    try:
+        logger.info("Analyzing intent for text: %s", text)
+        model = model_router.choose('classify', text).model
+        async with admission.slot_async():
+            response = await intent_policy.call_async(model_router.attempt_async(
+                model, 'classify',
+                lambda timeout: async_clients.openai_client().chat.completions.create(**_intent_request(text, timeout, model))
+            ))
+        result = json.loads(response.choices[0].message.content)
+        log_payload(logger, "Intent analysis result", result)
+        return result
+
+    except Exception as e:
+        log_upstream_error('intent', e)
+        return _unknown_intent()
+
+def _weather_location(intent_data: dict) -> Optional[str]:
+    """The location to fetch when the response to intent_data is a weather report"""
+    if intent_data.get('primary_intent') != 'weather' or intent_data.get('requires_clarification', True):
+        return None
+    if intent_data.get('confidence', 0) < 0.7:
+        return None
+    location = next((entity for entity in intent_data.get('entities', []) if entity.get('type') == 'location'), None)
+    return location.get('value', '') if location else None
+
+def _format_weather(weather_data: Optional[dict]) -> str:
+    if weather_data:
+        return (
+            f"Current weather in {weather_data['location']}, {weather_data['country']}:\n"
+            f"Temperature: {weather_data['temperature']}°C\n"
+            f"Feels like: {weather_data['feels_like']}°C\n"
+            f"Conditions: {weather_data['description']}\n"
+            f"Humidity: {weather_data['humidity']}%"
+        )
+    return "Sorry, I couldn't fetch the weather data at the moment."
+
+async def get_intent_response_async(intent_data: dict) -> str:
+    """
+    Async variant of get_intent_response
+    Weather is fetched on the event loop; calendar calls use the blocking
+    Google client and run in a worker thread.
+    """
+    location = _weather_location(intent_data)
+    if location is not None:
+        return _format_weather(await services.get('weather').get_weather_async(location))
+    return await asyncio.to_thread(get_intent_response, intent_data)
+
+def _start_tool(tool: str, arguments: dict):
+    if tool == 'get_weather':
+        return tool_executor.submit(services.get('weather').get_weather, **arguments)
+    return tool_executor.submit(lambda: services.get('calendar').get().get_upcoming_events(**arguments))
+
+def respond_to_intent(text: str) -> str:
+    """
+    Analyze a question and answer it from live data
+    The likely weather or calendar fetch starts from keyword hints while the
+    intent is still being analyzed.
+    """
+    prefetch = Prefetch(text, _start_tool)
+    try:
+        return get_intent_response(analyze_intent(text), prefetch)
+    finally:
+        prefetch.close()
+
+def get_intent_response(intent_data: dict, prefetch: Optional[Prefetch] = None) -> str:
     """Generate appropriate response based on detected intent"""
     
     intent = intent_data.get('primary_intent', 'unknown')
@@ -98,20 +208,14 @@ def get_intent_response(intent_data: dict) -> str:
         if not location:
             return "Which city would you like to know the weather for?"
             
-        weather_data = weather_service.get_weather(location.get('value', ''))
-        if weather_data:
-            return (
-                f"Current weather in {weather_data['location']}, {weather_data['country']}:\n"
-                f"Temperature: {weather_data['temperature']}°C\n"
-                f"Feels like: {weather_data['feels_like']}°C\n"
-                f"Conditions: {weather_data['description']}\n"
-                f"Humidity: {weather_data['humidity']}%"
-            )
-        return "Sorry, I couldn't fetch the weather data at the moment."
+        future = prefetch.claim('get_weather', {'location': location.get('value', '')}) if prefetch else None
+        if future is not None:
+            return _format_weather(future.result())
+        return _format_weather(services.get('weather').get_weather(location.get('value', '')))
     
     if intent == 'calendar':
         try:
-            calendar_service = CalendarService()
+            calendar_service = services.get('calendar').get()
             # Check if we're creating an event or just viewing
             action = next((entity for entity in entities if entity.get('type') == 'action'), None)
             
@@ -126,10 +230,13 @@ def get_intent_response(intent_data: dict) -> str:
                 
                 return calendar_service.create_event(
                     summary=summary.get('value'),
-                    start_time=datetime.fromisoformat(start_time.get('value')),
-                    end_time=datetime.fromisoformat(end_time.get('value'))
+                    start_time=datetime.datetime.fromisoformat(start_time.get('value')),
+                    end_time=datetime.datetime.fromisoformat(end_time.get('value'))
                 )
             else:
+                future = prefetch.claim('get_upcoming_events', {}) if prefetch else None
+                if future is not None:
+                    return future.result()
                 return calendar_service.get_upcoming_events()
                 
         except Exception as e:
@@ -0,0 +1,192 @@
+import datetime
+import re
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from src.config import SUPPORTED_INTENTS
+from src.services.wake_word import compile_phrases
+
+# Extra weighted terms on top of the SUPPORTED_INTENTS keyword tables
+TERM_WEIGHTS = {
+    'weather': {
+        'weather': 3.0, 'forecast': 3.0, 'temperature': 3.0, 'rain': 3.0, 'raining': 2.5,
+        'rainy': 2.5, 'sunny': 2.0, 'snow': 2.5, 'snowing': 2.5, 'umbrella': 2.0, 'humid': 2.0,
+        'humidity': 2.0, 'windy': 2.0, 'wind': 1.5, 'degrees': 2.0, 'storm': 2.0, 'cloudy': 2.0,
+        'hot': 1.5, 'cold': 1.5, 'outside': 0.5, 'jacket': 1.0
+    },
+    'calendar': {
+        'schedule': 3.0, 'appointment': 3.0, 'appointments': 3.0, 'meeting': 3.0, 'meetings': 3.0,
+        'calendar': 3.0, 'event': 2.0, 'events': 2.0, 'agenda': 3.0, 'busy': 2.0, 'book': 1.5,
+        'remind': 1.5, 'plans': 2.0, 'free': 1.0
+    },
+    # Sending or replying to a message may as well be a text; only an email noun makes the intent confident
+    'email': {
+        'email': 3.0, 'emails': 3.0, 'mail': 2.5, 'inbox': 3.0, 'message': 0.75, 'messages': 0.75,
+        'send': 0.5, 'reply': 1.0, 'unread': 2.0
+    },
+    'drinking': {
+        'drink': 2.5, 'drinks': 2.5, 'drinking': 2.5, 'alcohol': 3.0, 'beer': 3.0, 'beers': 3.0,
+        'wine': 3.0, 'drunk': 3.0, 'whiskey': 3.0, 'vodka': 3.0, 'cocktail': 3.0, 'hangover': 3.0
+    }
+}
+KEYWORD_WEIGHT = 1.5
+
+# Pseudo-terms added for extracted entities, e.g. a known city hints at weather
+ENTITY_TERMS = {'location': '__location__', 'date': '__date__'}
+ENTITY_WEIGHTS = {
+    '__location__': {'weather': 1.0},
+    '__date__': {'calendar': 0.5}
+}
+
+KNOWN_CITIES = [
+    'amsterdam', 'athens', 'atlanta', 'auckland', 'austin', 'bangkok', 'barcelona', 'beijing',
+    'berlin', 'bogota', 'boston', 'brussels', 'budapest', 'buenos aires', 'cairo', 'cape town',
+    'chicago', 'copenhagen', 'dallas', 'delhi', 'denver', 'dubai', 'dublin', 'edinburgh',
+    'frankfurt', 'geneva', 'hanoi', 'helsinki', 'ho chi minh city', 'hong kong', 'houston',
+    'istanbul', 'jakarta', 'johannesburg', 'kuala lumpur', 'lagos', 'las vegas', 'lima', 'lisbon',
+    'london', 'los angeles', 'madrid', 'manchester', 'manila', 'melbourne', 'mexico city', 'miami',
+    'milan', 'montreal', 'moscow', 'mumbai', 'munich', 'nairobi', 'new york', 'oslo', 'paris',
+    'philadelphia', 'phoenix', 'prague', 'rio de janeiro', 'rome', 'san diego', 'san francisco',
+    'santiago', 'sao paulo', 'seattle', 'seoul', 'shanghai', 'singapore', 'stockholm', 'sydney',
+    'taipei', 'tel aviv', 'tokyo', 'toronto', 'vancouver', 'vienna', 'warsaw', 'washington', 'zurich'
+]
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_CITY_RE = re.compile(compile_phrases(KNOWN_CITIES))
+_LOCATION_RE = re.compile(
+    r"\b(?:in|for|at|near)\s+([a-z][a-z .'-]*?)"
+    r"(?=\s+(?:today|tonight|tomorrow|this|next|on|right|now|later)\b|\s*[?.!,]|\s*$)"
+)
+_DATE_RE = re.compile(
+    r"\b(today|tonight|tomorrow|yesterday|this weekend|next week|in (\d+) days?|"
+    r"(?:on |this |next )?(" + '|'.join(WEEKDAYS) + r"))\b"
+)
+# Requests to put something in the calendar rather than read it
+_CREATE_RE = re.compile(
+    r"\b(?:schedule|book|set up|arrange|create|make|add|put)\s+(?:a|an|another|me|my|in|on|up)\b|"
+    r"\b(?:add|put)\b.*\b(?:to|on|in)\s+my\s+(?:calendar|schedule|agenda)\b"
+)
+_LOCATION_STOPWORDS = {
+    'the', 'my', 'me', 'a', 'an', 'it', 'there', 'here', 'general', 'minutes', 'hours',
+    'noon', 'midnight', 'night', 'home', 'work', 'your', 'his', 'her', 'our', 'their'
+}
+
+class IntentClassifier:
+    """
+    Keyword and term-weight intent scorer
+    Terms map to rows of a (terms x intents) weight matrix, so scoring a
+    question is a single gather-and-sum over the matrix and scoring a batch
+    is a single sparse-by-dense product.
+    """
+
+    def __init__(self, supported_intents: Dict[str, List[str]] = SUPPORTED_INTENTS,
+                 term_weights: Dict[str, Dict[str, float]] = TERM_WEIGHTS):
+        self.intents = list(supported_intents)
+        weights: Dict[str, Dict[str, float]] = {}
+        for intent, keywords in supported_intents.items():
+            for keyword in keywords:
+                weights.setdefault(keyword, {})[intent] = KEYWORD_WEIGHT
+            for term, weight in term_weights.get(intent, {}).items():
+                weights.setdefault(term, {})[intent] = weight
+        for term, intent_weights in ENTITY_WEIGHTS.items():
+            weights.setdefault(term, {}).update(
+                (intent, weight) for intent, weight in intent_weights.items() if intent in self.intents
+            )
+        self.vocabulary = {term: index for index, term in enumerate(sorted(weights))}
+        self.matrix = np.zeros((len(self.vocabulary), len(self.intents)), dtype=np.float32)
+        for term, intent_weights in weights.items():
+            for intent, weight in intent_weights.items():
+                self.matrix[self.vocabulary[term], self.intents.index(intent)] = weight
+
+    def _term_indices(self, text: str, entities: List[Dict[str, str]]) -> List[int]:
+        vocabulary = self.vocabulary
+        terms = _TOKEN_RE.findall(text.lower())
+        terms.extend(ENTITY_TERMS[entity['type']] for entity in entities if entity['type'] in ENTITY_TERMS)
+        return [vocabulary[term] for term in terms if term in vocabulary]
+
+    def score(self, text: str, entities: Optional[List[Dict[str, str]]] = None) -> np.ndarray:
+        """Score every intent for one text"""
+        if entities is None:
+            entities = extract_entities(text)
+        indices = self._term_indices(text, entities)
+        if not indices:
+            return np.zeros(len(self.intents), dtype=np.float32)
+        return self.matrix[indices].sum(axis=0)
+
+    def score_batch(self, texts: Sequence[str], entities: Optional[Sequence[List[Dict[str, str]]]] = None) -> np.ndarray:
+        """Score every intent for many texts, returning a (texts x intents) array"""
+        if entities is None:
+            entities = [extract_entities(text) for text in texts]
+        counts = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, (text, found) in enumerate(zip(texts, entities)):
+            np.add.at(counts[row], self._term_indices(text, found), 1)
+        return counts @ self.matrix
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Return an analysis in the same shape as the LLM classifier"""
+        entities = extract_entities(text)
+        return self._result(self.score(text, entities), entities)
+
+    def classify_batch(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        entities = [extract_entities(text) for text in texts]
+        return [
+            self._result(scores, found)
+            for scores, found in zip(self.score_batch(texts, entities), entities)
+        ]
+
+    def _result(self, scores: np.ndarray, entities: List[Dict[str, str]]) -> Dict[str, Any]:
+        order = np.argsort(scores)[::-1]
+        top = float(scores[order[0]])
+        second = float(scores[order[1]]) if len(order) > 1 else 0.0
+        if top <= 0:
+            intent, confidence = 'unknown', 0.0
+        else:
+            # Margin over the runner-up, squashed into [0, 1)
+            margin = top - second
+            intent, confidence = self.intents[order[0]], margin / (margin + 1.0)
+        return {
+            'primary_intent': intent,
+            'confidence': round(confidence, 3),
+            'entities': entities,
+            'requires_clarification': intent == 'unknown',
+            'scores': {name: float(value) for name, value in zip(self.intents, scores)},
+            'tier': 'local'
+        }
+
+def extract_entities(text: str, today: Optional[datetime.date] = None) -> List[Dict[str, str]]:
+    """Pull city names, relative dates and a create action out of a question"""
+    text = text.lower()
+    entities = []
+    city = _CITY_RE.search(text)
+    if city:
+        entities.append({'type': 'location', 'value': city.group()})
+    else:
+        location = _LOCATION_RE.search(text)
+        if location and location.group(1).split()[0] not in _LOCATION_STOPWORDS:
+            entities.append({'type': 'location', 'value': location.group(1).strip()})
+
+    date = _DATE_RE.search(text)
+    if date:
+        entities.append({'type': 'date', 'value': _resolve_date(date, today or datetime.date.today()), 'text': date.group(1)})
+
+    if _CREATE_RE.search(text):
+        entities.append({'type': 'action', 'value': 'create'})
+    return entities
+
+def _resolve_date(match: 're.Match', today: datetime.date) -> str:
+    phrase, days, weekday = match.group(1), match.group(2), match.group(3)
+    if days:
+        offset = int(days)
+    elif weekday:
+        offset = (WEEKDAYS.index(weekday) - today.weekday()) % 7
+        if phrase.startswith('next '):
+            offset += 7
+    else:
+        offset = {
+            'today': 0, 'tonight': 0, 'tomorrow': 1, 'yesterday': -1,
+            'this weekend': (5 - today.weekday()) % 7, 'next week': 7 - today.weekday()
+        }[phrase]
+    return (today + datetime.timedelta(days=offset)).isoformat()
+
+intent_classifier = IntentClassifier()
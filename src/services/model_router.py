@@ -0,0 +1,264 @@
+"""
+Per-call model selection
+
+Each OpenAI call asks the ModelRouter which model to use. Intent
+classification and short factual questions go to FAST_MODEL; long or
+open-ended questions, and follow-ups that lean on conversation history, go
+to the primary OPENAI_MODEL. Every attempt's latency and outcome feed an
+exponentially weighted mean, variance and error rate per model and call
+type. While the primary's estimated p95 is past MODEL_LATENCY_BUDGET, or its
+error rate past MODEL_MAX_ERROR_RATE, its calls fail over to the fast
+model. One call per MODEL_PROBE_INTERVAL still goes to the primary so it can
+recover. Routing decisions, per-model latency and token usage are exported
+as metrics and summarized in /status.
+"""
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Sequence, Tuple
+
+from src.config import (
+    OPENAI_MODEL, FAST_MODEL, MODEL_ROUTING, MODEL_COMPLEX_TOKENS, MODEL_LATENCY_BUDGET, MODEL_MAX_ERROR_RATE,
+    MODEL_MIN_SAMPLES, MODEL_PROBE_INTERVAL, MODEL_EWMA_ALPHA
+)
+from src.services.conversation import CHARS_PER_TOKEN, estimate_tokens, is_follow_up
+from src.utils.metrics import metrics, count
+
+# Words that mark a question as needing more than a quick lookup
+COMPLEX_WORDS = {
+    'explain', 'why', 'compare', 'difference', 'differences', 'analyze', 'analyse', 'plan', 'write', 'draft',
+    'summarize', 'summarise', 'pros', 'cons', 'recommend', 'should', 'strategy', 'tradeoffs', 'step'
+}
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+# z-score of the 95th percentile of a normal distribution
+_P95_Z = 1.645
+
+
+class ModelChoice(NamedTuple):
+    model: str
+    reason: str
+
+
+class ModelStats:
+    """Exponentially weighted latency mean and variance, and error rate, for one model and call type"""
+    __slots__ = ('latency', 'variance', 'error_rate', 'samples', 'last_seen')
+
+    def __init__(self):
+        self.latency = 0.0
+        self.variance = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+        self.last_seen = 0.0
+
+    def observe(self, seconds: float, error: bool, alpha: float, now: float):
+        if self.samples == 0:
+            self.latency = seconds
+        else:
+            diff = seconds - self.latency
+            increment = alpha * diff
+            self.latency += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+        self.error_rate += alpha * ((1.0 if error else 0.0) - self.error_rate)
+        self.samples += 1
+        self.last_seen = now
+
+    def p95(self) -> float:
+        return self.latency + _P95_Z * math.sqrt(self.variance)
+
+
+def is_complex(text: str, history: Sequence[Dict[str, str]] = (), max_tokens: int = MODEL_COMPLEX_TOKENS) -> bool:
+    """Whether a question should go to the primary model"""
+    if estimate_tokens(text) > max_tokens:
+        return True
+    if not COMPLEX_WORDS.isdisjoint(_WORD_RE.findall(text.lower())):
+        return True
+    return bool(history) and is_follow_up(text)
+
+
+class ModelRouter:
+    """
+    Chooses a model per call and tracks how each model is doing
+    choose() returns the model and the reason for it; attempt() and
+    stream() wrap a request so its latency, outcome and token usage are
+    recorded against the model that served it.
+    """
+
+    def __init__(self, primary: str = OPENAI_MODEL, fast: str = FAST_MODEL, enabled: bool = MODEL_ROUTING,
+                 latency_budget: float = MODEL_LATENCY_BUDGET, max_error_rate: float = MODEL_MAX_ERROR_RATE,
+                 min_samples: int = MODEL_MIN_SAMPLES, probe_interval: float = MODEL_PROBE_INTERVAL,
+                 alpha: float = MODEL_EWMA_ALPHA, clock: Callable[[], float] = time.monotonic):
+        self.primary = primary
+        self.fast = fast
+        self.enabled = enabled
+        self.latency_budget = latency_budget
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self.alpha = alpha
+        self.clock = clock
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self.probed: Dict[Tuple[str, str], float] = {}
+        self.lock = threading.Lock()
+
+    def degraded(self, model: str, call: str) -> bool:
+        """Whether a model's recent calls of this type are too slow or failing too often"""
+        stats = self.stats.get((model, call))
+        if stats is None or stats.samples < self.min_samples:
+            return False
+        return stats.p95() > self.latency_budget or stats.error_rate > self.max_error_rate
+
+    def choose(self, call: str, text: str = '', history: Sequence[Dict[str, str]] = ()) -> ModelChoice:
+        if not self.enabled:
+            choice = ModelChoice(self.primary, 'fixed')
+        elif call == 'classify':
+            choice = ModelChoice(self.fast, 'classify')
+        elif is_complex(text, history):
+            choice = ModelChoice(self.primary, 'complex')
+        else:
+            choice = ModelChoice(self.fast, 'simple')
+        if choice.model != self.fast:
+            with self.lock:
+                if self.degraded(choice.model, call):
+                    now = self.clock()
+                    key = (choice.model, call)
+                    last = max(self.stats[key].last_seen, self.probed.get(key, 0.0))
+                    if now - last >= self.probe_interval:
+                        self.probed[key] = now
+                        choice = ModelChoice(choice.model, 'probe')
+                    else:
+                        choice = ModelChoice(self.fast, 'failover')
+        count('buddybot_model_routes_total', 'Model routing decisions', call=call, model=choice.model,
+              reason=choice.reason)
+        return choice
+
+    def observe(self, model: str, call: str, seconds: float, error: bool = False,
+                prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self.lock:
+            stats = self.stats.get((model, call))
+            if stats is None:
+                stats = self.stats[(model, call)] = ModelStats()
+            stats.observe(seconds, error, self.alpha, self.clock())
+        metrics.histogram('buddybot_model_seconds', 'OpenAI request latency by model and call type',
+                          model=model, call=call).observe(seconds)
+        if error:
+            count('buddybot_model_errors_total', 'Failed OpenAI requests by model', model=model, call=call)
+        if prompt_tokens:
+            count('buddybot_model_tokens_total', 'Tokens used by model', prompt_tokens, model=model, kind='prompt')
+        if completion_tokens:
+            count('buddybot_model_tokens_total', 'Tokens used by model', completion_tokens, model=model,
+                  kind='completion')
+
+    def attempt(self, model: str, call: str, create: Callable[[float], Any]) -> Callable[[float], Any]:
+        """Wrap an UpstreamPolicy attempt so each request is recorded against model"""
+        def timed(timeout: float) -> Any:
+            start = time.perf_counter()
+            try:
+                response = create(timeout)
+            except Exception:
+                self.observe(model, call, time.perf_counter() - start, error=True)
+                raise
+            prompt, completion = _usage(response)
+            self.observe(model, call, time.perf_counter() - start, prompt_tokens=prompt, completion_tokens=completion)
+            return response
+        return timed
+
+    def attempt_async(self, model: str, call: str, create: Callable[[float], Any]) -> Callable[[float], Any]:
+        """Async variant of attempt"""
+        async def timed(timeout: float) -> Any:
+            start = time.perf_counter()
+            try:
+                response = await create(timeout)
+            except Exception:
+                self.observe(model, call, time.perf_counter() - start, error=True)
+                raise
+            prompt, completion = _usage(response)
+            self.observe(model, call, time.perf_counter() - start, prompt_tokens=prompt, completion_tokens=completion)
+            return response
+        return timed
+
+    def stream(self, model: str, call: str, create: Callable[[float], Iterable[Any]],
+               prompt_tokens: int = 0) -> Callable[[float], Iterator[Any]]:
+        """
+        Like attempt, for streamed responses
+        The request is timed until the stream is exhausted. Streams carry no
+        usage, so completion tokens are estimated from the streamed text.
+        """
+        def timed(timeout: float) -> Iterator[Any]:
+            start = time.perf_counter()
+            try:
+                chunks = create(timeout)
+            except Exception:
+                self.observe(model, call, time.perf_counter() - start, error=True)
+                raise
+            return self._tracked(model, call, chunks, start, prompt_tokens)
+        return timed
+
+    def _tracked(self, model: str, call: str, chunks: Iterable[Any], start: float,
+                 prompt_tokens: int) -> Iterator[Any]:
+        characters = 0
+        try:
+            for chunk in chunks:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if isinstance(content, str):
+                    characters += len(content)
+                yield chunk
+        except Exception:
+            self.observe(model, call, time.perf_counter() - start, error=True, prompt_tokens=prompt_tokens)
+            raise
+        self.observe(model, call, time.perf_counter() - start, prompt_tokens=prompt_tokens,
+                     completion_tokens=(characters + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per model: token usage, and per call type requests, latency (EWMA, p95 estimate, median) and error rate"""
+        summary: Dict[str, Dict[str, Any]] = {}
+        with self.lock:
+            stats = {key: (value.latency, value.p95(), value.error_rate, value.samples)
+                     for key, value in self.stats.items()}
+        for (model, call), (latency, p95, error_rate, samples) in sorted(stats.items()):
+            entry = summary.setdefault(model, {'calls': {}, 'tokens': {
+                kind: int(metrics.counter('buddybot_model_tokens_total', model=model, kind=kind).value)
+                for kind in ('prompt', 'completion')
+            }})
+            entry['calls'][call] = {
+                'requests': samples,
+                'latency_ewma': latency,
+                'latency_p95_estimate': p95,
+                'latency_p50': metrics.histogram('buddybot_model_seconds', model=model, call=call).quantile(0.5),
+                'error_rate': error_rate,
+                'degraded': self.degraded(model, call)
+            }
+        return summary
+
+
+def _usage(response: Any) -> Tuple[int, int]:
+    """Prompt and completion tokens reported with a response, zero when missing"""
+    usage = getattr(response, 'usage', None)
+    tokens = getattr(usage, 'prompt_tokens', 0), getattr(usage, 'completion_tokens', 0)
+    return tuple(value if isinstance(value, int) else 0 for value in tokens)
+
+
+def prompt_tokens(messages: Sequence[Dict[str, Any]]) -> int:
+    """Estimated prompt size of a list of chat messages"""
+    return sum(estimate_tokens(message.get('content') or '') for message in messages)
+
+
+# Shared by every OpenAI call in the process
+model_router = ModelRouter()
+
+
+def collect_model_metrics():
+    with model_router.lock:
+        stats = [(key, value.latency, value.p95(), value.error_rate) for key, value in model_router.stats.items()]
+    for (model, call), latency, p95, error_rate in stats:
+        labels = {'model': model, 'call': call}
+        yield ('buddybot_model_latency_ewma_seconds', 'gauge', 'Exponentially weighted request latency', labels,
+               latency)
+        yield ('buddybot_model_latency_p95_seconds', 'gauge', 'Estimated p95 request latency from the EWMA', labels,
+               p95)
+        yield ('buddybot_model_error_rate', 'gauge', 'Exponentially weighted error rate', labels, error_rate)
+
+
+metrics.register_collector(collect_model_metrics)
@@ -1,7 +1,15 @@
 import logging
-import openai
-from tenacity import retry, stop_after_attempt, wait_exponential
-from src.config import OPENAI_API_KEY, OPENAI_MODEL, MAX_TOKENS, TEMPERATURE, TIMEOUT
+import re
+import time
+from typing import Dict, Iterator, Optional, Sequence
+from src.config import MAX_TOKENS, TEMPERATURE
+from src.services.admission import admission, Overloaded
+from src.services.model_router import model_router, prompt_tokens
+from src.services.registry import services
+from src.services.upstream import UpstreamPolicy, CircuitOpenError, openai_breaker
+from src.utils.metrics import metrics, count
+from src.utils import async_clients
+from src.utils.log_pipeline import log_payload
 import os
 
 logger = logging.getLogger(__name__)
@@ -10,29 +18,178 @@ logger = logging.getLogger(__name__)
 if os.getenv('HTTPS_PROXY'):
     os.environ['HTTPS_PROXY'] = os.getenv('HTTPS_PROXY')
 
-# Initialize OpenAI API key
-openai.api_key = OPENAI_API_KEY
+# The OpenAI client is built on first use by the service registry
+answer_policy = UpstreamPolicy('answer', openai_breaker)
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_openai_response(text: str) -> str:
-    """Get response from OpenAI for the user's question"""
+SYSTEM_PROMPT = "You are Omi, a helpful AI assistant. Provide clear, concise, and friendly responses."
+FALLBACK_RESPONSE = "I'm sorry, I encountered an error processing your request."
+BUSY_RESPONSE = "I'm a bit busy right now, please ask me again in a moment."
+
+# A sentence ends at . ! or ? followed by whitespace, so "3.5" is not split
+_SENTENCE_END_RE = re.compile(r'[.!?]+["\')\]]*\s')
+
+ANSWER_PHASES = ('first_token', 'first_sentence', 'total')
+
+def answer_timer(phase: str):
+    """Histogram of seconds until the first token, first sentence or full answer"""
+    return metrics.histogram('buddybot_answer_seconds', 'OpenAI answer latency by phase', phase=phase)
+
+def latency_summary() -> Dict[str, Optional[float]]:
+    summary = {'samples': answer_timer('total').count}
+    for phase in ANSWER_PHASES:
+        summary[f'{phase}_p50'] = answer_timer(phase).quantile(0.5)
+        summary[f'{phase}_p95'] = answer_timer(phase).quantile(0.95)
+    return summary
+
+def log_upstream_error(call: str, error: Exception):
+    """Log a failed OpenAI call, counting timeouts"""
+    from openai import APITimeoutError
+    if isinstance(error, Overloaded):
+        logger.warning(f"OpenAI {call} shed: {str(error)}")
+    elif isinstance(error, CircuitOpenError):
+        logger.warning(f"OpenAI {call} skipped: {str(error)}")
+    elif isinstance(error, (APITimeoutError, TimeoutError)):
+        count('buddybot_timeouts_total', 'Upstream calls that timed out', call=call)
+        logger.error(f"OpenAI {call} timed out: {str(error)}")
+    else:
+        logger.error(f"Error getting OpenAI {call}: {str(error)}")
+
+def fallback_response(error: Exception) -> str:
+    """The answer given when a call failed; shed questions are told to ask again"""
+    return BUSY_RESPONSE if isinstance(error, Overloaded) else FALLBACK_RESPONSE
+
+def _messages(text: str, history: Sequence[Dict[str, str]] = ()):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *history,
+        {"role": "user", "content": text}
+    ]
+
+def get_openai_response(text: str, history: Sequence[Dict[str, str]] = ()) -> str:
+    """
+    Get response from OpenAI for the user's question
+    history holds earlier conversation messages (see services.conversation).
+    Retries, hedging and the deadline come from answer_policy; once they
+    are exhausted, or the circuit is open, the fallback answer is returned.
+    The call waits for an admission slot first and is answered busy if shed.
+    """
+    try:
+        logger.info("Sending question to OpenAI: %s", text)
+        start = time.perf_counter()
+        
+        model = model_router.choose('answer', text, history).model
+        with admission.slot():
+            response = answer_policy.call(model_router.attempt(model, 'answer', lambda timeout: services.get('openai').chat.completions.create(
+                model=model,
+                messages=_messages(text, history),
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                timeout=timeout
+            )))
+        
+        answer = response.choices[0].message.content.strip()
+        answer_timer('total').observe(time.perf_counter() - start)
+        log_payload(logger, "Received response from OpenAI", answer)
+        return answer
+    except Exception as e:
+        log_upstream_error('answer', e)
+        return fallback_response(e)
+
+async def get_openai_response_async(text: str, history: Sequence[Dict[str, str]] = ()) -> str:
+    """Async variant of get_openai_response on the event loop's shared client"""
     try:
-        logger.info(f"Sending question to OpenAI: {text}")
+        logger.info("Sending question to OpenAI: %s", text)
+        start = time.perf_counter()
         
-        response = openai.ChatCompletion.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You are Omi, a helpful AI assistant. Provide clear, concise, and friendly responses."},
-                {"role": "user", "content": text}
-            ],
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS,
-            timeout=TIMEOUT
-        )
+        model = model_router.choose('answer', text, history).model
+        async with admission.slot_async():
+            response = await answer_policy.call_async(model_router.attempt_async(model, 'answer', lambda timeout: async_clients.openai_client().chat.completions.create(
+                model=model,
+                messages=_messages(text, history),
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                timeout=timeout
+            )))
         
         answer = response.choices[0].message.content.strip()
-        logger.info(f"Received response from OpenAI: {answer}")
+        answer_timer('total').observe(time.perf_counter() - start)
+        log_payload(logger, "Received response from OpenAI", answer)
         return answer
     except Exception as e:
-        logger.error(f"Error getting OpenAI response: {str(e)}")
-        return "I'm sorry, I encountered an error processing your request."
\ No newline at end of file
+        log_upstream_error('answer', e)
+        return fallback_response(e)
+
+def stream_openai_response(text: str, history: Sequence[Dict[str, str]] = ()) -> Iterator[str]:
+    """
+    Stream the answer to the user's question in two parts
+    The first sentence is yielded as soon as it is complete and the rest of
+    the answer follows once the stream ends.
+    """
+    logger.info("Streaming question to OpenAI: %s", text)
+
+    def deltas():
+        # The admission slot is held until the stream ends; opening the
+        # stream is retried, but a duplicate stream is never hedged
+        model = model_router.choose('answer', text, history).model
+        messages = _messages(text, history)
+        with admission.slot():
+            stream = answer_policy.call(model_router.stream(model, 'answer', lambda timeout: services.get('openai').chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                timeout=timeout,
+                stream=True
+            ), prompt_tokens(messages)), hedge=False)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    yield from stream_sentences(deltas())
+
+def stream_sentences(deltas: Iterator[str]) -> Iterator[str]:
+    """
+    Regroup streamed content deltas into the first sentence and the rest
+    Time to first token, first sentence and the full answer are recorded in
+    the answer latency histograms. An error before any output yields the
+    fallback answer, or the busy answer if the question was shed. An error
+    after output started is raised once the partial answer was yielded, so
+    callers do not cache or remember a truncated answer.
+    """
+    start = time.perf_counter()
+    first_token = first_sentence = None
+    buffer = ''
+    sent_first = False
+    error = None
+    try:
+        for delta in deltas:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            buffer += delta
+            if not sent_first:
+                end = _SENTENCE_END_RE.search(buffer)
+                if end:
+                    first_sentence = time.perf_counter() - start
+                    sent_first = True
+                    yield buffer[:end.end()].strip()
+                    buffer = buffer[end.end():]
+    except Exception as e:
+        log_upstream_error('answer', e)
+        if not sent_first and not buffer.strip():
+            yield fallback_response(e)
+            return
+        error = e
+
+    rest = buffer.strip()
+    if rest:
+        if first_sentence is None:
+            first_sentence = time.perf_counter() - start
+        yield rest
+    if error is not None:
+        raise error
+    if first_token is not None:
+        answer_timer('first_token').observe(first_token)
+    if first_sentence is not None:
+        answer_timer('first_sentence').observe(first_sentence)
+    answer_timer('total').observe(time.perf_counter() - start)
+    logger.info("Streamed response from OpenAI in %.2fs", time.perf_counter() - start)
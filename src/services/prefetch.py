@@ -0,0 +1,118 @@
+"""
+Speculative tool fetches
+
+While a question is being classified (by the intent analyzer or the
+router's tool-choosing model call), a cheap keyword hint guesses which tool
+calls the answer will need and starts them. When the final decision asks
+for a hinted call it claims the running fetch instead of starting its own;
+hints nobody claims are counted as wasted. Hit and waste counts are
+exported as `buddybot_speculation_total{tool, outcome}`.
+
+Calendar fetches are only speculated for questions about the user's own
+calendar, and only once the calendar clients are built and signed in:
+building a client without a saved token starts an interactive sign-in.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from src.config import SUPPORTED_INTENTS, SPECULATIVE_PREFETCH, TOOL_WORKERS
+from src.services.intent_classifier import extract_entities
+from src.services.registry import services
+from src.utils.metrics import metrics, count
+
+# Tool calls (leaf fetches only) run here: speculative ones and fanned-out ones
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix='tool')
+
+SPECULATION_KEYWORDS = {
+    'get_weather': set(SUPPORTED_INTENTS['weather']) | {'snow', 'wind', 'cold', 'hot', 'umbrella', 'raining'},
+    'get_upcoming_events': set(SUPPORTED_INTENTS['calendar']) | {
+        'appointments', 'meetings', 'events', 'busy', 'free', 'agenda'
+    }
+}
+# Calendar words are common in general questions; only questions about the user's own time are hinted
+PERSONAL_WORDS = {'i', 'im', 'me', 'my', 'we', 'our', 'us'}
+
+# Arguments a tool call fills in by default, so hinted and actual calls compare equal
+TOOL_DEFAULTS = {
+    'get_weather': {'units': 'metric'},
+    'get_upcoming_events': {'max_results': 5}
+}
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+SPECULATION_OUTCOMES = ('hit', 'wasted', 'missed')
+
+
+def hinted_calls(text: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Guess the tool calls a question will need from keywords and entities"""
+    words = set(_WORD_RE.findall(text.lower()))
+    calls = []
+    if not words.isdisjoint(SPECULATION_KEYWORDS['get_weather']):
+        location = next((entity['value'] for entity in extract_entities(text) if entity['type'] == 'location'), None)
+        if location:
+            calls.append(('get_weather', {'location': location}))
+    if (not words.isdisjoint(SPECULATION_KEYWORDS['get_upcoming_events']) and not words.isdisjoint(PERSONAL_WORDS)
+            and calendar_ready()):
+        calls.append(('get_upcoming_events', {}))
+    return calls
+
+
+def calendar_ready() -> bool:
+    """Whether the calendar can be read without building the clients or signing in"""
+    pool = services.peek('calendar')
+    return pool is not None and pool.ready()
+
+
+def speculation_summary() -> Dict[str, Dict[str, Any]]:
+    """Per-tool speculation outcomes and the share of speculative fetches that were used"""
+    summary = {}
+    for tool in SPECULATION_KEYWORDS:
+        outcomes = {
+            outcome: int(metrics.counter('buddybot_speculation_total', tool=tool, outcome=outcome).value)
+            for outcome in SPECULATION_OUTCOMES
+        }
+        started = outcomes['hit'] + outcomes['wasted']
+        if started or outcomes['missed']:
+            outcomes['hit_rate'] = outcomes['hit'] / started if started else None
+            summary[tool] = outcomes
+    return summary
+
+
+def call_key(tool: str, arguments: Dict[str, Any]) -> Hashable:
+    merged = dict(TOOL_DEFAULTS.get(tool, {}), **arguments)
+    return tool, tuple(sorted(
+        (name, ' '.join(value.lower().split()) if isinstance(value, str) else value)
+        for name, value in merged.items()
+    ))
+
+
+class Prefetch:
+    """
+    Speculative fetches started for one question
+    `submit(tool, arguments)` starts a fetch and returns its future (a
+    concurrent.futures.Future or an asyncio task); claim() hands it to the
+    caller that needs that exact call. Unclaimed fetches are left to finish,
+    since their results still warm the service caches.
+    """
+
+    def __init__(self, text: str, submit: Callable[[str, Dict[str, Any]], Any], enabled: bool = SPECULATIVE_PREFETCH):
+        self.started: Dict[Hashable, Any] = {}
+        if not enabled:
+            return
+        for tool, arguments in hinted_calls(text):
+            self.started[call_key(tool, arguments)] = submit(tool, arguments)
+
+    def claim(self, tool: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        """Take the running fetch for this call, or None if it was not speculated"""
+        future = self.started.pop(call_key(tool, arguments), None)
+        if future is not None:
+            count('buddybot_speculation_total', 'Speculative tool fetches by outcome', tool=tool, outcome='hit')
+        elif tool in SPECULATION_KEYWORDS:
+            count('buddybot_speculation_total', 'Speculative tool fetches by outcome', tool=tool, outcome='missed')
+        return future
+
+    def close(self):
+        """Count the fetches nobody claimed as wasted"""
+        for tool, _ in self.started:
+            count('buddybot_speculation_total', 'Speculative tool fetches by outcome', tool=tool, outcome='wasted')
+        self.started.clear()
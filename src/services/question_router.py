@@ -0,0 +1,382 @@
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Sequence
+from src.config import MAX_TOKENS, TEMPERATURE
+from src.services.admission import admission, Overloaded
+from src.services.answer_cache import skip_cache
+from src.services.model_router import model_router, prompt_tokens
+from src.services.openai_service import (
+    SYSTEM_PROMPT, FALLBACK_RESPONSE, stream_sentences, log_upstream_error, fallback_response
+)
+from src.services.upstream import UpstreamPolicy, openai_breaker
+from src.services.prefetch import Prefetch, tool_executor
+from src.services.registry import services
+from src.utils.metrics import metrics, count
+from src.utils import async_clients
+
+logger = logging.getLogger(__name__)
+
+ROUTER_PROMPT = SYSTEM_PROMPT + (
+    " Call a tool only when the question needs the user's live weather, calendar or email data;"
+    " otherwise answer directly. Keep answers short enough to be read aloud."
+)
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_weather",
+            "description": "Get the current weather for a city",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {"type": "string", "description": "City name"},
+                    "units": {"type": "string", "enum": ["metric", "imperial"]}
+                },
+                "required": ["location"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_upcoming_events",
+            "description": "List the user's upcoming calendar events",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "max_results": {"type": "integer", "minimum": 1, "maximum": 20}
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "create_calendar_event",
+            "description": "Create an event in the user's calendar",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "summary": {"type": "string"},
+                    "start_time": {"type": "string", "description": "ISO 8601 start time in UTC"},
+                    "end_time": {"type": "string", "description": "ISO 8601 end time in UTC"},
+                    "description": {"type": "string"}
+                },
+                "required": ["summary", "start_time", "end_time"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "check_email",
+            "description": "Check the user's email inbox",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    }
+]
+
+# Building the calendar client without a saved token starts an interactive sign-in
+CALENDAR_TOOLS = {'get_upcoming_events', 'create_calendar_event'}
+CALENDAR_NOT_CONNECTED = {"error": "The calendar is not connected"}
+
+def available_tools() -> List[Dict[str, Any]]:
+    """Tools offered to the model; calendar tools only once the calendar is signed in"""
+    if services.get('calendar').ready():
+        return TOOLS
+    return [tool for tool in TOOLS if tool['function']['name'] not in CALENDAR_TOOLS]
+
+def _get_weather(location: str, units: str = 'metric') -> Any:
+    return services.get('weather').get_weather(location, units) or {"error": "Weather data is unavailable"}
+
+def _get_upcoming_events(max_results: int = 5) -> Any:
+    calendar = services.get('calendar')
+    if not calendar.ready():
+        return CALENDAR_NOT_CONNECTED
+    return calendar.get().get_upcoming_events(max_results)
+
+def _create_calendar_event(summary: str, start_time: str, end_time: str, description: str = None) -> Any:
+    calendar = services.get('calendar')
+    if not calendar.ready():
+        return CALENDAR_NOT_CONNECTED
+    return calendar.get().create_event(
+        summary=summary,
+        start_time=datetime.datetime.fromisoformat(start_time),
+        end_time=datetime.datetime.fromisoformat(end_time),
+        description=description
+    )
+
+def _check_email() -> Any:
+    return "Email access is not connected yet."
+
+TOOL_HANDLERS: Dict[str, Callable[..., Any]] = {
+    'get_weather': _get_weather,
+    'get_upcoming_events': _get_upcoming_events,
+    'create_calendar_event': _create_calendar_event,
+    'check_email': _check_email
+}
+
+async def _get_weather_async(location: str, units: str = 'metric') -> Any:
+    return await services.get('weather').get_weather_async(location, units) or {"error": "Weather data is unavailable"}
+
+# Tools with a native async implementation; the rest run in a worker thread
+ASYNC_TOOL_HANDLERS: Dict[str, Callable[..., Awaitable[Any]]] = {
+    'get_weather': _get_weather_async
+}
+
+# Both model calls of a routed question share one deadline
+router_policy = UpstreamPolicy('router', openai_breaker)
+
+ROUTER_PATHS = ('direct', 'tool', 'error', 'shed')
+
+def record_route(path: str, model_calls: int, latency: float):
+    count('buddybot_router_questions_total', 'Routed questions by path', path=path)
+    count('buddybot_router_model_calls_total', 'Model calls made by the router by path', amount=model_calls, path=path)
+    metrics.histogram('buddybot_router_seconds', 'Routed question latency by path', path=path).observe(latency)
+
+def router_summary() -> Dict[str, Dict[str, Any]]:
+    """Per-path question counts, model calls per question and latency percentiles"""
+    summary = {}
+    for path in ROUTER_PATHS:
+        questions = metrics.counter('buddybot_router_questions_total', path=path).value
+        if not questions:
+            continue
+        latency = metrics.histogram('buddybot_router_seconds', path=path)
+        summary[path] = {
+            'questions': int(questions),
+            'model_calls_per_question': metrics.counter('buddybot_router_model_calls_total', path=path).value / questions,
+            'latency_p50': latency.quantile(0.5),
+            'latency_p95': latency.quantile(0.95)
+        }
+    return summary
+
+def _router_messages(text: str, history: Sequence[Dict[str, str]] = ()) -> List[Dict[str, Any]]:
+    now = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+    return [
+        {"role": "system", "content": f"{ROUTER_PROMPT} The current time is {now}."},
+        *history,
+        {"role": "user", "content": text}
+    ]
+
+def run_tool(name: str, arguments: str) -> str:
+    """Run a tool call locally and return its result as JSON for the model"""
+    handler = TOOL_HANDLERS.get(name)
+    if handler is None:
+        return json.dumps({"error": f"Unknown tool {name}"})
+    try:
+        result = handler(**json.loads(arguments or '{}'))
+    except Exception as e:
+        logger.error(f"Error running tool {name}: {str(e)}")
+        result = {"error": f"{name} failed"}
+    return json.dumps(result, default=str)
+
+async def run_tool_async(name: str, arguments: str) -> str:
+    """Async variant of run_tool"""
+    handler = ASYNC_TOOL_HANDLERS.get(name)
+    if handler is None:
+        return await asyncio.to_thread(run_tool, name, arguments)
+    try:
+        result = await handler(**json.loads(arguments or '{}'))
+    except Exception as e:
+        logger.error(f"Error running tool {name}: {str(e)}")
+        result = {"error": f"{name} failed"}
+    return json.dumps(result, default=str)
+
+def _arguments(arguments: str) -> Dict[str, Any]:
+    try:
+        parsed = json.loads(arguments or '{}')
+    except ValueError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+def _timed_out(name: str) -> str:
+    count('buddybot_tool_timeouts_total', 'Tool calls abandoned at the question deadline', tool=name)
+    return json.dumps({"error": f"{name} timed out"})
+
+def run_tools(calls: List[Dict[str, str]], prefetch: Prefetch, deadline: float) -> List[str]:
+    """
+    Run a model response's tool calls concurrently, reusing speculative fetches
+    A call still running at the question's deadline is reported to the model as timed out.
+    """
+    futures = [
+        prefetch.claim(call['name'], _arguments(call['arguments']))
+        or tool_executor.submit(run_tool, call['name'], call['arguments'])
+        for call in calls
+    ]
+    results = []
+    for call, future in zip(calls, futures):
+        try:
+            results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+        except concurrent.futures.TimeoutError:
+            results.append(_timed_out(call['name']))
+    return results
+
+async def _run_tool_until(name: str, pending: Awaitable[str], deadline: float) -> str:
+    try:
+        return await asyncio.wait_for(pending, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        return _timed_out(name)
+
+def stream_route_question(text: str, history: Sequence[Dict[str, str]] = ()) -> Iterator[str]:
+    """
+    Answer a question in one model round trip where possible
+    The model either answers directly or calls tools; tool calls run locally
+    and concurrently, and are followed by a single summarization call. Tool
+    calls hinted by the question's keywords start before the model decides.
+    The answer is streamed as the first sentence and then the rest.
+    history holds earlier conversation messages sent ahead of the question.
+    """
+    logger.info("Routing question: %s", text)
+    start = time.perf_counter()
+    state = {'path': 'direct', 'model_calls': 0}
+    deadline = router_policy.deadline()
+    model = model_router.choose('answer', text, history).model
+    # Likely tool calls start now and run while the model decides
+    prefetch = Prefetch(text, lambda tool, arguments: tool_executor.submit(run_tool, tool, json.dumps(arguments)))
+
+    def deltas() -> Iterator[str]:
+        try:
+            # The admission slot is held across both model calls and the tool calls
+            with admission.slot(deadline):
+                yield from routed_deltas()
+        except Exception as e:
+            state['path'] = 'shed' if isinstance(e, Overloaded) else 'error'
+            raise
+
+    def routed_deltas() -> Iterator[str]:
+        messages = _router_messages(text, history)
+        state['model_calls'] += 1
+        stream = router_policy.call(model_router.stream(model, 'answer', lambda timeout: services.get('openai').chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=available_tools(),
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+            timeout=timeout,
+            stream=True
+        ), prompt_tokens(messages)), deadline=deadline, hedge=False)
+        tool_calls: Dict[int, Dict[str, str]] = {}
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                yield delta.content
+            for call in delta.tool_calls or []:
+                entry = tool_calls.setdefault(call.index, {'id': '', 'name': '', 'arguments': ''})
+                if call.id:
+                    entry['id'] = call.id
+                if call.function and call.function.name:
+                    entry['name'] += call.function.name
+                if call.function and call.function.arguments:
+                    entry['arguments'] += call.function.arguments
+        if not tool_calls:
+            return
+
+        state['path'] = 'tool'
+        # Answers built from live tool results go stale
+        skip_cache()
+        calls = [tool_calls[index] for index in sorted(tool_calls)]
+        messages.append({
+            "role": "assistant",
+            "tool_calls": [
+                {"id": call['id'], "type": "function", "function": {"name": call['name'], "arguments": call['arguments']}}
+                for call in calls
+            ]
+        })
+        logger.info("Running tools %s for question: %s", [call['name'] for call in calls], text)
+        for call, result in zip(calls, run_tools(calls, prefetch, deadline)):
+            messages.append({"role": "tool", "tool_call_id": call['id'], "content": result})
+
+        state['model_calls'] += 1
+        summary = router_policy.call(model_router.stream(model, 'answer', lambda timeout: services.get('openai').chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+            timeout=timeout,
+            stream=True
+        ), prompt_tokens(messages)), deadline=deadline, hedge=False)
+        for chunk in summary:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    try:
+        yield from stream_sentences(deltas())
+    finally:
+        prefetch.close()
+        record_route(state['path'], state['model_calls'], time.perf_counter() - start)
+
+def route_question(text: str, history: Sequence[Dict[str, str]] = ()) -> str:
+    """Non-streaming variant of stream_route_question; an answer cut short falls back"""
+    try:
+        return ' '.join(stream_route_question(text, history))
+    except Exception as e:
+        return fallback_response(e)
+
+async def route_question_async(text: str, history: Sequence[Dict[str, str]] = ()) -> str:
+    """
+    Async variant of route_question on the event loop's shared client
+    The answer is returned whole; tool calls from one model response run
+    concurrently, and hinted ones start before the first model call.
+    """
+    logger.info("Routing question: %s", text)
+    start = time.perf_counter()
+    path, model_calls = 'direct', 0
+    deadline = router_policy.deadline()
+    model = model_router.choose('answer', text, history).model
+    async_client = async_clients.openai_client()
+    prefetch = Prefetch(text, lambda tool, arguments: asyncio.ensure_future(run_tool_async(tool, json.dumps(arguments))))
+    try:
+        async with admission.slot_async(deadline):
+            messages = _router_messages(text, history)
+            model_calls += 1
+            response = await router_policy.call_async(model_router.attempt_async(model, 'answer', lambda timeout: async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                tools=available_tools(),
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                timeout=timeout
+            )), deadline=deadline)
+            message = response.choices[0].message
+            if message.tool_calls:
+                path = 'tool'
+                skip_cache()
+                messages.append({
+                    "role": "assistant",
+                    "tool_calls": [
+                        {"id": call.id, "type": "function", "function": {"name": call.function.name, "arguments": call.function.arguments}}
+                        for call in message.tool_calls
+                    ]
+                })
+                results = await asyncio.gather(*(
+                    _run_tool_until(call.function.name, prefetch.claim(call.function.name, _arguments(call.function.arguments))
+                                    or run_tool_async(call.function.name, call.function.arguments), deadline)
+                    for call in message.tool_calls
+                ))
+                for call, result in zip(message.tool_calls, results):
+                    messages.append({"role": "tool", "tool_call_id": call.id, "content": result})
+
+                model_calls += 1
+                response = await router_policy.call_async(model_router.attempt_async(model, 'answer', lambda timeout: async_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=TEMPERATURE,
+                    max_tokens=MAX_TOKENS,
+                    timeout=timeout
+                )), deadline=deadline)
+                message = response.choices[0].message
+            return (message.content or '').strip() or FALLBACK_RESPONSE
+    except Exception as e:
+        path = 'shed' if isinstance(e, Overloaded) else 'error'
+        log_upstream_error('router', e)
+        return fallback_response(e)
+    finally:
+        prefetch.close()
+        record_route(path, model_calls, time.perf_counter() - start)
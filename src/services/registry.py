@@ -0,0 +1,132 @@
+"""
+Lazily constructed process-wide services
+
+Heavy clients (OpenAI, Google Calendar, OpenWeatherMap) are imported and
+built on first use instead of at module load, so importing the app, forking
+a worker or running a test only pays for what it touches. `warm_up()` builds
+them ahead of traffic, e.g. from a server's post-fork hook. Instances built
+before a fork are dropped in the child, which builds its own.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from src.config import OPENAI_API_KEY, OPENWEATHER_API_KEY
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Named factories whose results are built once, on first get()
+    Factories import their dependencies themselves and may get() other
+    services. override() swaps in a stand-in, for tests.
+    """
+
+    def __init__(self):
+        self.factories: Dict[str, Callable[[], Any]] = {}
+        self.instances: Dict[str, Any] = {}
+        self.init_seconds: Dict[str, float] = {}
+        self.lock = threading.RLock()
+
+    def factory(self, name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+        """Decorator registering a factory under name"""
+        def register(build: Callable[[], Any]) -> Callable[[], Any]:
+            self.factories[name] = build
+            return build
+        return register
+
+    def get(self, name: str) -> Any:
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        with self.lock:
+            instance = self.instances.get(name)
+            if instance is None:
+                if name not in self.factories:
+                    raise KeyError(f"Unknown service: {name}")
+                start = time.perf_counter()
+                instance = self.factories[name]()
+                self.init_seconds[name] = time.perf_counter() - start
+                self.instances[name] = instance
+                logger.info(f"Initialized {name} service in {self.init_seconds[name] * 1000:.0f}ms")
+            return instance
+
+    def peek(self, name: str) -> Optional[Any]:
+        """The service if it was already built, without building it"""
+        return self.instances.get(name)
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Build the named services (all by default), returning their init times"""
+        for name in list(self.factories) if names is None else names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Warming up {name} service failed: {str(e)}")
+        return dict(self.init_seconds)
+
+    @contextmanager
+    def override(self, name: str, instance: Any) -> Iterator[Any]:
+        with self.lock:
+            previous = self.instances.get(name)
+            self.instances[name] = instance
+        try:
+            yield instance
+        finally:
+            with self.lock:
+                if previous is None:
+                    self.instances.pop(name, None)
+                else:
+                    self.instances[name] = previous
+
+    def forget(self):
+        """Drop built instances; their threads and connections do not survive a fork"""
+        self.instances.clear()
+        self.init_seconds.clear()
+        self.lock = threading.RLock()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {'loaded': name in self.instances, 'init_seconds': self.init_seconds.get(name)}
+            for name in self.factories
+        }
+
+
+services = ServiceRegistry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=services.forget)
+
+
+@services.factory('openai')
+def _openai_client():
+    from openai import OpenAI
+    if os.getenv('HTTPS_PROXY'):
+        # Newer versions of openai read the proxy from OPENAI_PROXY
+        os.environ['OPENAI_PROXY'] = os.getenv('HTTPS_PROXY')
+    # Retries are left to the upstream policy
+    return OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+
+@services.factory('weather')
+def _weather_service():
+    from src.services.weather_service import WeatherService
+    return WeatherService(OPENWEATHER_API_KEY)
+
+
+@services.factory('calendar')
+def _calendar_clients():
+    from src.services.calendar_service import calendar_clients
+    return calendar_clients
+
+
+def collect_service_metrics():
+    for name, seconds in list(services.init_seconds.items()):
+        yield ('buddybot_service_init_seconds', 'gauge', 'Seconds taken to build each lazily loaded service',
+               {'service': name}, seconds)
+
+
+metrics.register_collector(collect_service_metrics)
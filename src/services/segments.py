@@ -0,0 +1,73 @@
+"""
+Incremental consumption of transcript segments.
+
+Devices resend overlapping segment lists: a payload repeats segments we
+have already seen, and a segment that is still being spoken comes back
+with a later `end` and a longer text. Each session keeps a watermark (the
+`end` of the last consumed segment) so repeats are skipped with a single
+comparison, and a segment that starts before the watermark only
+contributes the words that follow what was already consumed.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+# Tolerance for float timestamps that round-trip through JSON
+TIMESTAMP_EPSILON = 1e-3
+# Segments without timestamps are deduplicated by id against this many recent ids
+RECENT_SEGMENT_IDS = 32
+
+
+class SegmentBatch(NamedTuple):
+    texts: List[str]
+    new: int
+    merged: int
+    skipped: int
+
+
+def normalize_segment(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def unseen_suffix(previous: str, text: str) -> str:
+    """Return the words of text that follow the end of previous"""
+    if text.startswith(previous) and text[len(previous):len(previous) + 1] in ('', ' '):
+        return text[len(previous):].strip()
+    previous_words, words = previous.split(), text.split()
+    for size in range(min(len(previous_words), len(words)), 0, -1):
+        if previous_words[-size:] == words[:size]:
+            return ' '.join(words[size:])
+    return text
+
+
+def consume_segments(state, segments: Iterable[Dict[str, Any]]) -> SegmentBatch:
+    """Advance the session watermark over segments and return the unseen text"""
+    texts = []
+    new = merged = skipped = 0
+    for segment in segments:
+        end = segment.get('end')
+        if end is not None:
+            if end <= state.segment_watermark + TIMESTAMP_EPSILON:
+                skipped += 1
+                continue
+            full = normalize_segment(segment.get('text', ''))
+            start = segment.get('start', end)
+            if start < state.segment_watermark - TIMESTAMP_EPSILON and state.last_segment_text:
+                text = unseen_suffix(state.last_segment_text, full)
+                merged += 1
+            else:
+                text = full
+                new += 1
+            state.segment_watermark = end
+            state.last_segment_text = full
+        else:
+            segment_id = segment.get('id')
+            if segment_id is not None:
+                if segment_id in state.recent_segment_ids:
+                    skipped += 1
+                    continue
+                state.recent_segment_ids.append(segment_id)
+                del state.recent_segment_ids[:-RECENT_SEGMENT_IDS]
+            text = normalize_segment(segment.get('text', ''))
+            new += 1
+        if text:
+            texts.append(text)
+    return SegmentBatch(texts, new, merged, skipped)
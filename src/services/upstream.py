@@ -0,0 +1,351 @@
+"""
+Upstream call policy: deadlines, retries, hedged requests and circuit breaking
+
+Every OpenAI call goes through an UpstreamPolicy. A call gets an overall
+deadline; each attempt's timeout is whatever is left of it, so retries can
+never push a question past its budget. Once enough latencies are recorded,
+an attempt still running past the hedge percentile gets a second request,
+and the first to succeed wins. Streams are never hedged, since two streams
+cannot be merged; with STREAM_ANSWERS on, answers (direct or routed) are
+therefore not hedged and hedging covers the non-streaming calls: intent
+analysis and the ASGI answer paths. A CircuitBreaker shared by all OpenAI
+policies trips when the recent error rate is too high and rejects calls
+with CircuitOpenError until a probe succeeds, so callers fail fast to
+cached or fallback answers. Only retryable failures count against the
+breaker; errors such as bad requests say nothing about upstream health.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type
+
+from src.config import (
+    TIMEOUT, UPSTREAM_BUDGET, UPSTREAM_ATTEMPTS, UPSTREAM_BACKOFF, HEDGE_QUANTILE, HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES, HEDGE_WORKERS, BREAKER_ERROR_RATE, BREAKER_MIN_CALLS, BREAKER_WINDOW, BREAKER_COOLDOWN
+)
+from src.utils.metrics import metrics, count
+
+logger = logging.getLogger(__name__)
+
+
+def openai_retryable() -> Tuple[Type[BaseException], ...]:
+    """
+    Failures worth another attempt; anything else (bad request, auth) is raised at once
+    openai is imported here rather than at module load to keep importing the app cheap.
+    """
+    import openai
+    return openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError, TimeoutError
+
+
+# Second requests of hedged attempts run here; the first request of an attempt gets its own thread
+hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='hedge')
+
+
+class CircuitOpenError(Exception):
+    """The upstream's circuit breaker is open and the call was not attempted"""
+
+
+class UpstreamTimeout(TimeoutError):
+    """An attempt did not finish within the call's remaining budget"""
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over a sliding time window
+    Closed: calls pass and outcomes are recorded. Once at least min_calls
+    outcomes in the window fail at error_rate or more, the breaker opens and
+    rejects calls for cooldown seconds. It then lets a single probe through
+    (half-open); the probe's outcome closes or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, error_rate: float = BREAKER_ERROR_RATE, min_calls: int = BREAKER_MIN_CALLS,
+                 window: float = BREAKER_WINDOW, cooldown: float = BREAKER_COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.clock = clock
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.trips = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now"""
+        with self.lock:
+            now = self.clock()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.probe_started = None
+            if self.state == self.HALF_OPEN:
+                # One probe at a time; a probe that never reports back is replaced after a cooldown
+                if self.probe_started is not None and now - self.probe_started < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.probe_started = now
+            return True
+
+    @property
+    def is_open(self) -> bool:
+        with self.lock:
+            return self.state == self.OPEN and self.clock() - self.opened_at < self.cooldown
+
+    def record_neutral(self):
+        """An outcome that says nothing about upstream health; frees the half-open probe for another call"""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.probe_started = None
+
+    def record(self, ok: bool):
+        with self.lock:
+            now = self.clock()
+            if self.state == self.HALF_OPEN:
+                if ok:
+                    self.state = self.CLOSED
+                    logger.info(f"Circuit {self.name} closed")
+                else:
+                    self._trip(now)
+                return
+            self.outcomes.append((now, not ok))
+            self.failures += not ok
+            while self.outcomes and self.outcomes[0][0] < now - self.window:
+                self.failures -= self.outcomes.popleft()[1]
+            if (self.state == self.CLOSED and len(self.outcomes) >= self.min_calls
+                    and self.failures / len(self.outcomes) >= self.error_rate):
+                self._trip(now)
+
+    def _trip(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self.outcomes.clear()
+        self.failures = 0
+        logger.warning(f"Circuit {self.name} opened for {self.cooldown:.0f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            calls = len(self.outcomes)
+            return {
+                'state': self.state,
+                'error_rate': self.failures / calls if calls else 0.0,
+                'calls': calls,
+                'trips': self.trips,
+                'rejected': self.rejected
+            }
+
+
+class UpstreamPolicy:
+    """
+    Deadline, retry and hedging policy for one kind of upstream call
+    `func(timeout)` performs a single attempt with the given timeout in
+    seconds. Retryable failures are retried with jittered exponential
+    backoff while the deadline allows; other exceptions propagate at once.
+    """
+
+    def __init__(self, name: str, breaker: CircuitBreaker, budget: float = UPSTREAM_BUDGET,
+                 attempts: int = UPSTREAM_ATTEMPTS, backoff: float = UPSTREAM_BACKOFF,
+                 attempt_timeout: float = TIMEOUT, hedge_quantile: float = HEDGE_QUANTILE,
+                 hedge_min_delay: float = HEDGE_MIN_DELAY, hedge_min_samples: int = HEDGE_MIN_SAMPLES,
+                 retryable: Optional[Tuple[Type[BaseException], ...]] = None):
+        self.name = name
+        self.breaker = breaker
+        self.budget = budget
+        self.attempts = attempts
+        self.backoff = backoff
+        self.attempt_timeout = attempt_timeout
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self._retryable = retryable
+        self.latency = metrics.histogram('buddybot_upstream_seconds', 'Successful upstream attempt latency', call=name)
+
+    @property
+    def retryable(self) -> Tuple[Type[BaseException], ...]:
+        """Retryable exception types, the OpenAI ones unless given"""
+        if self._retryable is None:
+            self._retryable = openai_retryable()
+        return self._retryable
+
+    def deadline(self) -> float:
+        """A fresh overall deadline for a call made now"""
+        return time.monotonic() + self.budget
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a second request is sent, or None before enough samples exist"""
+        if self.latency.count < max(1, self.hedge_min_samples):
+            return None
+        return max(self.hedge_min_delay, self.latency.quantile(self.hedge_quantile))
+
+    def call(self, func: Callable[[float], Any], deadline: Optional[float] = None, hedge: bool = True) -> Any:
+        """Run func under this policy; hedge=False for calls that must not be duplicated (streams)"""
+        deadline = deadline if deadline is not None else self.deadline()
+        for attempt in range(self.attempts):
+            self._admit(deadline)
+            start = time.perf_counter()
+            try:
+                result = self._attempt(func, deadline, hedge)
+            except self.retryable as e:
+                self.breaker.record(False)
+                if not self._backoff(attempt, deadline, e):
+                    raise
+                continue
+            except Exception:
+                self.breaker.record_neutral()
+                raise
+            self._succeeded(start)
+            return result
+
+    async def call_async(self, func: Callable[[float], Awaitable[Any]], deadline: Optional[float] = None,
+                         hedge: bool = True) -> Any:
+        """Async variant of call"""
+        deadline = deadline if deadline is not None else self.deadline()
+        for attempt in range(self.attempts):
+            self._admit(deadline)
+            start = time.perf_counter()
+            try:
+                result = await self._attempt_async(func, deadline, hedge)
+            except self.retryable as e:
+                self.breaker.record(False)
+                delay = self._retry_delay(attempt, deadline, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                self.breaker.record_neutral()
+                raise
+            self._succeeded(start)
+            return result
+
+    def _admit(self, deadline: float):
+        if deadline - time.monotonic() <= 0:
+            raise UpstreamTimeout(f"{self.name} call ran out of budget")
+        if not self.breaker.allow():
+            count('buddybot_circuit_rejections_total', 'Calls failed fast by an open circuit', call=self.name)
+            raise CircuitOpenError(f"{self.breaker.name} circuit is open")
+
+    def _succeeded(self, start: float):
+        self.breaker.record(True)
+        self.latency.observe(time.perf_counter() - start)
+
+    def _retry_delay(self, attempt: int, deadline: float, error: BaseException) -> Optional[float]:
+        """Backoff before the next attempt, or None if there is no attempt or budget left"""
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+        if attempt + 1 >= self.attempts or time.monotonic() + delay >= deadline:
+            return None
+        count('buddybot_retries_total', 'Retried upstream calls', call=self.name)
+        logger.warning(f"Retrying {self.name} call after {type(error).__name__}: {str(error)}")
+        return delay
+
+    def _backoff(self, attempt: int, deadline: float, error: BaseException) -> bool:
+        delay = self._retry_delay(attempt, deadline, error)
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _timeout(self, deadline: float) -> float:
+        return max(0.0, min(self.attempt_timeout, deadline - time.monotonic()))
+
+    def _run(self, future: Future, func: Callable[[float], Any], deadline: float):
+        """Run one request into future; its timeout is taken when it starts, not when it was queued"""
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            if deadline - time.monotonic() <= 0:
+                raise UpstreamTimeout(f"{self.name} call ran out of budget before it started")
+            future.set_result(func(self._timeout(deadline)))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _attempt(self, func: Callable[[float], Any], deadline: float, hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None or delay >= deadline - time.monotonic():
+            return func(self._timeout(deadline))
+
+        # The first request never queues behind other calls' hedges; only the second uses the pool
+        first = Future()
+        threading.Thread(target=self._run, args=(first, func, deadline), name=f"{self.name}-attempt", daemon=True).start()
+        futures = [first]
+        done, _ = wait(futures, timeout=delay)
+        if not done and self.breaker.allow():
+            count('buddybot_hedged_requests_total', 'Second requests sent for slow upstream calls', call=self.name)
+            second = Future()
+            hedge_executor.submit(self._run, second, func, deadline)
+            futures.append(second)
+        error: Optional[BaseException] = None
+        while futures:
+            done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise UpstreamTimeout(f"{self.name} call timed out")
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _attempt_async(self, func: Callable[[float], Awaitable[Any]], deadline: float, hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None or delay >= deadline - time.monotonic():
+            try:
+                return await asyncio.wait_for(func(self._timeout(deadline)), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError as e:
+                raise UpstreamTimeout(f"{self.name} call timed out") from e
+
+        tasks = {asyncio.ensure_future(func(self._timeout(deadline)))}
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and self.breaker.allow():
+            count('buddybot_hedged_requests_total', 'Second requests sent for slow upstream calls', call=self.name)
+            tasks.add(asyncio.ensure_future(func(self._timeout(deadline))))
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise UpstreamTimeout(f"{self.name} call timed out")
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+openai_breaker = CircuitBreaker('openai')
+BREAKERS = [openai_breaker]
+
+
+def breaker_summary() -> Dict[str, Dict[str, Any]]:
+    return {breaker.name: breaker.snapshot() for breaker in BREAKERS}
+
+
+def collect_breaker_metrics():
+    for breaker in BREAKERS:
+        snapshot = breaker.snapshot()
+        labels = {'upstream': breaker.name}
+        yield ('buddybot_circuit_state', 'gauge', 'Circuit state (0 closed, 1 half-open, 2 open)', labels,
+               CircuitBreaker.STATE_VALUES[snapshot['state']])
+        yield ('buddybot_circuit_trips_total', 'counter', 'Times the circuit opened', labels, snapshot['trips'])
+
+
+metrics.register_collector(collect_breaker_metrics)
@@ -0,0 +1,89 @@
+import re
+from typing import Iterable, NamedTuple, Optional
+
+_END = ''
+
+
+class WakeWordMatch(NamedTuple):
+    trigger: str
+    offset: int
+    question: str
+
+
+def _normalize(phrase: str) -> str:
+    return ' '.join(phrase.lower().split())
+
+
+def _build_trie(phrases: Iterable[str]) -> dict:
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[_END] = {}
+    return trie
+
+
+def _trie_regex(node: dict) -> str:
+    """Render a character trie as a regex so shared prefixes are matched once"""
+    branches = []
+    for char in sorted(key for key in node if key != _END):
+        atom = r'\s+' if char == ' ' else re.escape(char)
+        branches.append(atom + _trie_regex(node[char]))
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if _END in node:
+        body = '(?:' + body + ')?'
+    return body
+
+
+def compile_phrases(phrases: Iterable[str]) -> str:
+    """
+    Compile a list of phrases into a single alternation pattern
+    The alternation is factored into a prefix trie, so the cost of scanning a
+    segment depends on the text length rather than on the number of phrases.
+    Any run of whitespace in the text matches a single space in a phrase.
+    """
+    normalized = {_normalize(phrase) for phrase in phrases}
+    normalized.discard('')
+    if not normalized:
+        return r'(?!)'
+    return r'(?<!\w)' + _trie_regex(_build_trie(normalized)) + r'(?!\w)'
+
+
+def _trailing_question(text: str, end: int) -> str:
+    return text[end:].lstrip(' ,.!:;-').strip()
+
+
+class WakeWordEngine:
+    """Matches wake words, aliases and split triggers in a single regex pass"""
+
+    def __init__(self, triggers: Iterable[str], partial_first: Iterable[str] = (),
+                 partial_second: Iterable[str] = ()):
+        self.trigger_re = re.compile(compile_phrases(triggers))
+        self.partial_first_re = re.compile(compile_phrases(partial_first) + r'\W*$')
+        self.partial_second_re = re.compile(compile_phrases(partial_second))
+
+    def match(self, text: str) -> Optional[WakeWordMatch]:
+        """
+        Find the last complete trigger in a segment
+        Returns the matched trigger, its offset and the question text after it
+        """
+        last = None
+        for last in self.trigger_re.finditer(text):
+            pass
+        if last is None:
+            return None
+        return WakeWordMatch(_normalize(last.group()), last.start(), _trailing_question(text, last.end()))
+
+    def ends_with_partial(self, text: str) -> bool:
+        """Check whether a segment ends with the first half of a trigger"""
+        return self.partial_first_re.search(text) is not None
+
+    def match_partial(self, text: str) -> Optional[WakeWordMatch]:
+        """Find the second half of a trigger that was split across segments"""
+        found = self.partial_second_re.search(text)
+        if found is None:
+            return None
+        return WakeWordMatch(_normalize(found.group()), found.start(), _trailing_question(text, found.end()))
@@ -1,15 +1,108 @@
+import asyncio
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Any
+import httpx
+import numpy as np
 import requests
-from typing import Optional, Dict, Any
-from src.config import OPENWEATHER_API_KEY
+from requests.adapters import HTTPAdapter
+from src.config import (
+    OPENWEATHER_API_KEY, OPENWEATHER_BASE_URL, WEATHER_CACHE_TTL, WEATHER_STALE_TTL,
+    WEATHER_SOFT_TIMEOUT, WEATHER_POOL_SIZE, WEATHER_BATCH_WORKERS, WEATHER_BATCH_CACHE_ENTRIES
+)
+from src.utils.cache import AsyncSingleFlight, TTLCache
+from src.utils.metrics import stage_timer, count
+from src.utils import async_clients
 
 logger = logging.getLogger(__name__)
 
+SECONDS_PER_DAY = 86400
+
+# Raised while decoding or parsing a response body that is not what the API documents
+MALFORMED_BODY_ERRORS = (ValueError, KeyError, IndexError, TypeError)
+
+
+def daily_rollups(series: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Daily temperature min/max/mean for many locations in one vectorized pass
+    Every location's forecast columns are concatenated into one array and
+    tagged with a (location, local day) group; a stable sort makes the
+    groups contiguous and numpy reduceat computes all rollups at once.
+    Locations whose forecast is unavailable map to None.
+    """
+    available = [(location, data) for location, data in series.items() if data is not None and len(data['dt'])]
+    results: Dict[str, Optional[Dict[str, Any]]] = {location: None for location in series}
+    if not available:
+        return results
+
+    lengths = np.array([len(data['dt']) for _, data in available])
+    owner = np.repeat(np.arange(len(available)), lengths)
+    offsets = np.repeat(np.array([data['timezone'] for _, data in available], dtype=np.int64), lengths)
+    days = (np.concatenate([data['dt'] for _, data in available]) + offsets) // SECONDS_PER_DAY
+    temps = np.concatenate([data['temp'] for _, data in available])
+
+    # One group per (location, local day); forecasts span a few days, so day - min fits in 16 bits
+    groups = owner.astype(np.int64) << 16 | (days - days.min())
+    order = np.argsort(groups, kind='stable')
+    groups, days, temps = groups[order], days[order], temps[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    minimum = np.minimum.reduceat(temps, starts)
+    maximum = np.maximum.reduceat(temps, starts)
+    mean = np.add.reduceat(temps.astype(np.float64), starts) / np.diff(np.r_[starts, len(temps)])
+    group_owner = (groups[starts] >> 16).tolist()
+    dates = np.datetime_as_string((days[starts] * SECONDS_PER_DAY).astype('datetime64[s]'), unit='D').tolist()
+
+    bounds = np.searchsorted(group_owner, np.arange(len(available) + 1)).tolist()
+    minimum, maximum, mean = (np.round(column.astype(np.float64), 1).tolist() for column in (minimum, maximum, mean))
+    for index, (location, data) in enumerate(available):
+        first, last = bounds[index], bounds[index + 1]
+        results[location] = {
+            'location': data['location'],
+            'country': data['country'],
+            'dates': dates[first:last],
+            'min': minimum[first:last],
+            'max': maximum[first:last],
+            'mean': mean[first:last]
+        }
+    return results
+
+
 class WeatherService:
-    BASE_URL = "http://api.openweathermap.org/data/2.5"
+    """
+    OpenWeatherMap client with a pooled session and a TTL cache
+    Results are cached per (location, units, endpoint). Concurrent requests
+    for the same key share one upstream call. Once an entry expires it is
+    still served while a refresh runs if the upstream does not answer within
+    soft_timeout seconds. The *_async methods share the cache and fetch on
+    the event loop's pooled client. Bulk daily forecasts use a separate
+    cache and at most batch_workers concurrent fetches.
+    """
+    BASE_URL = OPENWEATHER_BASE_URL
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 cache_ttl: float = WEATHER_CACHE_TTL, stale_ttl: float = WEATHER_STALE_TTL,
+                 soft_timeout: float = WEATHER_SOFT_TIMEOUT, pool_size: int = WEATHER_POOL_SIZE,
+                 timeout: float = 10, batch_workers: int = WEATHER_BATCH_WORKERS,
+                 batch_cache_entries: int = WEATHER_BATCH_CACHE_ENTRIES):
         self.api_key = api_key
+        self.base_url = base_url or self.BASE_URL
+        self.soft_timeout = soft_timeout
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cache = TTLCache(cache_ttl, max_entries=4096, stale_ttl=stale_ttl)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='weather')
+        self.batch_workers = batch_workers
+        self.batch_cache = TTLCache(cache_ttl, max_entries=batch_cache_entries, stale_ttl=stale_ttl)
+        self.batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix='weather-batch')
+        self.inflight: Dict[Hashable, Future] = {}
+        self.async_flights = AsyncSingleFlight()
+        self.lock = threading.Lock()
+        self.upstream_calls = 0
+        self.stale_served = 0
     
     def get_weather(self, location: str, units: str = 'metric') -> Optional[Dict[str, Any]]:
         """
@@ -18,69 +111,237 @@ class WeatherService:
             location: City name or coordinates
             units: metric (Celsius) or imperial (Fahrenheit)
         """
+        return self._cached('weather', location, units, self._parse_weather)
+    
+    def get_forecast(self, location: str, units: str = 'metric') -> Optional[Dict[str, Any]]:
+        """Get 5-day weather forecast for a location"""
+        return self._cached('forecast', location, units, self._parse_forecast)
+
+    def get_daily_forecasts(self, locations: Iterable[str], units: str = 'metric') -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Daily min/max/mean temperatures for many locations
+        Forecasts missing from the batch cache are fetched by the batch
+        workers on the pooled session; an expired entry is served if its
+        refresh fails.
+        Returns {location: {'location', 'country', 'dates', 'min', 'max',
+        'mean'} or None}, with one list entry per local day.
+        """
+        series: Dict[str, Optional[Dict[str, Any]]] = {}
+        refreshes = {}
+        for location in dict.fromkeys(locations):
+            key = self._key('forecast', location, units, view='series')
+            cached = self.batch_cache.get_stale(key)
+            if cached is not None and cached[1]:
+                series[location] = cached[0]
+            else:
+                refresh = self._refresh(key, self._parse_forecast_series, self.batch_executor, self.batch_cache)
+                refreshes[location] = (refresh, cached)
+        for location, (refresh, cached) in refreshes.items():
+            result = refresh.result()
+            series[location] = result if result is not None or cached is None else cached[0]
+        return daily_rollups(series)
+
+    async def get_daily_forecasts_async(self, locations: Iterable[str],
+                                        units: str = 'metric') -> Dict[str, Optional[Dict[str, Any]]]:
+        """Async variant of get_daily_forecasts on the event loop's pooled client"""
+        locations = list(dict.fromkeys(locations))
+        limit = asyncio.Semaphore(self.batch_workers)
+
+        async def fetch(location: str) -> Optional[Dict[str, Any]]:
+            async with limit:
+                return await self._cached_async('forecast', location, units, self._parse_forecast_series,
+                                                view='series', cache=self.batch_cache)
+
+        fetched = await asyncio.gather(*(fetch(location) for location in locations))
+        return daily_rollups(dict(zip(locations, fetched)))
+
+    async def get_weather_async(self, location: str, units: str = 'metric') -> Optional[Dict[str, Any]]:
+        """Async variant of get_weather"""
+        return await self._cached_async('weather', location, units, self._parse_weather)
+
+    async def get_forecast_async(self, location: str, units: str = 'metric') -> Optional[Dict[str, Any]]:
+        """Async variant of get_forecast"""
+        return await self._cached_async('forecast', location, units, self._parse_forecast)
+
+    @staticmethod
+    def _key(endpoint: str, location: str, units: str, view: str = 'summary') -> Hashable:
+        """Cache key; view tells apart different parses of the same endpoint"""
+        return (' '.join(location.lower().split()), units, endpoint, view)
+
+    def _cached(self, endpoint: str, location: str, units: str,
+                parse: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        key = self._key(endpoint, location, units)
+        cached = self.cache.get_stale(key)
+        if cached is not None and cached[1]:
+            return cached[0]
+        
+        refresh = self._refresh(key, parse)
+        if cached is None:
+            return refresh.result()
+        
+        # Stale entry: prefer a fresh answer, but don't wait on a slow upstream
+        try:
+            result = refresh.result(timeout=self.soft_timeout)
+        except FutureTimeoutError:
+            result = None
+        if result is None:
+            with self.lock:
+                self.stale_served += 1
+            return cached[0]
+        return result
+
+    async def _cached_async(self, endpoint: str, location: str, units: str,
+                            parse: Callable[[Dict[str, Any]], Dict[str, Any]],
+                            view: str = 'summary', cache: Optional[TTLCache] = None) -> Optional[Dict[str, Any]]:
+        cache = self.cache if cache is None else cache
+        key = self._key(endpoint, location, units, view)
+        cached = cache.get_stale(key)
+        if cached is not None and cached[1]:
+            return cached[0]
+
+        refresh, _ = self.async_flights.task(key, lambda: self._fetch_async(key, parse, cache))
+        if cached is None:
+            return await asyncio.shield(refresh)
+
         try:
+            result = await asyncio.wait_for(asyncio.shield(refresh), self.soft_timeout)
+        except asyncio.TimeoutError:
+            result = None
+        if result is None:
+            with self.lock:
+                self.stale_served += 1
+            return cached[0]
+        return result
+
+    def _refresh(self, key: Hashable, parse: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 executor: Optional[ThreadPoolExecutor] = None, cache: Optional[TTLCache] = None) -> Future:
+        """Start a fetch for key unless one is already running; the result goes to cache"""
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is None:
+                cache = self.cache if cache is None else cache
+                future = (executor or self.executor).submit(self._fetch, key, parse, cache)
+                self.inflight[key] = future
+                future.add_done_callback(lambda done: self._finish(key, done))
+            return future
+
+    def _finish(self, key: Hashable, future: Future):
+        with self.lock:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+
+    def _fetch(self, key: Hashable, parse: Callable[[Dict[str, Any]], Dict[str, Any]],
+               cache: TTLCache) -> Optional[Dict[str, Any]]:
+        location, units, endpoint, _ = key
+        try:
+            with self.lock:
+                self.upstream_calls += 1
             params = {
                 'q': location,
                 'appid': self.api_key,
                 'units': units
             }
             
-            response = requests.get(
-                f"{self.BASE_URL}/weather",
-                params=params,
-                timeout=10
-            )
+            with stage_timer('weather_fetch').time():
+                response = self.session.get(
+                    f"{self.base_url}/{endpoint}",
+                    params=params,
+                    timeout=self.timeout
+                )
             response.raise_for_status()
             
-            data = response.json()
-            return {
-                'temperature': data['main']['temp'],
-                'feels_like': data['main']['feels_like'],
-                'humidity': data['main']['humidity'],
-                'description': data['weather'][0]['description'],
-                'wind_speed': data['wind']['speed'],
-                'location': data['name'],
-                'country': data['sys']['country']
-            }
+            result = parse(response.json())
+            cache.set(key, result)
+            return result
             
         except requests.RequestException as e:
-            logger.error(f"Error fetching weather data: {str(e)}")
+            if isinstance(e, requests.Timeout):
+                count('buddybot_timeouts_total', 'Upstream calls that timed out', call='weather')
+            logger.error(f"Error fetching {endpoint} data: {str(e)}")
             return None
-    
-    def get_forecast(self, location: str, units: str = 'metric') -> Optional[Dict[str, Any]]:
-        """Get 5-day weather forecast for a location"""
+        except MALFORMED_BODY_ERRORS as e:
+            logger.error(f"Malformed {endpoint} data: {str(e)}")
+            return None
+
+    async def _fetch_async(self, key: Hashable, parse: Callable[[Dict[str, Any]], Dict[str, Any]],
+                           cache: TTLCache) -> Optional[Dict[str, Any]]:
+        location, units, endpoint, _ = key
         try:
+            with self.lock:
+                self.upstream_calls += 1
             params = {
                 'q': location,
                 'appid': self.api_key,
                 'units': units
             }
-            
-            response = requests.get(
-                f"{self.BASE_URL}/forecast",
-                params=params,
-                timeout=10
-            )
+
+            with stage_timer('weather_fetch').time():
+                response = await async_clients.http_client().get(
+                    f"{self.base_url}/{endpoint}",
+                    params=params,
+                    timeout=self.timeout
+                )
             response.raise_for_status()
-            
-            data = response.json()
-            forecast_list = []
-            
-            # Group forecasts by day
-            for item in data['list']:
-                forecast_list.append({
-                    'datetime': item['dt_txt'],
-                    'temperature': item['main']['temp'],
-                    'description': item['weather'][0]['description'],
-                    'humidity': item['main']['humidity']
-                })
-            
-            return {
-                'location': data['city']['name'],
-                'country': data['city']['country'],
-                'forecast': forecast_list[:5]  # Return next 5 forecasts
-            }
-            
-        except requests.RequestException as e:
-            logger.error(f"Error fetching forecast data: {str(e)}")
-            return None 
\ No newline at end of file
+
+            result = parse(response.json())
+            cache.set(key, result)
+            return result
+
+        except httpx.HTTPError as e:
+            if isinstance(e, httpx.TimeoutException):
+                count('buddybot_timeouts_total', 'Upstream calls that timed out', call='weather')
+            logger.error(f"Error fetching {endpoint} data: {str(e)}")
+            return None
+        except MALFORMED_BODY_ERRORS as e:
+            logger.error(f"Malformed {endpoint} data: {str(e)}")
+            return None
+
+    @staticmethod
+    def _parse_weather(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'temperature': data['main']['temp'],
+            'feels_like': data['main']['feels_like'],
+            'humidity': data['main']['humidity'],
+            'description': data['weather'][0]['description'],
+            'wind_speed': data['wind']['speed'],
+            'location': data['name'],
+            'country': data['sys']['country']
+        }
+
+    @staticmethod
+    def _parse_forecast(data: Dict[str, Any]) -> Dict[str, Any]:
+        forecast_list = []
+        
+        # Group forecasts by day
+        for item in data['list']:
+            forecast_list.append({
+                'datetime': item['dt_txt'],
+                'temperature': item['main']['temp'],
+                'description': item['weather'][0]['description'],
+                'humidity': item['main']['humidity']
+            })
+        
+        return {
+            'location': data['city']['name'],
+            'country': data['city']['country'],
+            'forecast': forecast_list[:5]  # Return next 5 forecasts
+        }
+
+    @staticmethod
+    def _parse_forecast_series(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep the whole forecast as compact columns for daily rollups"""
+        entries: List[Dict[str, Any]] = data['list']
+        return {
+            'location': data['city']['name'],
+            'country': data['city']['country'],
+            'timezone': data['city'].get('timezone', 0),
+            'dt': np.fromiter((item['dt'] for item in entries), dtype=np.int64, count=len(entries)),
+            'temp': np.fromiter((item['main']['temp'] for item in entries), dtype=np.float32, count=len(entries))
+        }
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.cache.stats()
+        stats['upstream_calls'] = self.upstream_calls
+        stats['stale_served'] = self.stale_served
+        stats['batch_entries'] = self.batch_cache.stats()['entries']
+        return stats
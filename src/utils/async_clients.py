@@ -0,0 +1,52 @@
+"""
+Shared async HTTP clients for the ASGI serving mode
+
+httpx clients are bound to the event loop that first uses them, so one
+pooled client (and one AsyncOpenAI wrapping it) is kept per running loop.
+Calls pass their own timeouts; the client default only bounds connects.
+"""
+import asyncio
+import weakref
+from typing import TYPE_CHECKING, Any, Dict
+
+import httpx
+from src.config import (
+    OPENAI_API_KEY, TIMEOUT, ASYNC_MAX_CONNECTIONS, ASYNC_MAX_KEEPALIVE, ASYNC_CONNECT_TIMEOUT
+)
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]' = weakref.WeakKeyDictionary()
+
+
+def _loop_clients() -> Dict[str, Any]:
+    return _clients.setdefault(asyncio.get_running_loop(), {})
+
+
+def http_client() -> httpx.AsyncClient:
+    """Pooled client for plain HTTP calls (weather, answer callbacks)"""
+    clients = _loop_clients()
+    if 'http' not in clients:
+        clients['http'] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_KEEPALIVE),
+            timeout=httpx.Timeout(TIMEOUT, connect=ASYNC_CONNECT_TIMEOUT)
+        )
+    return clients['http']
+
+
+def openai_client() -> 'AsyncOpenAI':
+    """AsyncOpenAI client sharing this loop's connection pool"""
+    clients = _loop_clients()
+    if 'openai' not in clients:
+        from openai import AsyncOpenAI
+        # Retries are left to the upstream policy
+        clients['openai'] = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client(), max_retries=0)
+    return clients['openai']
+
+
+async def close_clients():
+    """Close the clients of the running loop (on ASGI shutdown)"""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    if 'http' in clients:
+        await clients['http'].aclose()
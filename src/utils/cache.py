@@ -0,0 +1,196 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    expires_at: float
+    size: int
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and a bounded footprint
+    Entries are evicted least recently used first once either the entry
+    count or the approximate byte size goes over its limit. With a stale_ttl,
+    expired entries are kept that much longer so `get_stale` can serve them
+    while a refresh is in flight.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = sys.getsizeof, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh value, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.expires_at <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        """Return (value, is_fresh) for an entry that is fresh or within its stale window"""
+        current_time = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.expires_at + self.stale_ttl <= current_time:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.value, entry.expires_at > current_time
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        size = self.sizeof(key) + self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = CacheEntry(value, time.time() + (self.ttl if ttl is None else ttl), size)
+            self.size += size
+            while self.entries and (
+                len(self.entries) > self.max_entries or
+                (self.max_bytes is not None and self.size > self.max_bytes)
+            ):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key: Hashable):
+        self.size -= self.entries.pop(key).size
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self.calls: Dict[Hashable, _Call] = {}
+        self.lock = threading.Lock()
+        self.shared = 0
+
+    def begin(self, key: Hashable) -> Tuple[_Call, bool]:
+        """Join or start the call for key, returning it and whether this caller leads"""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.shared += 1
+                return call, False
+            call = self.calls[key] = _Call()
+            return call, True
+
+    def wait(self, call: _Call) -> Any:
+        """Wait for a call led by another caller and return its result"""
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def finish(self, key: Hashable, call: _Call, result: Any = None, error: Optional[BaseException] = None):
+        """Publish the leader's result or error to every waiting caller"""
+        call.result = result
+        call.error = error
+        with self.lock:
+            del self.calls[key]
+        call.event.set()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run func once per key at a time
+        Returns the result and whether it was shared from another caller's run.
+        """
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call), True
+        try:
+            result = func()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result, False
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight
+    The shared call runs as a task, so a caller that is cancelled or times
+    out does not cancel it for the others. Calls are only shared within the
+    event loop that started them.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    def task(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[asyncio.Task, bool]:
+        """Join or start the task for key, returning it and whether this caller leads"""
+        task = self.calls.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.shared += 1
+            return task, False
+        task = self.calls[key] = asyncio.ensure_future(func())
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return task, True
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Await func once per key at a time, returning the result and whether it was shared"""
+        task, leader = self.task(key, func)
+        return await asyncio.shield(task), not leader
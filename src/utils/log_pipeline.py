@@ -0,0 +1,191 @@
+"""
+Logging off the request path
+
+Log calls only stamp a record with the current session id and put it on a
+bounded queue; a background listener thread formats and writes it, one
+JSON object per line. Messages take lazy %-style arguments, so records
+below the configured level are never formatted. Request payloads go through
+`log_payload`, which logs only a sample of them, truncated when written.
+When the queue is full, records are dropped and counted instead of blocking
+the caller.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, TextIO
+
+from src.config import LOG_LEVEL, LOG_FORMAT, LOG_ASYNC, LOG_QUEUE_SIZE, LOG_PAYLOAD_SAMPLE_RATE, LOG_PAYLOAD_MAX_CHARS
+from src.utils.metrics import count
+
+_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('log_session_id', default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+@contextmanager
+def log_session(session_id: Optional[str]) -> Iterator[None]:
+    """Tag records logged inside the block (on this thread or task) with session_id"""
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, level: int = logging.INFO,
+                sample_rate: Optional[float] = None):
+    """Log message with payload attached, for a sample_rate share of calls (LOG_PAYLOAD_SAMPLE_RATE by default)"""
+    rate = LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or not logger.isEnabledFor(level):
+        return
+    if rate < 1 and random.random() >= rate:
+        return
+    logger.log(level, message, extra={'payload': payload})
+
+
+def _truncate(payload: Any, max_chars: int) -> str:
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str, separators=(',', ':'))
+    return text if len(text) <= max_chars else text[:max_chars] + '...'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, session_id and payload when set"""
+
+    def __init__(self, max_payload_chars: int = LOG_PAYLOAD_MAX_CHARS):
+        super().__init__()
+        self.max_payload_chars = max_payload_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        session_id = getattr(record, 'session_id', None)
+        if session_id is not None:
+            entry['session_id'] = session_id
+        payload = getattr(record, 'payload', None)
+        if payload is not None:
+            entry['payload'] = _truncate(payload, self.max_payload_chars)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """logging's basic "LEVEL:logger:message" lines, with the session id and payload appended"""
+
+    def __init__(self, max_payload_chars: int = LOG_PAYLOAD_MAX_CHARS):
+        super().__init__(logging.BASIC_FORMAT)
+        self.max_payload_chars = max_payload_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        session_id = getattr(record, 'session_id', None)
+        if session_id is not None:
+            line += f" session_id={session_id}"
+        payload = getattr(record, 'payload', None)
+        if payload is not None:
+            line += f" payload={_truncate(payload, self.max_payload_chars)}"
+        return line
+
+
+class _SessionFilter(logging.Filter):
+    """Stamps records with the session id while still on the logging thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'session_id', None) is None:
+            record.session_id = _session_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener unformatted
+    The stock QueueHandler formats every record on the caller's thread;
+    here only the traceback is rendered up front, since exc_info cannot be
+    formatted once the exception is gone.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            count('buddybot_log_dropped_total', 'Log records dropped because the log queue was full')
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, background: bool = LOG_ASYNC,
+                      queue_size: int = LOG_QUEUE_SIZE, max_payload_chars: int = LOG_PAYLOAD_MAX_CHARS,
+                      stream: Optional[TextIO] = None) -> logging.Handler:
+    """
+    Route the root logger through the pipeline, replacing an earlier setup
+    With background=False records are formatted and written on the calling
+    thread, as logging does by default. Returns the handler attached to root.
+    """
+    global _listener, _handler
+    stop_logging()
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter(max_payload_chars) if fmt == 'json' else TextFormatter(max_payload_chars))
+    if background:
+        records: queue.Queue = queue.Queue(queue_size)
+        _handler = _QueueHandler(records)
+        _listener = logging.handlers.QueueListener(records, writer)
+        _listener.start()
+    else:
+        _handler = writer
+    _handler.addFilter(_SessionFilter())
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+    return _handler
+
+
+def stop_logging():
+    """Write out queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork():
+    """
+    Start a writer in a forked child
+    The child inherits the listener but not its thread, so records would
+    pile up in a queue nobody drains. The child gets a fresh queue, since
+    the inherited one may hold the parent's records or a lock taken
+    mid-fork.
+    """
+    global _listener
+    if _listener is None:
+        return
+    records: queue.Queue = queue.Queue(_handler.queue.maxsize)
+    _handler.queue = records
+    _listener = logging.handlers.QueueListener(records, *_listener.handlers)
+    _listener.start()
+
+
+atexit.register(stop_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
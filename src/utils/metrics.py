@@ -0,0 +1,222 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from sub-millisecond parsing to minute-long LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, str, str, Dict[str, str], float]  # name, type, help, labels, value
+
+
+class _Shard:
+    __slots__ = ('thread', 'counts', 'total')
+
+    def __init__(self, thread: threading.Thread, size: int):
+        self.thread = thread
+        self.counts = [0] * size
+        self.total = 0.0
+
+
+class _ThreadSharded:
+    """
+    Per-thread shards that are written without locks
+    Each thread only ever writes its own shard, so updates need no lock
+    under the GIL. Readers merge all shards. Shards of finished threads are
+    folded into a retired total when a new thread registers, so servers that
+    start a thread per request don't accumulate shards.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.local = threading.local()
+        self.shards: List[_Shard] = []
+        self.retired = _Shard(None, size)
+        self.lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = _Shard(threading.current_thread(), self.size)
+            with self.lock:
+                live = []
+                for existing in self.shards:
+                    if existing.thread.is_alive():
+                        live.append(existing)
+                    else:
+                        self._fold(existing, self.retired)
+                live.append(shard)
+                self.shards = live
+        return shard
+
+    @staticmethod
+    def _fold(source: _Shard, target: _Shard):
+        for index, count in enumerate(source.counts):
+            target.counts[index] += count
+        target.total += source.total
+
+    def _merged(self) -> _Shard:
+        merged = _Shard(None, self.size)
+        with self.lock:
+            shards = list(self.shards) + [self.retired]
+        for shard in shards:
+            self._fold(shard, merged)
+        return merged
+
+
+class Counter(_ThreadSharded):
+    def __init__(self):
+        super().__init__(0)
+
+    def inc(self, amount: float = 1):
+        self._shard().total += amount
+
+    @property
+    def value(self) -> float:
+        return self._merged().total
+
+
+class Histogram(_ThreadSharded):
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = list(buckets)
+        super().__init__(len(self.bounds) + 1)
+
+    def observe(self, value: float):
+        shard = self._shard()
+        shard.counts[bisect.bisect_left(self.bounds, value)] += 1
+        shard.total += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Return per-bucket counts (the last one is +Inf) and the sum"""
+        merged = self._merged()
+        return merged.counts, merged.total
+
+    def merge(self, other: 'Histogram'):
+        """Add another histogram with the same buckets into this one"""
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets")
+        counts, total = other.snapshot()
+        with self.lock:
+            for index, count in enumerate(counts):
+                self.retired.counts[index] += count
+            self.retired.total += total
+
+    @property
+    def count(self) -> int:
+        return sum(self.snapshot()[0])
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside the matching bucket"""
+        counts, _ = self.snapshot()
+        total = sum(counts)
+        if not total:
+            return None
+        rank = fraction * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class Registry:
+    """Named metric families with labels, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.families: Dict[str, Tuple[str, str, Dict[Labels, object]]] = {}
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+        self.lock = threading.Lock()
+
+    def _get(self, name: str, kind: str, help_text: str, labels: Dict[str, str], factory):
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        family = self.families.get(name)
+        if family is not None:
+            metric = family[2].get(key)
+            if metric is not None:
+                return metric
+        with self.lock:
+            family = self.families.setdefault(name, (kind, help_text, {}))
+            if family[0] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family[0]}")
+            return family[2].setdefault(key, factory())
+
+    def counter(self, name: str, help_text: str = '', **labels) -> Counter:
+        return self._get(name, 'counter', help_text, labels, Counter)
+
+    def histogram(self, name: str, help_text: str = '', **labels) -> Histogram:
+        return self._get(name, 'histogram', help_text, labels, Histogram)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """Add a callback producing samples (e.g. gauges) at scrape time"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            families = sorted((name, kind, help_text, dict(metrics)) for name, (kind, help_text, metrics) in self.families.items())
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in sorted(metrics.items()):
+                if kind == 'counter':
+                    lines.append(f"{name}{_labels(labels)} {_number(metric.value)}")
+                    continue
+                counts, total = metric.snapshot()
+                cumulative = 0
+                for bound, count in zip(metric.bounds + ['+Inf'], counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+        described = set()
+        for collector in self.collectors:
+            for name, kind, help_text, labels, value in collector():
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+metrics = Registry()
+
+
+def stage_timer(stage: str) -> Histogram:
+    """Histogram for one named request stage"""
+    return metrics.histogram('buddybot_stage_seconds', 'Time spent in each request stage', stage=stage)
+
+
+def count(name: str, help_text: str = '', amount: float = 1, **labels):
+    metrics.counter(name, help_text, **labels).inc(amount)
@@ -0,0 +1,99 @@
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (tick the timer is due on, callback)
+_Timer = Tuple[int, Callable[[], None]]
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel for many short deadlines keyed by e.g. session id
+    Scheduling and cancelling are O(1): a timer lives in the slot for its
+    deadline tick and the key index points at that slot. A background
+    thread advances the wheel every tick and runs callbacks that are due;
+    deadlines further out than one revolution wait in their slot until
+    their tick comes round.
+    """
+
+    def __init__(self, tick: float = 0.05, slots: int = 1024, clock: Callable[[], float] = time.time):
+        self.tick = tick
+        self.slots: List[Dict[Hashable, _Timer]] = [{} for _ in range(slots)]
+        self.index: Dict[Hashable, int] = {}
+        self.clock = clock
+        self.current = self._tick_of(clock()) - 1
+        self.lock = threading.Lock()
+        self.fired = 0
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    def _tick_of(self, when: float) -> int:
+        return int(when / self.tick)
+
+    def start(self):
+        """Start the background thread that advances the wheel"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="timer-wheel", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def schedule(self, key: Hashable, deadline: float, callback: Callable[[], None]):
+        """Run callback at deadline, replacing any timer already set for key"""
+        if self.thread is None:
+            self.start()
+        with self.lock:
+            self._cancel(key)
+            # Round up so a timer never fires before its deadline
+            due = max(math.ceil(deadline / self.tick), self.current + 1)
+            slot = due % len(self.slots)
+            self.slots[slot][key] = (due, callback)
+            self.index[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        with self.lock:
+            return self._cancel(key)
+
+    def _cancel(self, key: Hashable) -> bool:
+        slot = self.index.pop(key, None)
+        if slot is None:
+            return False
+        del self.slots[slot][key]
+        return True
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Run every callback due by now, returning how many ran"""
+        target = self._tick_of(self.clock() if now is None else now)
+        due: List[Callable[[], None]] = []
+        with self.lock:
+            if target <= self.current:
+                return 0
+            # After a long stall one pass over every slot covers all missed ticks
+            ticks = range(max(self.current + 1, target - len(self.slots) + 1), target + 1)
+            for tick in ticks:
+                slot = self.slots[tick % len(self.slots)]
+                expired = [key for key, (deadline, _) in slot.items() if deadline <= target]
+                for key in expired:
+                    due.append(slot.pop(key)[1])
+                    del self.index[key]
+            self.current = target
+            self.fired += len(due)
+        for callback in due:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Timer callback failed: {str(e)}", exc_info=True)
+        return len(due)
+
+    def _run(self):
+        while not self.stopped.wait(self.tick):
+            self.advance()
+
+    def __len__(self) -> int:
+        return len(self.index)
@@ -1,2 +1,2 @@
 #!/bin/bash
-python3 -m flask run --host=0.0.0.0 --port=5000
\ No newline at end of file
+python3 -m flask --app "src.app:create_app()" run --host=0.0.0.0 --port=5000
\ No newline at end of file
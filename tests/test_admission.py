@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src import app as app_module
+from src.models.session_state import SessionState
+from src.services import openai_service
+from src.services.admission import AdmissionController, Overloaded, take_session_token
+from src.services.answer_queue import AnswerQueue, SessionSink
+from src.services.registry import services
+from src.utils.metrics import metrics
+
+def shed_count(reason):
+    return metrics.counter('buddybot_shed_total', reason=reason).value
+
+class TestAdmissionController(unittest.TestCase):
+    def test_slots_are_handed_to_waiters_in_order(self):
+        controller = AdmissionController(max_in_flight=1, max_waiting=2, max_wait=5)
+        order = []
+        controller.acquire()
+
+        def wait(name):
+            with controller.slot():
+                order.append(name)
+
+        first = threading.Thread(target=wait, args=('first',))
+        first.start()
+        while not controller.snapshot()['waiting']:
+            time.sleep(0.001)
+        second = threading.Thread(target=wait, args=('second',))
+        second.start()
+        while controller.snapshot()['waiting'] < 2:
+            time.sleep(0.001)
+        controller.release()
+        first.join(1)
+        second.join(1)
+        self.assertEqual(order, ['first', 'second'])
+        self.assertEqual(controller.snapshot()['in_flight'], 0)
+
+    def test_full_queue_sheds_immediately(self):
+        controller = AdmissionController(max_in_flight=1, max_waiting=0)
+        before = shed_count('queue_full')
+        controller.acquire()
+        self.assertTrue(controller.saturated())
+        with self.assertRaises(Overloaded) as raised:
+            controller.acquire()
+        self.assertEqual(raised.exception.reason, 'queue_full')
+        self.assertEqual(shed_count('queue_full'), before + 1)
+
+    def test_waiters_are_shed_at_their_deadline(self):
+        controller = AdmissionController(max_in_flight=1, max_waiting=1)
+        before = shed_count('expired')
+        controller.acquire()
+        start = time.monotonic()
+        with self.assertRaises(Overloaded) as raised:
+            controller.acquire(deadline=time.monotonic() + 0.05)
+        self.assertEqual(raised.exception.reason, 'expired')
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(shed_count('expired'), before + 1)
+        self.assertEqual(controller.snapshot()['waiting'], 0)
+        controller.release()
+        self.assertEqual(controller.snapshot()['in_flight'], 0)
+
+    def test_async_waiters_get_slots_released_by_threads(self):
+        controller = AdmissionController(max_in_flight=1, max_waiting=1, max_wait=5)
+        controller.acquire()
+
+        async def ask():
+            task = asyncio.ensure_future(controller.acquire_async())
+            await asyncio.sleep(0.01)
+            self.assertFalse(task.done())
+            threading.Thread(target=controller.release).start()
+            await task
+            controller.release()
+
+        asyncio.run(ask())
+        self.assertEqual(controller.snapshot()['in_flight'], 0)
+        self.assertEqual(controller.snapshot()['waiting'], 0)
+
+    def test_cancelled_async_waiters_leave_the_queue(self):
+        controller = AdmissionController(max_in_flight=1, max_waiting=1, max_wait=5)
+        controller.acquire()
+
+        async def ask():
+            task = asyncio.ensure_future(controller.acquire_async())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(ask())
+        self.assertEqual(controller.snapshot()['waiting'], 0)
+        controller.release()
+        self.assertEqual(controller.snapshot()['in_flight'], 0)
+
+class TestSessionTokens(unittest.TestCase):
+    def test_bucket_allows_a_burst_then_refills(self):
+        state = SessionState(100.0)
+        self.assertTrue(all(take_session_token(state, 100.0, rate=0.5, burst=2) for _ in range(2)))
+        self.assertFalse(take_session_token(state, 100.0, rate=0.5, burst=2))
+        self.assertFalse(take_session_token(state, 101.0, rate=0.5, burst=2))
+        self.assertTrue(take_session_token(state, 102.0, rate=0.5, burst=2))
+
+    def test_tokens_survive_serialization(self):
+        state = SessionState(100.0)
+        take_session_token(state, 100.0, burst=3)
+        restored = SessionState.from_dict(state.to_dict())
+        self.assertEqual(restored.question_tokens, 2)
+        self.assertEqual(restored.question_tokens_at, 100.0)
+
+class TestAppAdmission(unittest.TestCase):
+    def test_saturated_questions_get_a_busy_answer(self):
+        with mock.patch.object(app_module.admission, 'saturated', return_value=True), \
+                mock.patch.object(app_module.answer_queue, 'submit', return_value=True) as submit, \
+                app_module.message_buffer.session('admission-busy') as buffer_data:
+            buffer_data.collected_question = ['what is the tallest mountain']
+            self.assertFalse(app_module.process_question('admission-busy', buffer_data))
+        submit.assert_not_called()
+
+    def test_full_answer_queue_sheds_webhook_questions(self):
+        started, release = threading.Event(), threading.Event()
+
+        def answer(question, history):
+            started.set()
+            release.wait(5)
+            return 'Answer.'
+
+        answer_queue = AnswerQueue(answer, SessionSink(app_module.message_buffer), workers=1, max_pending=1)
+        client = app_module.app.test_client()
+        shed_before = shed_count('queue_full')
+
+        def ask(session_id, question):
+            return client.post('/webhook', json={
+                'session_id': session_id,
+                'segments': [{'id': '1', 'text': 'hey omi'}, {'id': '2', 'text': question}]
+            })
+
+        with mock.patch.object(app_module, 'answer_queue', answer_queue):
+            try:
+                self.assertEqual(ask('saturate-1', 'how tall is the shard?').status_code, 202)
+                self.assertTrue(started.wait(5))
+                self.assertEqual(ask('saturate-2', 'how old is the colosseum?').status_code, 202)
+                busy = ask('saturate-3', 'how deep is loch ness?')
+            finally:
+                release.set()
+        self.assertEqual(busy.json, {'message': app_module.BUSY_MESSAGE})
+        self.assertEqual(shed_count('queue_full'), shed_before + 1)
+
+    def test_cached_questions_bypass_admission(self):
+        app_module.answer_cache.cache.set('what is the longest river', 'The Nile.')
+        with mock.patch.object(app_module.admission, 'saturated', return_value=True), \
+                mock.patch.object(app_module.answer_queue, 'submit', return_value=True) as submit, \
+                app_module.message_buffer.session('admission-cached') as buffer_data:
+            buffer_data.collected_question = ['what is the longest river']
+            self.assertTrue(app_module.process_question('admission-cached', buffer_data))
+        submit.assert_called_once()
+
+    def test_shed_answers_are_busy_and_not_cached(self):
+        client = mock.Mock()
+        with services.override('openai', client), \
+                mock.patch.object(openai_service.admission, 'acquire', side_effect=Overloaded('expired')):
+            answer = openai_service.get_openai_response('what is the deepest lake?')
+        self.assertEqual(answer, openai_service.BUSY_RESPONSE)
+        self.assertFalse(app_module.answer_cache.is_cacheable(answer))
+        client.chat.completions.create.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+from src.services.answer_cache import AnswerCache, normalize_question
+from src.utils.cache import TTLCache
+
+class TestNormalizeQuestion(unittest.TestCase):
+    def test_strips_case_punctuation_fillers_and_trigger(self):
+        self.assertEqual(
+            normalize_question("Omi, um, What's the capital of France?"),
+            normalize_question("what is the capital of france")
+        )
+
+    def test_keeps_operators_and_decimal_points(self):
+        self.assertNotEqual(normalize_question('what is 5 + 3'), normalize_question('what is 5 - 3'))
+        self.assertNotEqual(normalize_question('what is 2.5 times 4'), normalize_question('what is 2 5 times 4'))
+        self.assertEqual(normalize_question('What is 1,000 * 2?'), normalize_question('what is 1000*2'))
+
+    def test_only_leading_fillers_are_dropped(self):
+        self.assertNotEqual(normalize_question('is it well done'), normalize_question('is it done'))
+        self.assertEqual(normalize_question('Um, so, is it done?'), normalize_question('is it done'))
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction_and_expiry(self):
+        cache = TTLCache(ttl=60, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('d', 4, ttl=-1)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_byte_limit(self):
+        cache = TTLCache(ttl=60, max_entries=100, max_bytes=200, sizeof=len)
+        for key in 'abcdef':
+            cache.set(key, 'x' * 50)
+        self.assertLessEqual(cache.stats()['bytes'], 200)
+
+class TestAnswerCache(unittest.TestCase):
+    def test_repeated_question_hits_cache(self):
+        calls = []
+        cache = AnswerCache(ttl=60)
+        compute = lambda question: calls.append(question) or 'Paris'
+        self.assertEqual(cache.get_or_compute("What's the capital of France?", compute), 'Paris')
+        self.assertEqual(cache.get_or_compute("what is the capital of france", compute), 'Paris')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_time_sensitive_questions_bypass_cache(self):
+        calls = []
+        cache = AnswerCache(ttl=60, never_cache_intents=['time'])
+        for _ in range(2):
+            cache.get_or_compute('what time is it in tokyo', lambda question: calls.append(question) or '9pm')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()['bypassed'], 2)
+
+    def test_uncacheable_answers_are_not_stored(self):
+        cache = AnswerCache(ttl=60, is_cacheable=lambda answer: answer != 'error')
+        cache.get_or_compute('who wrote hamlet', lambda question: 'error')
+        self.assertEqual(cache.get_or_compute('who wrote hamlet', lambda question: 'Shakespeare'), 'Shakespeare')
+
+    def test_concurrent_identical_questions_share_one_call(self):
+        calls = []
+        cache = AnswerCache(ttl=60)
+
+        def compute(question):
+            calls.append(question)
+            time.sleep(0.1)
+            return 'Everest'
+
+        threads = [
+            threading.Thread(target=cache.get_or_compute, args=('what is the tallest mountain', compute))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['coalesced'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
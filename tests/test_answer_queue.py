@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+from src.models.message_buffer import MessageBuffer
+from src.services.answer_queue import AnswerQueue, SessionSink
+
+def collect(message_buffer, session_id):
+    with message_buffer.session(session_id) as state:
+        answer, state.pending_answer = state.pending_answer, None
+    return answer
+
+class TestAnswerQueue(unittest.TestCase):
+    def setUp(self):
+        self.message_buffer = MessageBuffer()
+        self.sink = SessionSink(self.message_buffer)
+
+    def test_answer_is_delivered_to_sink(self):
+        answer_queue = AnswerQueue(lambda question, history: question.upper(), self.sink, workers=1)
+        self.assertTrue(answer_queue.submit('session', 'what time is it?'))
+        answer_queue.jobs.join()
+        self.assertEqual(collect(self.message_buffer, 'session'), 'WHAT TIME IS IT?')
+        self.assertIsNone(collect(self.message_buffer, 'session'))
+
+    def test_streamed_parts_are_joined(self):
+        answer_queue = AnswerQueue(lambda question, history: iter(['Lima.', 'It is on the coast.']), self.sink, workers=1)
+        answer_queue.submit('session', 'capital of peru?')
+        answer_queue.jobs.join()
+        self.assertEqual(collect(self.message_buffer, 'session'), 'Lima. It is on the coast.')
+
+    def test_full_queue_rejects_questions(self):
+        started, release = threading.Event(), threading.Event()
+
+        def answer(question, history):
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        answer_queue = AnswerQueue(answer, self.sink, workers=1, max_pending=1)
+        self.assertTrue(answer_queue.submit('a', 'first?'))
+        self.assertTrue(started.wait(5))
+        try:
+            self.assertTrue(answer_queue.submit('b', 'second?'))
+            self.assertFalse(answer_queue.submit('c', 'third?'))
+        finally:
+            release.set()
+        answer_queue.jobs.join()
+
+    def test_late_answers_are_discarded(self):
+        answer_queue = AnswerQueue(lambda question, history: time.sleep(0.1) or 'late', self.sink, workers=1, deadline=0.05)
+        answer_queue.submit('session', 'slow?')
+        answer_queue.jobs.join()
+        self.assertIsNone(collect(self.message_buffer, 'session'))
+        self.assertEqual(answer_queue.expired, 1)
+
+    def test_expired_and_failed_questions_are_dropped(self):
+        dropped = []
+
+        def answer(question, history):
+            if question == 'broken?':
+                raise RuntimeError('upstream failed')
+            time.sleep(0.1)
+            return 'late'
+
+        answer_queue = AnswerQueue(answer, self.sink, workers=1, deadline=0.05,
+                                   on_answer=lambda *args: self.fail('no answer expected'),
+                                   on_drop=lambda session_id, question: dropped.append((session_id, question)))
+        answer_queue.submit('b', 'broken?')
+        answer_queue.submit('a', 'slow?')
+        answer_queue.jobs.join()
+        self.assertEqual(dropped, [('b', 'broken?'), ('a', 'slow?')])
+
+if __name__ == '__main__':
+    unittest.main()
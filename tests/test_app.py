@@ -1,4 +1,7 @@
 import unittest
+from unittest import mock
+from flask.cli import ScriptInfo
+from src import app as app_module
 from src.app import app
 
 class TestApp(unittest.TestCase):
@@ -17,5 +20,11 @@ class TestApp(unittest.TestCase):
         self.assertIn('active_sessions', response.json)
         self.assertIn('uptime', response.json)
 
+    def test_flask_run_factory_warms_up(self):
+        with mock.patch.object(app_module, 'warm_up') as warm_up:
+            loaded = ScriptInfo(app_import_path='src.app:create_app()').load_app()
+        self.assertIs(loaded, app)
+        warm_up.assert_called_once_with()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+import httpx
+from src import app as flask_app
+from src import asgi
+
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        self.flask_queue = flask_app.answer_queue
+        asgi.started = False
+
+    def tearDown(self):
+        flask_app.use_answer_queue(self.flask_queue)
+        asgi.started = False
+
+    def run_client(self, scenario):
+        async def main():
+            transport = httpx.ASGITransport(app=asgi.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                return await scenario(client)
+        return asyncio.run(main())
+
+    def test_status_endpoints(self):
+        async def scenario(client):
+            setup = await client.get('/webhook/setup-status')
+            status = await client.get('/status')
+            missing = await client.get('/nope')
+            return setup, status, missing
+
+        setup, status, missing = self.run_client(scenario)
+        self.assertEqual(setup.json()['status'], 'OK')
+        self.assertIn('active_sessions', status.json())
+        self.assertEqual(missing.status_code, 404)
+
+    def test_question_is_answered_on_the_event_loop(self):
+        async def answer(question, history):
+            await asyncio.sleep(0.01)
+            return 'Lima.'
+
+        async def scenario(client):
+            response = await client.post('/webhook', json={
+                'session_id': 'asgi-session',
+                'segments': [
+                    {'text': 'hey omi what is', 'start': 0.0, 'end': 1.0},
+                    {'text': 'the capital of peru?', 'start': 1.0, 'end': 2.0}
+                ]
+            })
+            for _ in range(100):
+                polled = (await client.get('/answers/asgi-session')).json()
+                if 'message' in polled:
+                    return response, polled
+                await asyncio.sleep(0.01)
+            return response, None
+
+        with mock.patch.object(asgi, 'route_question_async', answer), \
+                mock.patch.object(asgi, 'get_openai_response_async', answer):
+            response, polled = self.run_client(scenario)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(polled, {'message': 'Lima.'})
+
+    def test_many_waiting_questions_share_one_thread(self):
+        threads_before = threading.active_count()
+        release = None
+
+        async def slow_answer(question, history):
+            await release.wait()
+            return 'done'
+
+        queue = asgi.AsyncAnswerQueue(slow_answer, mock.Mock(deliver_async=mock.AsyncMock()), max_pending=1000)
+
+        async def main():
+            nonlocal release
+            release = asyncio.Event()
+            accepted = [queue.submit(f'session-{index}', 'question?') for index in range(1000)]
+            await asyncio.sleep(0)
+            in_flight, rejected = queue.pending(), queue.submit('one-more', 'question?')
+            threads = threading.active_count()
+            release.set()
+            await asyncio.gather(*queue.tasks)
+            return accepted, in_flight, rejected, threads
+
+        accepted, in_flight, rejected, threads = asyncio.run(main())
+        self.assertTrue(all(accepted))
+        self.assertEqual(in_flight, 1000)
+        self.assertFalse(rejected)
+        self.assertLessEqual(threads, threads_before + 1)
+        self.assertEqual(queue.pending(), 0)
+        self.assertEqual(queue.sink.deliver_async.await_count, 1000)
+
+    def test_shared_store_answers_are_collected_off_the_loop(self):
+        threads = []
+
+        def collect_answer(session_id):
+            threads.append(threading.current_thread())
+            return {"status": "pending"}
+
+        async def scenario(client):
+            return await client.get('/answers/off-loop-session')
+
+        with mock.patch.object(asgi, 'SESSION_STORE', 'sqlite'), \
+                mock.patch.object(flask_app, 'collect_answer', side_effect=collect_answer):
+            response = self.run_client(scenario)
+        self.assertEqual(response.json(), {"status": "pending"})
+        self.assertIsNot(threads[0], threading.main_thread())
+
+if __name__ == '__main__':
+    unittest.main()
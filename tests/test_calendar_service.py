@@ -0,0 +1,146 @@
+import datetime
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from src.services.calendar_service import CalendarClientPool, CalendarService
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+class FailingRequest:
+    def execute(self):
+        raise RuntimeError('connection reset')
+
+class FakeEvents:
+    """Minimal stand-in for the Calendar API events() resource"""
+
+    def __init__(self, api):
+        self.api = api
+
+    def list(self, **params):
+        self.api.list_calls.append(params)
+        if params.get('syncToken'):
+            changes, self.api.changes = self.api.changes, []
+            return FakeRequest({'items': changes, 'nextSyncToken': 'token-2'})
+        return FakeRequest({'items': list(self.api.items), 'nextSyncToken': 'token-1'})
+
+    def insert(self, calendarId, body):
+        event = dict(body, id=f"event-{len(self.api.items)}", htmlLink='http://calendar/event')
+        self.api.items.append(event)
+        self.api.changes.append(event)
+        return FakeRequest(event)
+
+class FakeCalendarApi:
+    def __init__(self, items):
+        self.items = items
+        self.changes = []
+        self.list_calls = []
+
+    def events(self):
+        return FakeEvents(self)
+
+def make_event(event_id, summary, days):
+    start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=days)
+    return {'id': event_id, 'summary': summary, 'start': {'dateTime': start.isoformat()}}
+
+class TestCalendarService(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeCalendarApi([make_event('a', 'Standup', 1), make_event('b', 'Retro', -1)])
+        self.calendar = CalendarService(service=self.api, sync_interval=60)
+
+    def test_upcoming_events_use_cached_mirror(self):
+        first = self.calendar.get_upcoming_events()
+        second = self.calendar.get_upcoming_events()
+        self.assertIn('Standup', first)
+        self.assertNotIn('Retro', first)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.api.list_calls), 1)
+
+    def test_create_event_triggers_incremental_sync(self):
+        self.calendar.get_upcoming_events()
+        start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=2)
+        self.calendar.create_event('Dentist', start, start + datetime.timedelta(hours=1))
+        self.assertIn('Dentist', self.calendar.get_upcoming_events())
+        self.assertEqual(self.api.list_calls[-1]['syncToken'], 'token-1')
+
+    def test_cancelled_events_are_removed(self):
+        self.calendar.get_upcoming_events()
+        self.api.changes.append({'id': 'a', 'status': 'cancelled'})
+        self.calendar.invalidate_events()
+        self.assertEqual(self.calendar.get_upcoming_events(), "No upcoming events found.")
+
+    def test_full_sync_is_bounded_by_time(self):
+        self.calendar.get_upcoming_events()
+        self.assertIn('timeMin', self.api.list_calls[0])
+        self.assertIn('timeMax', self.api.list_calls[0])
+        self.assertEqual(list(self.calendar.events), ['a'])
+
+    def test_window_moves_forward_with_a_full_sync(self):
+        self.api.items.append(make_event('c', 'Conference', 45))
+        self.calendar.get_upcoming_events()
+        self.assertEqual(list(self.calendar.events), ['a'])
+        # A day later the horizon is a day closer than the lookahead
+        self.calendar.horizon -= datetime.timedelta(days=1, minutes=1)
+        self.calendar.invalidate_events()
+        self.calendar.get_upcoming_events()
+        self.assertNotIn('syncToken', self.api.list_calls[-1])
+        self.assertEqual(len(self.api.list_calls), 2)
+
+    def test_failed_full_sync_keeps_the_previous_mirror(self):
+        self.calendar.get_upcoming_events()
+        self.calendar.sync_token = None
+        self.api.events = lambda: SimpleNamespace(list=lambda **params: FakeRequest({
+            'items': [make_event('c', 'Offsite', 2)], 'nextPageToken': 'page-2'
+        }) if not params.get('pageToken') else FailingRequest())
+        with self.assertRaises(RuntimeError):
+            self.calendar.sync_events(force=True)
+        self.assertEqual(list(self.calendar.events), ['a'])
+
+class TestCalendarClientPool(unittest.TestCase):
+    def test_clients_are_built_once_per_user(self):
+        built = []
+        pool = CalendarClientPool(factory=lambda user_id: built.append(user_id) or CalendarService(service=FakeCalendarApi([])))
+        self.assertIs(pool.get('alice'), pool.get('alice'))
+        pool.get('bob')
+        self.assertEqual(built, ['alice', 'bob'])
+
+    def test_slow_build_only_blocks_its_own_user(self):
+        started, release = threading.Event(), threading.Event()
+        built = []
+
+        def factory(user_id):
+            built.append(user_id)
+            if user_id == 'slow':
+                started.set()
+                release.wait(5)
+            return CalendarService(service=FakeCalendarApi([]))
+
+        pool = CalendarClientPool(factory=factory)
+        waiters = [threading.Thread(target=pool.get, args=('slow',)) for _ in range(3)]
+        for waiter in waiters:
+            waiter.start()
+        try:
+            self.assertTrue(started.wait(5))
+            start = time.monotonic()
+            self.assertIsNotNone(pool.get('fast'))
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual(built.count('slow'), 1)
+        finally:
+            release.set()
+            for waiter in waiters:
+                waiter.join()
+        self.assertEqual(sorted(built), ['fast', 'slow'])
+
+    def test_ready_once_built_or_signed_in(self):
+        pool = CalendarClientPool(factory=lambda user_id: CalendarService(service=FakeCalendarApi([])))
+        self.assertFalse(pool.ready('nobody-signed-in'))
+        pool.get('nobody-signed-in')
+        self.assertTrue(pool.ready('nobody-signed-in'))
+
+if __name__ == '__main__':
+    unittest.main()
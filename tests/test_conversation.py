@@ -0,0 +1,119 @@
+import json
+import unittest
+from unittest import mock
+from src import app as app_module
+from src.models.session_state import SessionState
+from src.services import conversation
+from src.services.conversation import HEARD, build_history, estimate_tokens, is_follow_up, remember, remember_turn
+from src.services.openai_service import _messages
+
+class TestConversation(unittest.TestCase):
+    def setUp(self):
+        self.state = SessionState(0.0)
+
+    def test_history_is_sent_oldest_first(self):
+        remember(self.state, HEARD, 'we should go to lisbon')
+        remember(self.state, HEARD, 'in june')
+        remember_turn(self.state, 'what is the weather in lisbon?', 'It is sunny and 24 degrees.')
+        self.assertEqual(build_history(self.state), [
+            {'role': 'system', 'content': 'Recently heard nearby: we should go to lisbon in june'},
+            {'role': 'user', 'content': 'what is the weather in lisbon?'},
+            {'role': 'assistant', 'content': 'It is sunny and 24 degrees.'}
+        ])
+
+    def test_token_totals_are_incremental(self):
+        remember_turn(self.state, 'what is two plus two?', 'Four.')
+        remember(self.state, HEARD, 'nice')
+        self.assertEqual(self.state.context_tokens, sum(tokens for _, _, tokens in self.state.messages))
+        self.assertEqual(self.state.context_tokens, estimate_tokens('what is two plus two?') + estimate_tokens('Four.') + 1)
+
+    def test_turns_past_the_budget_are_summarized(self):
+        for index in range(10):
+            remember_turn(self.state, f'question number {index} about something?', f'Answer {index}. More detail follows here.')
+        history = build_history(self.state, budget=80)
+        self.assertTrue(history[0]['content'].startswith('Earlier in this conversation: '))
+        self.assertIn('You answered: Answer 0.', history[0]['content'])
+        self.assertEqual(history[-1], {'role': 'assistant', 'content': 'Answer 9. More detail follows here.'})
+        self.assertLessEqual(sum(estimate_tokens(message['content']) for message in history), 100)
+        # Summarized turns leave the ring
+        self.assertNotIn('question number 0 about something?', [text for _, text, _ in self.state.messages])
+
+    def test_memory_per_session_is_capped(self):
+        with mock.patch.object(conversation, 'CONTEXT_SUMMARY_TOKENS', 40):
+            for index in range(500):
+                remember(self.state, HEARD, 'blah ' * 50)
+                remember_turn(self.state, f'question {index}?', 'A long answer. ' * 40)
+        self.assertLessEqual(self.state.context_tokens, conversation.CONTEXT_MAX_TOKENS)
+        self.assertLessEqual(self.state.summary_tokens, 40)
+        self.assertLess(len(json.dumps(self.state.to_dict())), 4 * (conversation.CONTEXT_MAX_TOKENS + 40) + 2000)
+
+    def test_context_survives_serialization(self):
+        remember_turn(self.state, 'who wrote dune?', 'Frank Herbert.')
+        restored = SessionState.from_dict(json.loads(json.dumps(self.state.to_dict())))
+        self.assertEqual(build_history(restored), build_history(self.state))
+        restored.reset()
+        self.assertEqual(len(restored.messages), 2)
+
+    def test_follow_up_detection(self):
+        self.assertTrue(is_follow_up('and what about tomorrow?'))
+        self.assertTrue(is_follow_up('how tall is he?'))
+        self.assertFalse(is_follow_up('what is the capital of peru?'))
+        self.assertTrue(is_follow_up('what was the name of the restaurant?'))
+
+    def test_history_goes_between_system_prompt_and_question(self):
+        history = [{'role': 'user', 'content': 'who wrote dune?'}, {'role': 'assistant', 'content': 'Frank Herbert.'}]
+        messages = _messages('when was he born?', history)
+        self.assertEqual([message['role'] for message in messages], ['system', 'user', 'assistant', 'user'])
+        self.assertEqual(messages[-1]['content'], 'when was he born?')
+
+class TestAppConversation(unittest.TestCase):
+    def test_answered_questions_are_sent_with_the_next_question(self):
+        session_id = 'conversation-session'
+        app_module.remember_answer(session_id, 'who wrote dune?', 'Frank Herbert.')
+        app_module.remember_answer(session_id, 'what is the weather?', app_module.FALLBACK_RESPONSE)
+        with mock.patch.object(app_module.answer_queue, 'submit', return_value=True) as submit, \
+                app_module.message_buffer.session(session_id) as buffer_data:
+            buffer_data.collected_question = ['when was he born']
+            app_module.process_question(session_id, buffer_data)
+        submit.assert_called_once_with(session_id, 'when was he born?', [
+            {'role': 'user', 'content': 'who wrote dune?'},
+            {'role': 'assistant', 'content': 'Frank Herbert.'}
+        ])
+
+    def test_follow_ups_with_history_skip_the_answer_cache(self):
+        compute = mock.Mock(return_value='In 1920.')
+        history = [{'role': 'user', 'content': 'who wrote dune?'}]
+        with mock.patch.object(app_module, 'STREAM_ANSWERS', False), \
+                mock.patch.object(app_module, 'route_question', compute), \
+                mock.patch.object(app_module, 'get_openai_response', compute):
+            app_module.answer_question('when was he born?', history)
+            app_module.answer_question('when was he born?', history)
+        self.assertEqual(compute.call_count, 2)
+        compute.assert_called_with('when was he born?', history)
+
+    def test_answers_built_from_one_sessions_history_are_not_shared(self):
+        compute = mock.Mock(side_effect=lambda question, history: history[0]['content'])
+        question = 'what was the name of the restaurant?'
+        first = [{'role': 'system', 'content': 'Recently heard nearby: dinner at chez panisse'}]
+        second = [{'role': 'system', 'content': 'Recently heard nearby: lunch at the french laundry'}]
+        with mock.patch.object(app_module, 'STREAM_ANSWERS', False), \
+                mock.patch.object(app_module, 'ANSWER_MODE', 'router'), \
+                mock.patch.object(app_module, 'route_question', compute):
+            self.assertIn('chez panisse', app_module.answer_question(question, first))
+            self.assertIn('french laundry', app_module.answer_question(question, second))
+        self.assertIsNone(app_module.answer_cache.cached(question))
+
+    def test_standalone_questions_with_heard_history_are_cached(self):
+        compute = mock.Mock(return_value='Thimphu.')
+        question = 'what is the capital of bhutan?'
+        history = [{'role': 'system', 'content': 'Recently heard nearby: pass the salt'}]
+        with mock.patch.object(app_module, 'STREAM_ANSWERS', False), \
+                mock.patch.object(app_module, 'ANSWER_MODE', 'router'), \
+                mock.patch.object(app_module, 'route_question', compute):
+            app_module.answer_question(question, history)
+            app_module.answer_question(question, history)
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(app_module.answer_cache.cached(question), 'Thimphu.')
+
+if __name__ == '__main__':
+    unittest.main()
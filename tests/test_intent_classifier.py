@@ -0,0 +1,106 @@
+import datetime
+import json
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from src.config import LOCAL_INTENT_THRESHOLD
+from src.services import intent_analyzer
+from src.services.intent_classifier import IntentClassifier, extract_entities
+from src.services.registry import services
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'intents.jsonl')
+
+def load_fixtures():
+    with open(FIXTURES) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class TestIntentClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = IntentClassifier()
+        self.fixtures = load_fixtures()
+
+    def test_confident_local_answers_are_accurate(self):
+        answered = [
+            (row, result) for row, result in
+            zip(self.fixtures, self.classifier.classify_batch([row['text'] for row in self.fixtures]))
+            if result['confidence'] >= LOCAL_INTENT_THRESHOLD
+        ]
+        correct = sum(result['primary_intent'] == row['intent'] for row, result in answered)
+        self.assertGreaterEqual(correct / len(answered), 0.95)
+        self.assertGreaterEqual(len(answered) / len(self.fixtures), 0.5)
+
+    def test_general_questions_escalate(self):
+        for row in self.fixtures:
+            if row['intent'] == 'unknown':
+                self.assertLess(self.classifier.classify(row['text'])['confidence'], LOCAL_INTENT_THRESHOLD, row['text'])
+
+    def test_generic_message_verbs_escalate(self):
+        for text in ('send a message to mom', 'reply to her message', 'any new messages'):
+            self.assertLess(self.classifier.classify(text)['confidence'], LOCAL_INTENT_THRESHOLD, text)
+        result = self.classifier.classify('send an email to sarah')
+        self.assertEqual(result['primary_intent'], 'email')
+        self.assertGreaterEqual(result['confidence'], LOCAL_INTENT_THRESHOLD)
+
+    def test_batch_matches_single_scoring(self):
+        texts = [row['text'] for row in self.fixtures]
+        batch = self.classifier.score_batch(texts)
+        for text, scores in zip(texts, batch):
+            self.assertEqual(list(scores), list(self.classifier.score(text)))
+
+class TestExtractEntities(unittest.TestCase):
+    def test_city_and_relative_date(self):
+        entities = extract_entities("what's the weather in new york tomorrow", today=datetime.date(2026, 10, 18))
+        self.assertIn({'type': 'location', 'value': 'new york'}, entities)
+        self.assertIn({'type': 'date', 'value': '2026-10-19', 'text': 'tomorrow'}, entities)
+
+    def test_unknown_city_from_pattern(self):
+        self.assertEqual(
+            extract_entities("forecast for springfield today")[0],
+            {'type': 'location', 'value': 'springfield'}
+        )
+
+    def test_create_action(self):
+        for text in ('schedule a meeting with bob tomorrow at 3pm', 'book an appointment with the dentist on friday',
+                     'add lunch with sam to my calendar'):
+            self.assertIn({'type': 'action', 'value': 'create'}, extract_entities(text), text)
+        for text in ("what's on my schedule today", 'am i busy tomorrow', 'when is my next meeting'):
+            self.assertNotIn({'type': 'action', 'value': 'create'}, extract_entities(text), text)
+
+class TestIntentResponse(unittest.TestCase):
+    def respond(self, text, llm_result=None, busy=False):
+        calendar = mock.Mock()
+        calendar.create_event.return_value = 'Event created.'
+        calendar.get_upcoming_events.return_value = 'Your next event is standup.'
+        with services.override('calendar', SimpleNamespace(get=lambda: calendar, ready=lambda: True)), \
+                mock.patch.object(intent_analyzer, 'analyze_intent_llm', return_value=llm_result) as llm, \
+                mock.patch.object(intent_analyzer.admission, 'busy', return_value=busy):
+            return intent_analyzer.respond_to_intent(text), llm, calendar
+
+    def test_create_requests_escalate_to_the_llm(self):
+        llm_result = {
+            'primary_intent': 'calendar', 'confidence': 0.95, 'requires_clarification': False,
+            'entities': [
+                {'type': 'action', 'value': 'create'},
+                {'type': 'event_name', 'value': 'Meeting with Bob'},
+                {'type': 'start_time', 'value': '2026-10-19T15:00:00'},
+                {'type': 'end_time', 'value': '2026-10-19T16:00:00'}
+            ]
+        }
+        answer, llm, calendar = self.respond('schedule a meeting with bob tomorrow at 3pm', llm_result)
+        self.assertEqual(answer, 'Event created.')
+        llm.assert_called_once()
+        self.assertEqual(calendar.create_event.call_args.kwargs['summary'], 'Meeting with Bob')
+
+    def test_local_fallback_does_not_list_events_for_create_requests(self):
+        answer, llm, calendar = self.respond('book an appointment with the dentist on friday', busy=True)
+        llm.assert_not_called()
+        self.assertIn('more details to create an event', answer)
+
+    def test_reading_the_calendar_stays_local(self):
+        answer, llm, _ = self.respond('what meetings are on my calendar today')
+        llm.assert_not_called()
+        self.assertEqual(answer, 'Your next event is standup.')
+
+if __name__ == '__main__':
+    unittest.main()
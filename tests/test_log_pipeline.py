@@ -0,0 +1,108 @@
+import io
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import unittest
+
+from src.utils import log_pipeline
+from src.utils.log_pipeline import configure_logging, log_payload, log_session, stop_logging
+from src.utils.metrics import metrics
+
+logger = logging.getLogger('tests.log_pipeline')
+
+class Spy:
+    """Records the thread its str() runs on"""
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread())
+        return 'spy'
+
+class TestLogPipeline(unittest.TestCase):
+    def setUp(self):
+        self.output = io.StringIO()
+        # Handlers added by the test runner would format records on this thread
+        root = logging.getLogger()
+        self.other_handlers = [handler for handler in root.handlers if handler is not log_pipeline._handler]
+        for handler in self.other_handlers:
+            root.removeHandler(handler)
+
+    def tearDown(self):
+        configure_logging()
+        root = logging.getLogger()
+        for handler in self.other_handlers:
+            root.addHandler(handler)
+
+    def records(self):
+        stop_logging()
+        return [json.loads(line) for line in self.output.getvalue().splitlines()]
+
+    def test_records_are_json_with_the_session_id(self):
+        configure_logging(level='INFO', fmt='json', stream=self.output)
+        with log_session('session-1'):
+            logger.info("Answered %d questions", 3)
+        logger.info("No session")
+        first, second = self.records()
+        self.assertEqual(first['message'], 'Answered 3 questions')
+        self.assertEqual(first['session_id'], 'session-1')
+        self.assertEqual(first['level'], 'INFO')
+        self.assertNotIn('session_id', second)
+
+    def test_messages_are_formatted_by_the_background_writer(self):
+        configure_logging(level='INFO', stream=self.output)
+        spy = Spy()
+        logger.info("Value: %s", spy)
+        logger.debug("Below the level: %s", spy)
+        self.assertEqual(self.records()[0]['message'], 'Value: spy')
+        self.assertEqual(len(spy.threads), 1)
+        self.assertIsNot(spy.threads[0], threading.current_thread())
+
+    def test_payloads_are_sampled_and_truncated(self):
+        configure_logging(level='INFO', max_payload_chars=20, stream=self.output)
+        log_payload(logger, "Received webhook data", {'segments': [{'text': 'x' * 100}]}, sample_rate=1)
+        log_payload(logger, "Received webhook data", {'segments': []}, sample_rate=0)
+        records = self.records()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['payload'], '{"segments":[{"text"...')
+
+    def test_exceptions_are_rendered(self):
+        configure_logging(level='INFO', stream=self.output)
+        try:
+            raise ValueError('bad payload')
+        except ValueError:
+            logger.error("Webhook error", exc_info=True)
+        self.assertIn('ValueError: bad payload', self.records()[0]['exception'])
+
+    def test_full_queue_drops_records(self):
+        handler = log_pipeline._QueueHandler(queue.Queue(1))
+        dropped = metrics.counter('buddybot_log_dropped_total').value
+        for _ in range(3):
+            handler.handle(logging.LogRecord('test', logging.INFO, __file__, 1, 'message', None, None))
+        self.assertEqual(metrics.counter('buddybot_log_dropped_total').value, dropped + 2)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_forked_children_get_a_writer(self):
+        with tempfile.TemporaryFile('w+') as output:
+            configure_logging(level='INFO', fmt='json', stream=output)
+            pid = os.fork()
+            if pid == 0:
+                logger.info("From the child")
+                stop_logging()
+                os._exit(0)
+            os.waitpid(pid, 0)
+            stop_logging()
+            output.seek(0)
+            self.assertEqual([json.loads(line)['message'] for line in output], ['From the child'])
+
+    def test_text_format(self):
+        configure_logging(level='INFO', fmt='text', background=False, stream=self.output)
+        with log_session('session-2'):
+            logger.warning("Slow answer")
+        self.assertEqual(self.output.getvalue().strip(), 'WARNING:tests.log_pipeline:Slow answer session_id=session-2')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import unittest
+import glob
+import os
+import tempfile
+import time
+from unittest import mock
+from src import app as app_module
+from src.models.message_buffer import MessageBuffer
+from src.models.session_journal import JournaledSessionStore
+from src.models.session_store import InMemorySessionStore, SqliteSessionStore
+
+class TestMessageBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = MessageBuffer(store=InMemorySessionStore(session_expiry=60, shard_count=4))
+
+    def test_get_buffer_returns_same_state(self):
+        state = self.buffer.get_buffer('session')
+        state.trigger_detected = True
+        self.assertTrue(self.buffer.get_buffer('session').trigger_detected)
+        self.assertEqual(len(self.buffer), 1)
+
+    def test_reset_buffer_clears_question(self):
+        state = self.buffer.get_buffer('session')
+        state.trigger_detected = True
+        state.collected_question.append('what time is it')
+        self.buffer.reset_buffer('session')
+        self.assertFalse(state.trigger_detected)
+        self.assertEqual(state.collected_question, [])
+
+    def test_cleanup_removes_only_expired_sessions(self):
+        self.buffer.get_buffer('stale')
+        active = self.buffer.get_buffer('active')
+        now = active.last_activity
+        self.assertEqual(self.buffer.cleanup_old_sessions(now + 30), 0)
+        active.last_activity = now + 50
+        self.assertEqual(self.buffer.cleanup_old_sessions(now + 61), 1)
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.cleanup_old_sessions(active.last_activity + 61), 1)
+        self.assertEqual(len(self.buffer), 0)
+
+class TestSqliteSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'sessions.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_state_is_shared_between_stores(self):
+        first = SqliteSessionStore(self.path, session_expiry=60)
+        second = SqliteSessionStore(self.path, session_expiry=60)
+        with first.transaction('session') as state:
+            state.trigger_detected = True
+            state.collected_question.append('what time is it')
+        with second.transaction('session') as state:
+            self.assertTrue(state.trigger_detected)
+            self.assertEqual(state.collected_question, ['what time is it'])
+        self.assertEqual(len(first), 1)
+
+    def test_failed_transaction_is_rolled_back(self):
+        store = SqliteSessionStore(self.path, session_expiry=60)
+        with self.assertRaises(RuntimeError):
+            with store.transaction('session') as state:
+                state.trigger_detected = True
+                raise RuntimeError('boom')
+        self.assertFalse(store.get('session').trigger_detected)
+
+    def test_cleanup_removes_expired_sessions(self):
+        store = SqliteSessionStore(self.path, session_expiry=60)
+        state = store.get('session')
+        self.assertEqual(store.cleanup_expired(state.last_activity + 30), 0)
+        self.assertEqual(store.cleanup_expired(state.last_activity + 61), 1)
+        self.assertEqual(len(store), 0)
+
+class TestJournaledSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.directory.cleanup()
+
+    def open_store(self, **kwargs):
+        kwargs.setdefault('session_expiry', 60)
+        kwargs.setdefault('commit_interval', 3600)
+        store = JournaledSessionStore(self.directory.name, **kwargs)
+        self.stores.append(store)
+        return store
+
+    def test_restart_restores_trigger_state(self):
+        store = self.open_store()
+        with store.transaction('session') as state:
+            state.trigger_detected = True
+            state.collected_question.append('what time is it')
+        store.close()
+        restored = self.open_store()
+        self.assertEqual(restored.restored, 1)
+        with restored.transaction('session') as state:
+            self.assertTrue(state.trigger_detected)
+            self.assertEqual(state.collected_question, ['what time is it'])
+
+    def test_updates_are_batched_per_session(self):
+        store = self.open_store()
+        for _ in range(5):
+            with store.transaction('session') as state:
+                state.collected_question.append('more')
+        store.get('other')
+        self.assertEqual(store.commit(), 2)
+        self.assertEqual(store.commit(), 0)
+
+    def test_expired_sessions_are_not_restored(self):
+        store = self.open_store()
+        store.get('stale').last_activity = time.time() - 120
+        store.get('active')
+        store.close()
+        restored = self.open_store()
+        self.assertEqual(restored.restored, 1)
+        self.assertEqual(len(restored), 1)
+
+    def test_snapshot_compacts_the_journal(self):
+        store = self.open_store()
+        for index in range(3):
+            store.get(f'session-{index}')
+        store.commit()
+        self.assertEqual(store.snapshot(), 3)
+        with store.transaction('session-0') as state:
+            state.pending_answer = 'It is noon.'
+        store.close()
+        self.assertEqual(len(glob.glob(os.path.join(self.directory.name, 'journal-*.log'))), 1)
+        restored = self.open_store()
+        self.assertEqual(restored.restored, 3)
+        self.assertEqual(restored.get('session-0').pending_answer, 'It is noon.')
+
+    def test_torn_last_record_is_ignored(self):
+        store = self.open_store()
+        store.get('session')
+        store.close()
+        with open(glob.glob(os.path.join(self.directory.name, 'journal-*.log'))[0], 'a') as journal:
+            journal.write('99\t1e12\t"torn"\t{"trigger_det')
+        restored = self.open_store()
+        self.assertEqual(restored.restored, 1)
+        self.assertEqual(len(restored), 1)
+
+    def test_directory_is_locked_to_one_store(self):
+        self.open_store()
+        with self.assertRaises(RuntimeError):
+            JournaledSessionStore(self.directory.name)
+
+    def test_open_and_dispatched_questions_resume_after_restart(self):
+        store = self.open_store()
+        with mock.patch.object(app_module, 'message_buffer', MessageBuffer(store=store)), \
+                mock.patch.object(app_module.answer_queue, 'submit', return_value=True):
+            with app_module.message_buffer.session('dispatched') as state:
+                state.collected_question = ['what time is it']
+                app_module.dispatch_question('dispatched', state, time.time())
+            with app_module.message_buffer.session('open') as state:
+                state.trigger_detected = True
+                state.trigger_time = time.time()
+                state.collected_question = ['how tall is k2']
+            store.get('idle')
+        store.close()
+
+        restored = self.open_store()
+        with mock.patch.object(app_module, 'message_buffer', MessageBuffer(store=restored)), \
+                mock.patch.object(app_module.answer_queue, 'submit', return_value=True) as submit, \
+                mock.patch.object(app_module, 'question_deadlines') as deadlines:
+            app_module.resume_sessions()
+            submit.assert_called_once_with('dispatched', 'what time is it?', [])
+            self.assertEqual([call.args[0] for call in deadlines.schedule.call_args_list], ['open'])
+            app_module.remember_answer('dispatched', 'what time is it?', 'It is noon.')
+            self.assertIsNone(restored.get('dispatched').dispatched_question)
+        self.assertEqual(restored.resumable_sessions(), [])
+
+    def test_dropped_questions_are_not_resumed(self):
+        store = self.open_store()
+        with mock.patch.object(app_module, 'message_buffer', MessageBuffer(store=store)), \
+                mock.patch.object(app_module.answer_queue, 'submit', return_value=True):
+            with app_module.message_buffer.session('expired') as state:
+                state.collected_question = ['what time is it']
+                app_module.dispatch_question('expired', state, time.time())
+            app_module.forget_question('expired', 'what time is it?')
+        store.close()
+        self.assertEqual(self.open_store().resumable_sessions(), [])
+
+    def test_committer_writes_in_the_background(self):
+        store = self.open_store(commit_interval=0.01)
+        store.get('session')
+        deadline = time.time() + 2
+        while store.dirty and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(store.dirty)
+
+if __name__ == '__main__':
+    unittest.main()
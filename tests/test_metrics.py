@@ -0,0 +1,47 @@
+import threading
+import unittest
+from src.utils.metrics import Histogram, Registry
+
+class TestHistogram(unittest.TestCase):
+    def test_observations_from_many_threads_are_merged(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+
+        def observe():
+            for value in (0.05, 0.5, 5.0):
+                histogram.observe(value)
+
+        threads = [threading.Thread(target=observe) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        observe()
+        counts, total = histogram.snapshot()
+        self.assertEqual(counts, [9, 9, 9])
+        self.assertAlmostEqual(total, 9 * 5.55)
+        self.assertLessEqual(len(histogram.shards), 2)
+
+    def test_merge_and_quantile(self):
+        first, second = Histogram(buckets=(1.0, 2.0)), Histogram(buckets=(1.0, 2.0))
+        first.observe(0.5)
+        second.observe(1.5)
+        first.merge(second)
+        self.assertEqual(first.count, 2)
+        self.assertAlmostEqual(first.quantile(0.5), 1.0)
+
+class TestRegistry(unittest.TestCase):
+    def test_prometheus_text(self):
+        registry = Registry()
+        registry.counter('requests_total', 'Requests', route='webhook').inc(3)
+        registry.histogram('latency_seconds', 'Latency', stage='parse').observe(0.002)
+        registry.register_collector(lambda: [('sessions', 'gauge', 'Sessions', {}, 4)])
+        text = registry.render()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn('requests_total{route="webhook"} 3', text)
+        self.assertIn('latency_seconds_bucket{stage="parse",le="0.0025"} 1', text)
+        self.assertIn('latency_seconds_bucket{stage="parse",le="+Inf"} 1', text)
+        self.assertIn('latency_seconds_count{stage="parse"} 1', text)
+        self.assertIn('sessions 4', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.services import openai_service
+from src.services.model_router import ModelRouter, is_complex
+from src.services.registry import services
+from src.utils.metrics import metrics
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def router(**kwargs):
+    kwargs.setdefault('primary', 'big-model')
+    kwargs.setdefault('fast', 'small-model')
+    kwargs.setdefault('enabled', True)
+    kwargs.setdefault('latency_budget', 2.0)
+    kwargs.setdefault('min_samples', 5)
+    kwargs.setdefault('probe_interval', 30)
+    return ModelRouter(**kwargs)
+
+class TestModelChoice(unittest.TestCase):
+    def test_short_factual_questions_are_simple(self):
+        self.assertFalse(is_complex('what is the capital of peru?'))
+        self.assertTrue(is_complex('explain how a heat pump works?'))
+        self.assertTrue(is_complex('what is ' + 'a very long question ' * 10))
+
+    def test_follow_ups_with_history_are_complex(self):
+        history = [{'role': 'user', 'content': 'who wrote dune?'}]
+        self.assertFalse(is_complex('when was he born?'))
+        self.assertTrue(is_complex('when was he born?', history))
+
+    def test_calls_are_routed_by_type_and_complexity(self):
+        models = router()
+        self.assertEqual(models.choose('classify', 'explain everything'), ('small-model', 'classify'))
+        self.assertEqual(models.choose('answer', 'what is the capital of peru?'), ('small-model', 'simple'))
+        self.assertEqual(models.choose('answer', 'why is the sky blue?'), ('big-model', 'complex'))
+
+    def test_routing_can_be_disabled(self):
+        models = router(enabled=False)
+        self.assertEqual(models.choose('classify', 'hi'), ('big-model', 'fixed'))
+
+    def test_decisions_are_counted(self):
+        counter = metrics.counter('buddybot_model_routes_total', call='answer', model='big-model', reason='complex')
+        before = counter.value
+        router().choose('answer', 'compare these two phones')
+        self.assertEqual(counter.value, before + 1)
+
+class TestFailover(unittest.TestCase):
+    def test_slow_primary_fails_over_and_is_probed(self):
+        clock = FakeClock()
+        models = router(clock=clock)
+        for seconds in (3.0, 3.5, 2.8, 3.2, 3.1):
+            models.observe('big-model', 'answer', seconds)
+        self.assertTrue(models.degraded('big-model', 'answer'))
+        self.assertEqual(models.choose('answer', 'why is the sky blue?'), ('small-model', 'failover'))
+
+        clock.now += 31
+        self.assertEqual(models.choose('answer', 'why is the sky blue?'), ('big-model', 'probe'))
+        self.assertEqual(models.choose('answer', 'why is the sky blue?'), ('small-model', 'failover'))
+
+    def test_primary_recovers_once_fast_again(self):
+        models = router(alpha=0.5)
+        for _ in range(5):
+            models.observe('big-model', 'answer', 3.0)
+        for _ in range(10):
+            models.observe('big-model', 'answer', 0.5)
+        self.assertFalse(models.degraded('big-model', 'answer'))
+        self.assertEqual(models.choose('answer', 'why is the sky blue?').reason, 'complex')
+
+    def test_failing_primary_fails_over(self):
+        models = router()
+        for _ in range(5):
+            models.observe('big-model', 'answer', 0.1, error=True)
+        self.assertEqual(models.choose('answer', 'why is the sky blue?').reason, 'failover')
+
+    def test_failover_needs_enough_samples(self):
+        models = router()
+        models.observe('big-model', 'answer', 30.0)
+        self.assertFalse(models.degraded('big-model', 'answer'))
+
+class TestUsage(unittest.TestCase):
+    def test_attempts_record_latency_and_tokens(self):
+        models = router()
+        response = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=12, completion_tokens=30))
+        prompt = metrics.counter('buddybot_model_tokens_total', model='small-model', kind='prompt')
+        before = prompt.value
+        self.assertIs(models.attempt('small-model', 'answer', lambda timeout: response)(5), response)
+        self.assertEqual(prompt.value, before + 12)
+        self.assertEqual(models.summary()['small-model']['calls']['answer']['requests'], 1)
+
+    def test_failed_attempts_count_as_errors(self):
+        models = router()
+        with self.assertRaises(ValueError):
+            models.attempt('small-model', 'classify', mock.Mock(side_effect=ValueError('bad')))(5)
+        self.assertGreater(models.stats[('small-model', 'classify')].error_rate, 0)
+
+    def test_streams_are_timed_to_the_end(self):
+        models = router()
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='Lima is the capital.'))])]
+        stream = models.stream('small-model', 'answer', lambda timeout: iter(chunks), prompt_tokens=8)(5)
+        self.assertNotIn(('small-model', 'answer'), models.stats)
+        self.assertEqual(list(stream), chunks)
+        self.assertEqual(models.stats[('small-model', 'answer')].samples, 1)
+
+    def test_answers_use_the_chosen_model(self):
+        client = mock.Mock()
+        client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='Lima.'))], usage=None
+        )
+        with services.override('openai', client), \
+                mock.patch.object(openai_service, 'model_router', router()):
+            self.assertEqual(openai_service.get_openai_response('what is the capital of peru?'), 'Lima.')
+        self.assertEqual(client.chat.completions.create.call_args.kwargs['model'], 'small-model')
+
+if __name__ == '__main__':
+    unittest.main()
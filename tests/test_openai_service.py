@@ -0,0 +1,61 @@
+import unittest
+from types import SimpleNamespace
+from src.services import openai_service
+from src.services.answer_cache import AnswerCache
+from src.services.registry import services
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+class FakeCompletions:
+    def __init__(self, deltas=None, error=None):
+        self.deltas = deltas or []
+        self.error = error
+
+    def create(self, **kwargs):
+        if self.error:
+            raise self.error
+        if kwargs.get('stream'):
+            return iter(chunk(delta) for delta in self.deltas)
+        message = SimpleNamespace(content=''.join(self.deltas))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def fake_client(**kwargs):
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(**kwargs)))
+
+class TestStreamOpenAIResponse(unittest.TestCase):
+    def test_first_sentence_is_yielded_before_the_rest(self):
+        deltas = ['Mount Everest ', 'is 8,848.86 m', ' tall. It sits', ' in the Himalayas. ', 'Nice, right?']
+        with services.override('openai', fake_client(deltas=deltas)):
+            parts = list(openai_service.stream_openai_response('tallest mountain?'))
+        self.assertEqual(parts, ['Mount Everest is 8,848.86 m tall.', 'It sits in the Himalayas. Nice, right?'])
+
+    def test_timings_are_recorded(self):
+        before = {phase: openai_service.answer_timer(phase).count for phase in openai_service.ANSWER_PHASES}
+        with services.override('openai', fake_client(deltas=['Hi there.'])):
+            list(openai_service.stream_openai_response('hello?'))
+        for phase in openai_service.ANSWER_PHASES:
+            self.assertEqual(openai_service.answer_timer(phase).count, before[phase] + 1)
+        self.assertIsNotNone(openai_service.latency_summary()['first_token_p50'])
+
+    def test_error_before_any_output_yields_fallback(self):
+        with services.override('openai', fake_client(error=RuntimeError('down'))):
+            parts = list(openai_service.stream_openai_response('hello?'))
+        self.assertEqual(parts, [openai_service.FALLBACK_RESPONSE])
+
+    def test_error_after_output_is_raised_and_not_cached(self):
+        def create(**kwargs):
+            yield chunk('Mount Everest is the tallest. It ')
+            raise RuntimeError('connection reset')
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        cache = AnswerCache()
+        parts = []
+        with services.override('openai', client), self.assertRaises(RuntimeError):
+            for part in cache.get_or_stream('tallest mountain?', openai_service.stream_openai_response):
+                parts.append(part)
+        self.assertEqual(parts, ['Mount Everest is the tallest.', 'It'])
+        self.assertIsNone(cache.cached('tallest mountain?'))
+
+if __name__ == '__main__':
+    unittest.main()
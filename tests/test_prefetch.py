@@ -0,0 +1,84 @@
+import threading
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+from src.services import intent_analyzer
+from src.services.prefetch import Prefetch, hinted_calls, speculation_summary
+from src.utils.metrics import metrics
+from src.services.registry import services
+
+def speculation(tool, outcome):
+    return metrics.counter('buddybot_speculation_total', tool=tool, outcome=outcome).value
+
+def calendar_pool(ready=True):
+    return services.override('calendar', mock.Mock(ready=mock.Mock(return_value=ready)))
+
+def done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+class TestHints(unittest.TestCase):
+    def test_weather_needs_a_location(self):
+        self.assertEqual(hinted_calls("what's the weather in new york today"), [('get_weather', {'location': 'new york'})])
+        self.assertEqual(hinted_calls("what's the weather like"), [])
+
+    def test_calendar_keywords(self):
+        with calendar_pool():
+            self.assertEqual(hinted_calls('do i have any meetings tomorrow'), [('get_upcoming_events', {})])
+            self.assertEqual(hinted_calls('tell me a joke'), [])
+            self.assertEqual(hinted_calls('what event started world war one'), [])
+
+    def test_calendar_needs_signed_in_clients(self):
+        with calendar_pool(ready=False):
+            self.assertEqual(hinted_calls('am i busy tomorrow'), [])
+        self.assertIsNone(services.peek('calendar'))
+        self.assertEqual(hinted_calls('am i busy tomorrow'), [])
+
+class TestPrefetch(unittest.TestCase):
+    def test_claimed_and_wasted_fetches_are_counted(self):
+        hits, wasted = speculation('get_weather', 'hit'), speculation('get_upcoming_events', 'wasted')
+        submitted = []
+        with calendar_pool():
+            prefetch = Prefetch(
+                'is the weather in Paris bad enough to cancel my meeting',
+                lambda tool, arguments: submitted.append((tool, arguments)) or done(tool)
+            )
+        self.assertEqual([tool for tool, _ in submitted], ['get_weather', 'get_upcoming_events'])
+        self.assertIsNone(prefetch.claim('get_weather', {'location': 'Rome'}))
+        self.assertEqual(prefetch.claim('get_weather', {'location': ' PARIS', 'units': 'metric'}).result(), 'get_weather')
+        prefetch.close()
+        self.assertEqual(speculation('get_weather', 'hit'), hits + 1)
+        self.assertIn('get_weather', speculation_summary())
+        self.assertEqual(speculation('get_upcoming_events', 'wasted'), wasted + 1)
+
+    def test_disabled_prefetch_starts_nothing(self):
+        submit = mock.Mock()
+        prefetch = Prefetch('weather in paris', submit, enabled=False)
+        self.assertIsNone(prefetch.claim('get_weather', {'location': 'paris'}))
+        submit.assert_not_called()
+
+class TestIntentPrefetch(unittest.TestCase):
+    def test_weather_fetch_overlaps_intent_analysis(self):
+        overlapped = threading.Event()
+        weather = {'location': 'London', 'country': 'GB', 'temperature': 12, 'feels_like': 10,
+                   'description': 'drizzle', 'humidity': 90}
+
+        def get_weather(location, units='metric'):
+            overlapped.set()
+            return weather
+
+        def analyze(text):
+            # The speculative fetch runs while the (slow) analysis is still in progress
+            self.assertTrue(overlapped.wait(1))
+            return {'primary_intent': 'weather', 'confidence': 0.9, 'requires_clarification': False,
+                    'entities': [{'type': 'location', 'value': 'London'}]}
+
+        with mock.patch.object(services.get('weather'), 'get_weather', side_effect=get_weather) as fetch, \
+                mock.patch.object(intent_analyzer, 'analyze_intent', side_effect=analyze):
+            answer = intent_analyzer.respond_to_intent("what's the weather in london")
+        self.assertIn('Current weather in London, GB', answer)
+        fetch.assert_called_once_with(location='london')
+
+if __name__ == '__main__':
+    unittest.main()
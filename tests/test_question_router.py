@@ -0,0 +1,154 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from src.services import question_router
+from src.services.answer_cache import AnswerCache
+from src.utils.metrics import metrics
+from src.services.registry import services
+
+def content_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=None))])
+
+def tool_chunk(index, call_id=None, name=None, arguments=None):
+    call = SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, tool_calls=[call]))])
+
+class FakeCompletions:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return iter(self.responses.pop(0))
+
+class TestQuestionRouter(unittest.TestCase):
+    def route(self, responses):
+        completions = FakeCompletions(responses)
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        before = self.counts()
+        with services.override('openai', fake_client):
+            answer = question_router.route_question('question?')
+        after = self.counts()
+        calls = {path: (after[path][0] - before[path][0], after[path][1] - before[path][1]) for path in after}
+        return answer, completions.requests, calls
+
+    @staticmethod
+    def counts():
+        return {
+            path: (
+                metrics.counter('buddybot_router_questions_total', path=path).value,
+                metrics.counter('buddybot_router_model_calls_total', path=path).value
+            )
+            for path in question_router.ROUTER_PATHS
+        }
+
+    def test_direct_answer_takes_one_call(self):
+        answer, requests, stats = self.route([[content_chunk('Canberra is '), content_chunk('the capital.')]])
+        self.assertEqual(answer, 'Canberra is the capital.')
+        self.assertEqual(len(requests), 1)
+        self.assertIn('tools', requests[0])
+        self.assertEqual(stats['direct'], (1, 1))
+
+    def test_tool_call_runs_locally_then_summarizes(self):
+        weather = {'temperature': 21, 'description': 'clear sky'}
+        with mock.patch.object(services.get('weather'), 'get_weather', return_value=weather) as get_weather:
+            answer, requests, stats = self.route([
+                [tool_chunk(0, 'call-1', 'get_weather', '{"loca'), tool_chunk(0, arguments='tion": "Paris"}')],
+                [content_chunk("It's 21 degrees and clear in Paris.")]
+            ])
+        get_weather.assert_called_once_with('Paris', 'metric')
+        self.assertEqual(answer, "It's 21 degrees and clear in Paris.")
+        tool_message = requests[1]['messages'][-1]
+        self.assertEqual(tool_message['tool_call_id'], 'call-1')
+        self.assertEqual(json.loads(tool_message['content']), weather)
+        self.assertNotIn('tools', requests[1])
+        self.assertEqual(stats['tool'], (1, 2))
+
+    def test_answers_from_tools_are_not_cached(self):
+        cache = AnswerCache()
+        events = [{'summary': 'Standup', 'start': '2026-10-18T12:00:00Z'}]
+        completions = FakeCompletions([
+            [tool_chunk(0, 'call-1', 'get_upcoming_events', '{}')],
+            [content_chunk('You have standup at noon.')],
+            [tool_chunk(0, 'call-2', 'get_upcoming_events', '{}')],
+            [content_chunk('Your agenda is clear.')]
+        ])
+        calendar = SimpleNamespace(get_upcoming_events=mock.Mock(side_effect=[events, []]))
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        with services.override('openai', fake_client), \
+                services.override('calendar', SimpleNamespace(get=lambda: calendar, ready=lambda: True)):
+            for expected in ('You have standup at noon.', 'Your agenda is clear.'):
+                answer = ' '.join(cache.get_or_stream('what is on my agenda?', question_router.stream_route_question))
+                self.assertEqual(answer, expected)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_unknown_tool_returns_error_to_model(self):
+        self.assertIn('error', json.loads(question_router.run_tool('launch_rockets', '{}')))
+
+    def test_calendar_tools_need_a_signed_in_calendar(self):
+        calendar = SimpleNamespace(get=mock.Mock(), ready=lambda: False)
+        with services.override('calendar', calendar):
+            answer, requests, _ = self.route([[content_chunk('I cannot see your calendar.')]])
+            result = json.loads(question_router.run_tool('get_upcoming_events', '{}'))
+        offered = {tool['function']['name'] for tool in requests[0]['tools']}
+        self.assertTrue(offered.isdisjoint(question_router.CALENDAR_TOOLS))
+        self.assertIn('get_weather', offered)
+        self.assertIn('error', result)
+        calendar.get.assert_not_called()
+
+    def test_tool_waits_end_at_the_deadline(self):
+        release = threading.Event()
+        calls = [{'id': 'call-1', 'name': 'get_weather', 'arguments': '{"location": "Paris"}'}]
+        prefetch = question_router.Prefetch('', None, enabled=False)
+        try:
+            with mock.patch.dict(question_router.TOOL_HANDLERS, {'get_weather': lambda **_: release.wait()}):
+                start = time.monotonic()
+                results = question_router.run_tools(calls, prefetch, start + 0.05)
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual(json.loads(results[0]), {'error': 'get_weather timed out'})
+        finally:
+            release.set()
+
+class FakeAsyncCompletions:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=self.messages.pop(0))])
+
+class TestAsyncRouter(unittest.TestCase):
+    def test_tool_calls_run_concurrently_before_one_summary(self):
+        calls = [
+            SimpleNamespace(id=f'call_{city}', function=SimpleNamespace(name='get_weather', arguments=json.dumps({'location': city})))
+            for city in ('Paris', 'Rome')
+        ]
+        completions = FakeAsyncCompletions([
+            SimpleNamespace(content=None, tool_calls=calls),
+            SimpleNamespace(content='Paris is mild and Rome is warm.', tool_calls=None)
+        ])
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        started = []
+
+        async def get_weather(location, units='metric'):
+            started.append(location)
+            await asyncio.sleep(0.05)
+            return {'location': location}
+
+        with mock.patch.object(question_router.async_clients, 'openai_client', return_value=fake_client), \
+                mock.patch.dict(question_router.ASYNC_TOOL_HANDLERS, {'get_weather': get_weather}):
+            answer = asyncio.run(question_router.route_question_async('weather in paris and rome?'))
+        self.assertEqual(answer, 'Paris is mild and Rome is warm.')
+        # Paris is fetched speculatively from the question before the model asks for it
+        self.assertEqual(started, ['paris', 'Rome'])
+        tool_messages = [message for message in completions.requests[1]['messages'] if message['role'] == 'tool']
+        self.assertEqual([json.loads(message['content'])['location'] for message in tool_messages], ['paris', 'Rome'])
+
+if __name__ == '__main__':
+    unittest.main()
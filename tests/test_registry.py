@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from src.services.registry import ServiceRegistry
+
+class TestServiceRegistry(unittest.TestCase):
+    def test_services_are_built_once_on_first_use(self):
+        registry = ServiceRegistry()
+        builds = []
+
+        @registry.factory('slow')
+        def build():
+            builds.append(1)
+            time.sleep(0.05)
+            return object()
+
+        self.assertIsNone(registry.peek('slow'))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get('slow'))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertTrue(registry.summary()['slow']['loaded'])
+        self.assertGreater(registry.summary()['slow']['init_seconds'], 0.04)
+
+    def test_warm_up_builds_services_and_survives_failures(self):
+        registry = ServiceRegistry()
+        registry.factory('good')(lambda: 'ready')
+        registry.factory('bad')(lambda: 1 / 0)
+        with self.assertLogs('src.services.registry', level='ERROR'):
+            init_seconds = registry.warm_up()
+        self.assertEqual(list(init_seconds), ['good'])
+        self.assertEqual(registry.peek('good'), 'ready')
+
+    def test_override_restores_the_previous_instance(self):
+        registry = ServiceRegistry()
+        registry.factory('client')(lambda: 'real')
+        with registry.override('client', 'fake'):
+            self.assertEqual(registry.get('client'), 'fake')
+        self.assertEqual(registry.get('client'), 'real')
+
+    def test_unknown_service(self):
+        with self.assertRaises(KeyError):
+            ServiceRegistry().get('missing')
+
+class TestLazyImports(unittest.TestCase):
+    def test_importing_the_app_skips_heavy_clients(self):
+        heavy = ['openai', 'googleapiclient', 'google_auth_oauthlib', 'src.services.intent_analyzer',
+                 'src.services.weather_service', 'src.services.calendar_service']
+        script = f"import sys, src.app; print([name for name in {heavy!r} if name in sys.modules])"
+        env = dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'test'))
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True, env=env)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest import mock
+from src import app as app_module
+from src.models.session_state import SessionState
+from src.services.segments import consume_segments, unseen_suffix
+
+def segment(start, end, text):
+    return {'start': start, 'end': end, 'text': text}
+
+class TestConsumeSegments(unittest.TestCase):
+    def setUp(self):
+        self.state = SessionState(0.0)
+
+    def test_resent_segments_are_skipped(self):
+        first = [segment(0.0, 1.2, 'So I was'), segment(1.2, 2.5, 'telling him')]
+        self.assertEqual(consume_segments(self.state, first).texts, ['so i was', 'telling him'])
+        batch = consume_segments(self.state, first + [segment(2.5, 3.0, 'about it')])
+        self.assertEqual(batch.texts, ['about it'])
+        self.assertEqual(batch.skipped, 2)
+
+    def test_growing_segment_contributes_only_new_words(self):
+        consume_segments(self.state, [segment(0.0, 1.0, 'Hey Omi what is')])
+        batch = consume_segments(self.state, [segment(0.0, 2.0, 'hey omi what is the capital')])
+        self.assertEqual(batch.texts, ['the capital'])
+        self.assertEqual(batch.merged, 1)
+
+    def test_partial_overlap_is_merged_on_words(self):
+        self.assertEqual(unseen_suffix('what is the capital', 'the capital of france'), 'of france')
+        self.assertEqual(unseen_suffix('hey', 'heyday it is'), 'heyday it is')
+        self.assertEqual(unseen_suffix('good morning', 'what time is it'), 'what time is it')
+
+    def test_segments_without_timestamps_use_ids(self):
+        payload = [{'id': 'a', 'text': 'one'}, {'id': 'b', 'text': 'two'}]
+        consume_segments(self.state, payload)
+        self.assertEqual(consume_segments(self.state, payload).texts, [])
+        self.assertEqual(consume_segments(self.state, [{'text': 'three'}]).texts, ['three'])
+
+    def test_watermark_survives_serialization_and_reset(self):
+        consume_segments(self.state, [segment(0.0, 1.0, 'hello')])
+        self.state.reset()
+        restored = SessionState.from_dict(self.state.to_dict())
+        self.assertEqual(consume_segments(restored, [segment(0.0, 1.0, 'hello')]).texts, [])
+
+class TestDuplicateTriggers(unittest.TestCase):
+    def test_resent_trigger_does_not_restart_question(self):
+        state = SessionState(0.0)
+        payload = [segment(0.0, 1.0, 'hey omi what is'), segment(1.0, 2.0, 'the capital')]
+        with mock.patch.object(app_module.answer_queue, 'submit', return_value=True), \
+                mock.patch.object(app_module, 'question_deadlines'):
+            app_module.process_segments('session', payload, state, 100.0)
+            app_module.process_segments('session', payload, state, 102.0)
+        self.assertEqual(state.trigger_time, 100.0)
+        self.assertEqual(state.collected_question, ['what is', 'the capital'])
+
+    def test_question_right_after_an_answer_is_collected(self):
+        state = SessionState(0.0)
+        with mock.patch.object(app_module.answer_queue, 'submit', return_value=True) as submit, \
+                mock.patch.object(app_module, 'question_deadlines'):
+            app_module.process_segments('session', [segment(0.0, 1.0, 'hey omi'), segment(1.0, 2.0, 'what is the capital of peru?')], state, 100.0)
+            app_module.process_segments('session', [segment(2.0, 3.0, 'hey omi'), segment(3.0, 4.0, 'how far is lima from cusco?')], state, 101.0)
+        self.assertEqual([call.args[1] for call in submit.call_args_list],
+                         ['what is the capital of peru?', 'how far is lima from cusco?'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import time
+import unittest
+from unittest import mock
+from src import app as app_module
+from src.utils.timer_wheel import TimerWheel
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class TestTimerWheel(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.wheel = TimerWheel(tick=0.1, slots=8, clock=self.clock)
+        self.wheel.thread = object()  # advanced by hand, never by the background thread
+        self.fired = []
+
+    def schedule(self, key, delay):
+        self.wheel.schedule(key, self.clock.now + delay, lambda: self.fired.append(key))
+
+    def test_timers_fire_at_their_deadline(self):
+        self.schedule('a', 0.25)
+        self.schedule('b', 0.55)
+        self.assertEqual(self.wheel.advance(self.clock.now + 0.2), 0)
+        self.assertEqual(self.wheel.advance(self.clock.now + 0.35), 1)
+        self.assertEqual(self.fired, ['a'])
+        self.wheel.advance(self.clock.now + 0.65)
+        self.assertEqual(self.fired, ['a', 'b'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cancel_and_reschedule(self):
+        self.schedule('a', 0.2)
+        self.schedule('b', 0.2)
+        self.assertTrue(self.wheel.cancel('a'))
+        self.assertFalse(self.wheel.cancel('a'))
+        self.schedule('b', 0.5)
+        self.wheel.advance(self.clock.now + 0.3)
+        self.assertEqual(self.fired, [])
+        self.wheel.advance(self.clock.now + 0.5)
+        self.assertEqual(self.fired, ['b'])
+
+    def test_deadlines_beyond_one_revolution(self):
+        self.schedule('far', 2.05)
+        for step in range(1, 21):
+            self.wheel.advance(self.clock.now + step * 0.1)
+        self.assertEqual(self.fired, [])
+        self.wheel.advance(self.clock.now + 2.1)
+        self.assertEqual(self.fired, ['far'])
+
+    def test_long_stall_fires_everything_due(self):
+        for index in range(20):
+            self.schedule(index, index * 0.1)
+        self.assertEqual(self.wheel.advance(self.clock.now + 10), 20)
+
+class TestQuestionDeadline(unittest.TestCase):
+    def test_lone_trigger_segment_is_answered_at_deadline(self):
+        wheel = TimerWheel(tick=0.1)
+        wheel.thread = object()
+        session_id = 'deadline-session'
+        now = time.time()
+        with mock.patch.object(app_module, 'question_deadlines', wheel), \
+                mock.patch.object(app_module.answer_queue, 'submit', return_value=True) as submit:
+            with app_module.message_buffer.session(session_id) as state:
+                app_module.process_segments(
+                    session_id, [{'text': "Hey Omi what's the tallest mountain"}], state, now
+                )
+            self.assertEqual(len(wheel), 1)
+            wheel.advance(now + app_module.QUESTION_AGGREGATION_TIME - 1)
+            submit.assert_not_called()
+            wheel.advance(now + app_module.QUESTION_AGGREGATION_TIME + 0.2)
+        submit.assert_called_once_with(session_id, "what's the tallest mountain?", [])
+        self.assertFalse(app_module.message_buffer.get_buffer(session_id).trigger_detected)
+
+    def test_deadline_is_cancelled_when_question_closes_early(self):
+        wheel = TimerWheel(tick=0.1)
+        wheel.thread = object()
+        now = time.time()
+        with mock.patch.object(app_module, 'question_deadlines', wheel), \
+                mock.patch.object(app_module.answer_queue, 'submit', return_value=True) as submit:
+            with app_module.message_buffer.session('early-session') as state:
+                app_module.process_segments('early-session', [{'text': 'hey omi what is'}], state, now)
+                app_module.process_segments('early-session', [{'text': 'the capital of peru?'}], state, now + 1)
+            self.assertEqual(len(wheel), 0)
+        submit.assert_called_once_with('early-session', 'what is the capital of peru?', [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import openai
+from src.services import openai_service
+from src.services.upstream import CircuitBreaker, CircuitOpenError, UpstreamPolicy, UpstreamTimeout
+from src.services.registry import services
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def policy(name, breaker=None, **kwargs):
+    kwargs.setdefault('backoff', 0.01)
+    return UpstreamPolicy(name, breaker or CircuitBreaker(name), **kwargs)
+
+class TestUpstreamPolicy(unittest.TestCase):
+    def test_retryable_errors_are_retried(self):
+        outcomes = [connection_error(), connection_error(), 'ok']
+
+        def attempt(timeout):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(policy('retry-test').call(attempt), 'ok')
+        self.assertEqual(outcomes, [])
+
+    def test_other_errors_are_not_retried(self):
+        attempt = mock.Mock(side_effect=ValueError('bad request'))
+        with self.assertRaises(ValueError):
+            policy('no-retry-test').call(attempt)
+        self.assertEqual(attempt.call_count, 1)
+
+    def test_attempts_share_one_deadline(self):
+        timeouts = []
+
+        def attempt(timeout):
+            timeouts.append(timeout)
+            time.sleep(min(timeout, 0.1))
+            raise TimeoutError('slow')
+
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            policy('budget-test', budget=0.25, attempts=10).call(attempt)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertLess(len(timeouts), 10)
+        self.assertTrue(all(timeout <= 0.25 for timeout in timeouts))
+
+    def test_slow_attempt_is_hedged(self):
+        hedged = policy('hedge-test', hedge_min_samples=5, hedge_min_delay=0.05)
+        for _ in range(5):
+            hedged.latency.observe(0.01)
+        calls = []
+        lock = threading.Lock()
+
+        def attempt(timeout):
+            with lock:
+                calls.append(threading.current_thread().name)
+                first = len(calls) == 1
+            time.sleep(1.0 if first else 0.01)
+            return 'slow' if first else 'hedge'
+
+        start = time.monotonic()
+        self.assertEqual(hedged.call(attempt), 'hedge')
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(len(calls), 2)
+        # Only the second request runs on the shared hedge pool
+        self.assertFalse(calls[0].startswith('hedge_'))
+        self.assertTrue(calls[1].startswith('hedge_'))
+
+    def test_queued_request_past_its_deadline_is_not_sent(self):
+        attempt = mock.Mock()
+        future = Future()
+        policy('queued-test')._run(future, attempt, time.monotonic() - 1)
+        self.assertIsInstance(future.exception(), UpstreamTimeout)
+        attempt.assert_not_called()
+
+    def test_async_slow_attempt_is_hedged(self):
+        hedged = policy('async-hedge-test', hedge_min_samples=5, hedge_min_delay=0.05)
+        for _ in range(5):
+            hedged.latency.observe(0.01)
+        delays = [1.0, 0.01]
+
+        async def attempt(timeout):
+            delay = delays.pop(0)
+            await asyncio.sleep(delay)
+            return delay
+
+        self.assertEqual(asyncio.run(hedged.call_async(attempt)), 0.01)
+
+    def test_async_attempt_is_bounded_by_deadline(self):
+        async def attempt(timeout):
+            await asyncio.sleep(5)
+
+        with self.assertRaises(UpstreamTimeout):
+            asyncio.run(policy('async-budget-test', budget=0.1, attempts=1).call_async(attempt))
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_trips_on_error_rate_and_recovers_after_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('test', error_rate=0.5, min_calls=4, window=10, cooldown=5, clock=clock)
+        for ok in (True, False, True):
+            breaker.record(ok)
+        self.assertEqual(breaker.snapshot()['state'], 'closed')
+        breaker.record(False)
+        self.assertEqual(breaker.snapshot()['state'], 'open')
+        self.assertFalse(breaker.allow())
+
+        clock.now = 6
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.snapshot()['state'], 'half_open')
+        breaker.record(True)
+        self.assertEqual(breaker.snapshot()['state'], 'closed')
+        self.assertEqual(breaker.snapshot()['trips'], 1)
+
+    def test_old_outcomes_leave_the_window(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('window-test', error_rate=0.5, min_calls=2, window=10, clock=clock)
+        breaker.record(False)
+        clock.now = 20
+        breaker.record(False)
+        self.assertEqual(breaker.snapshot()['state'], 'closed')
+
+    def test_non_retryable_errors_do_not_count(self):
+        breaker = CircuitBreaker('neutral-test', min_calls=1)
+        with self.assertRaises(ValueError):
+            policy('neutral-test', breaker).call(mock.Mock(side_effect=ValueError('bad request')))
+        self.assertEqual(breaker.snapshot()['calls'], 0)
+
+    def test_neutral_probe_lets_another_call_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('neutral-probe-test', min_calls=1, cooldown=5, clock=clock)
+        breaker.record(False)
+        clock.now = 6
+        self.assertTrue(breaker.allow())
+        breaker.record_neutral()
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.snapshot()['state'], 'half_open')
+
+    def test_open_circuit_fails_fast(self):
+        breaker = CircuitBreaker('open-test', min_calls=1)
+        breaker.record(False)
+        attempt = mock.Mock()
+        with self.assertRaises(CircuitOpenError):
+            policy('open-test', breaker).call(attempt)
+        attempt.assert_not_called()
+
+class TestOpenAIResponse(unittest.TestCase):
+    def test_transient_errors_are_retried_instead_of_swallowed(self):
+        message = SimpleNamespace(content='Canberra.')
+        create = mock.Mock(side_effect=[connection_error(), SimpleNamespace(choices=[SimpleNamespace(message=message)])])
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        with services.override('openai', fake_client), \
+                mock.patch.object(openai_service, 'answer_policy', policy('answer-test')):
+            self.assertEqual(openai_service.get_openai_response('capital of australia?'), 'Canberra.')
+        self.assertEqual(create.call_count, 2)
+
+    def test_open_circuit_returns_fallback(self):
+        breaker = CircuitBreaker('fallback-test', min_calls=1)
+        breaker.record(False)
+        with mock.patch.object(openai_service, 'answer_policy', policy('fallback-test', breaker)):
+            self.assertEqual(openai_service.get_openai_response('hello?'), openai_service.FALLBACK_RESPONSE)
+
+if __name__ == '__main__':
+    unittest.main()
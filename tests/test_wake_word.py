@@ -0,0 +1,32 @@
+import unittest
+from src.services.wake_word import WakeWordEngine
+
+class TestWakeWordEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = WakeWordEngine(
+            ["hey omi", "hey, omi", "hey omie"], ["hey", "hey,"], ["omi"]
+        )
+
+    def test_match_returns_trigger_offset_and_question(self):
+        match = self.engine.match("so hey omi, what's the weather?")
+        self.assertEqual(match.trigger, "hey omi")
+        self.assertEqual(match.offset, 3)
+        self.assertEqual(match.question, "what's the weather?")
+
+    def test_match_uses_last_trigger(self):
+        match = self.engine.match("hey omi stop hey omie tell me a joke")
+        self.assertEqual(match.trigger, "hey omie")
+        self.assertEqual(match.question, "tell me a joke")
+
+    def test_match_requires_word_boundaries(self):
+        self.assertIsNone(self.engine.match("they omitted the details"))
+        self.assertIsNotNone(self.engine.match("hey   omi"))
+
+    def test_partial_trigger_across_segments(self):
+        self.assertTrue(self.engine.ends_with_partial("well hey,"))
+        self.assertFalse(self.engine.ends_with_partial("hey there"))
+        match = self.engine.match_partial("omi what time is it")
+        self.assertEqual(match.question, "what time is it")
+
+if __name__ == '__main__':
+    unittest.main()
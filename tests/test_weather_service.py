@@ -0,0 +1,171 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from src.services.weather_service import WeatherService, daily_rollups
+
+def forecast_body(city):
+    # 3-hourly entries from 2026-10-18 00:00 UTC; the city is one hour ahead of UTC
+    return {
+        'city': {'name': city.title(), 'country': 'XX', 'timezone': 3600},
+        'list': [
+            {'dt': 1792281600 + 10800 * index, 'dt_txt': '', 'main': {'temp': float(index), 'humidity': 50},
+             'weather': [{'description': 'clear sky'}]}
+            for index in range(40)
+        ]
+    }
+
+class FakeWeatherHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.active -= 1
+        if self.server.body is not None:
+            return self.send_body(self.server.body)
+        if self.path.startswith('/forecast'):
+            city = parse_qs(urlparse(self.path).query)['q'][0]
+            return self.send_body(json.dumps(forecast_body(city)).encode())
+        self.send_body(json.dumps({
+            'main': {'temp': 12.5, 'feels_like': 11.0, 'humidity': 80},
+            'weather': [{'description': 'light rain'}],
+            'wind': {'speed': 3.1},
+            'name': 'London',
+            'sys': {'country': 'GB'}
+        }).encode())
+
+    def send_body(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestWeatherService(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeWeatherHandler)
+        self.server.requests = 0
+        self.server.delay = 0
+        self.server.body = None
+        self.server.lock = threading.Lock()
+        self.server.active = self.server.peak = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_repeated_lookups_are_cached(self):
+        service = WeatherService('key', base_url=self.base_url)
+        self.assertEqual(service.get_weather('London')['temperature'], 12.5)
+        self.assertEqual(service.get_weather('  london ')['location'], 'London')
+        self.assertEqual(self.server.requests, 1)
+
+    def test_concurrent_lookups_share_one_call(self):
+        self.server.delay = 0.2
+        service = WeatherService('key', base_url=self.base_url)
+        threads = [threading.Thread(target=service.get_weather, args=('London',)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests, 1)
+
+    def test_stale_entry_served_while_upstream_is_slow(self):
+        service = WeatherService('key', base_url=self.base_url, cache_ttl=0.05, soft_timeout=0.05)
+        service.get_weather('London')
+        time.sleep(0.1)
+        self.server.delay = 0.5
+        start = time.time()
+        self.assertEqual(service.get_weather('London')['location'], 'London')
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual(service.stats()['stale_served'], 1)
+
+    def test_async_lookups_share_one_call_and_the_cache(self):
+        self.server.delay = 0.2
+        service = WeatherService('key', base_url=self.base_url)
+
+        async def lookups():
+            return await asyncio.gather(*(service.get_weather_async('London') for _ in range(20)))
+
+        results = asyncio.run(lookups())
+        self.assertEqual({result['location'] for result in results}, {'London'})
+        self.assertEqual(service.get_weather('london')['temperature'], 12.5)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_daily_forecasts_for_many_locations(self):
+        service = WeatherService('key', base_url=self.base_url)
+        results = service.get_daily_forecasts(['Oslo', 'Lima', 'Oslo'])
+        self.assertEqual(list(results), ['Oslo', 'Lima'])
+        oslo = results['Oslo']
+        # Local midnight is 23:00 UTC, so the first local day holds entries 0-7
+        self.assertEqual(oslo['dates'][:2], ['2026-10-18', '2026-10-19'])
+        self.assertEqual((oslo['min'][0], oslo['max'][0], oslo['mean'][0]), (0.0, 7.0, 3.5))
+        self.assertEqual((oslo['min'][1], oslo['max'][1], oslo['mean'][1]), (8.0, 15.0, 11.5))
+        self.assertEqual(len(oslo['dates']), 5)
+        self.assertEqual(results['Lima']['location'], 'Lima')
+        self.assertEqual(self.server.requests, 2)
+
+        # Cached, and kept apart from the five-entry forecast of the same endpoint
+        service.get_daily_forecasts(['lima'])
+        self.assertEqual(len(service.get_forecast('Lima')['forecast']), 5)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_malformed_bodies_are_misses(self):
+        service = WeatherService('key', base_url=self.base_url)
+        for body in (b'{"list": [', b'{"list": []}'):
+            self.server.body = body
+            service.batch_cache.clear()
+            self.assertEqual(service.get_daily_forecasts(['Oslo']), {'Oslo': None})
+            self.assertEqual(asyncio.run(service.get_daily_forecasts_async(['Lima'])), {'Lima': None})
+            self.assertIsNone(asyncio.run(service.get_weather_async('Rome')))
+
+    def test_async_daily_forecasts(self):
+        service = WeatherService('key', base_url=self.base_url)
+        results = asyncio.run(service.get_daily_forecasts_async(['Oslo', 'Lima']))
+        self.assertEqual(results['Lima']['mean'][1], 11.5)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_batches_are_bounded_and_cached_apart(self):
+        self.server.delay = 0.02
+        cities = [f'city-{index}' for index in range(8)]
+        service = WeatherService('key', base_url=self.base_url, batch_workers=2)
+        self.assertEqual(len(service.get_daily_forecasts(cities)), 8)
+        self.assertEqual(self.server.peak, 2)
+        self.assertEqual(service.cache.stats()['entries'], 0)
+        self.assertEqual(service.stats()['batch_entries'], 8)
+
+        self.server.peak = 0
+        service = WeatherService('key', base_url=self.base_url, batch_workers=3)
+        asyncio.run(service.get_daily_forecasts_async(cities))
+        self.assertLessEqual(self.server.peak, 3)
+        self.assertEqual(service.cache.stats()['entries'], 0)
+
+    def test_rollups_match_a_per_item_loop(self):
+        series = {
+            'a': WeatherService._parse_forecast_series(forecast_body('a')),
+            'b': dict(WeatherService._parse_forecast_series(forecast_body('b')), timezone=-18000),
+            'missing': None
+        }
+        results = daily_rollups(series)
+        self.assertIsNone(results['missing'])
+        for location in ('a', 'b'):
+            days = {}
+            for dt, temp in zip(series[location]['dt'].tolist(), series[location]['temp'].tolist()):
+                days.setdefault(time.strftime('%Y-%m-%d', time.gmtime(dt + series[location]['timezone'])), []).append(temp)
+            self.assertEqual(results[location]['dates'], list(days))
+            self.assertEqual(results[location]['min'], [min(temps) for temps in days.values()])
+            self.assertEqual(results[location]['mean'], [round(sum(temps) / len(temps), 1) for temps in days.values()])
+
+if __name__ == '__main__':
+    unittest.main()